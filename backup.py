@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Sauvegarde d'un slot en archive tar compressée sur plusieurs cœurs
+
+Le tar est produit en flux et découpé en blocs de taille fixe ; chaque bloc
+est compressé indépendamment (membre gzip ou flux xz) par un pool de threads,
+zlib et lzma libérant le GIL pendant la compression. Les membres sont écrits
+dans l'ordre : le résultat est un .tar.gz ou .tar.xz standard, lisible par
+gzip/xz et par installer.install_archive pour la restauration.
+"""
+import os
+import gzip
+import lzma
+import time
+import tarfile
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+BACKUP_BLOCK_SIZE = 4 * 1024 * 1024
+BACKUP_COPY_BUFFER = 1024 * 1024
+BACKUP_MAX_WORKERS = max(1, os.cpu_count() or 1)
+
+# Taille maximale d'un fichier sur FAT32 (partition DREAMCARD)
+FAT32_MAX_FILE_SIZE = 0xFFFFFFFF
+
+BACKUP_FORMATS = {
+    'gz': {'extension': '.tar.gz', 'level': 6},
+    'xz': {'extension': '.tar.xz', 'level': 3},
+}
+BACKUP_EXCLUDE = ('lost+found',)
+
+
+class BackupError(Exception):
+    """Sauvegarde impossible (destination pleine, limite FAT32...)"""
+    pass
+
+
+def compress_block(data, fmt, level):
+    """Compresse un bloc en un membre autonome"""
+    if fmt == 'xz':
+        return lzma.compress(data, format=lzma.FORMAT_XZ, preset=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class ParallelCompressor:
+    """Objet fichier en écriture : découpe en blocs, compresse en parallèle, écrit dans l'ordre"""
+
+    def __init__(self, out, fmt='gz', level=None, block_size=BACKUP_BLOCK_SIZE,
+                 max_workers=BACKUP_MAX_WORKERS, max_size=None):
+        if fmt not in BACKUP_FORMATS:
+            raise BackupError("Unknown backup format: %s" % fmt)
+        self.out = out
+        self.fmt = fmt
+        self.level = BACKUP_FORMATS[fmt]['level'] if level is None else level
+        self.block_size = block_size
+        self.max_workers = max_workers
+        self.max_size = max_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Blocs en cours de compression, bornés pour limiter la mémoire
+        self.pending = collections.deque()
+        self.buffer = bytearray()
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _submit(self, data):
+        self.pending.append(self.executor.submit(compress_block, data, self.fmt, self.level))
+        while len(self.pending) > 2 * self.max_workers:
+            self._write_oldest()
+
+    def _write_oldest(self):
+        data = self.pending.popleft().result()
+        if self.max_size is not None and self.bytes_out + len(data) > self.max_size:
+            raise BackupError("Backup exceeds the %d MB file size limit of the destination" % (self.max_size >> 20))
+        self.out.write(data)
+        self.bytes_out += len(data)
+
+    def write(self, data):
+        self.buffer += data
+        self.bytes_in += len(data)
+        while len(self.buffer) >= self.block_size:
+            self._submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def close(self):
+        """Compresse le reste et écrit tous les blocs"""
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while self.pending:
+            self._write_oldest()
+        self.executor.shutdown(wait=True)
+
+    def abort(self):
+        """Abandonne les blocs en attente (erreur ou annulation)"""
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.executor.shutdown(wait=True)
+
+
+def backup_tree(root, output_path, fmt='gz', level=None, progress=None,
+                max_workers=BACKUP_MAX_WORKERS, max_size=None):
+    """Sauvegarde l'arborescence root (slot monté) dans output_path
+
+    progress(bytes_in, total, files) est appelé au fil de l'archivage ; total
+    est l'espace occupé du système de fichiers. L'archive est écrite dans un
+    fichier .part renommé à la fin. Retourne un dict
+    {files, bytes_in, bytes_out, elapsed, throughput, ratio}.
+    """
+    st = os.statvfs(root)
+    total = (st.f_blocks - st.f_bfree) * st.f_frsize
+    part_path = output_path + ".part"
+    state = {'files': 0}
+    start_time = time.time()
+
+    def member_filter(tarinfo):
+        if os.path.normpath(tarinfo.name) in BACKUP_EXCLUDE:
+            return None
+        state['files'] += 1
+        if progress is not None:
+            progress(compressor.bytes_in, total, state['files'])
+        return tarinfo
+
+    try:
+        with open(part_path, 'wb') as out:
+            compressor = ParallelCompressor(out, fmt, level, max_workers=max_workers, max_size=max_size)
+            try:
+                with tarfile.open(fileobj=compressor, mode='w|', format=tarfile.PAX_FORMAT,
+                                  bufsize=BACKUP_COPY_BUFFER, copybufsize=BACKUP_COPY_BUFFER) as tar:
+                    tar.add(root, arcname='.', recursive=True, filter=member_filter)
+                compressor.close()
+            except BaseException:
+                compressor.abort()
+                raise
+            out.flush()
+            os.fsync(out.fileno())
+        os.rename(part_path, output_path)
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+
+    elapsed = time.time() - start_time
+    return {
+        'files': state['files'],
+        'bytes_in': compressor.bytes_in,
+        'bytes_out': compressor.bytes_out,
+        'elapsed': elapsed,
+        'throughput': compressor.bytes_in / elapsed if elapsed > 0 else 0.0,
+        'ratio': compressor.bytes_out / float(compressor.bytes_in) if compressor.bytes_in else 0.0,
+    }
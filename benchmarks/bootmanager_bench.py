@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""Mesure des chemins critiques de BootManager sur des slots en images fichier
+
+Pour chaque combinaison (nombre de slots SD, taille des rootfs), une racine
+temporaire est préparée (harness.BenchRoot) : 4 slots eMMC et N slots SD,
+un sur deux contenant un rootfs factice, plus une carte SD entière pour
+partition_sd_card. Chaque opération est répétée et les durées sont écrites
+en JSON pour comparer deux exécutions (--compare).
+
+Usage : python3 benchmarks/bootmanager_bench.py --sd-slots 4,8 --rootfs-mb 1024
+                [--repeat 5] [--loop] [--output run.json] [--compare base.json]
+"""
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import statistics
+import contextlib
+import subprocess
+
+import harness
+
+OPERATIONS = (
+    "get_multiboot_slots_cold",
+    "get_multiboot_slots_warm",
+    "check_slot_has_image",
+    "get_boot_images_cold",
+    "get_boot_images",
+    "get_current_boot",
+    "delete_slot_image_fast",
+    "delete_slot_image_thorough",
+    "partition_sd_card",
+)
+
+RESULTS_VERSION = 1
+
+
+def int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def summarize(samples):
+    return {
+        'runs': len(samples),
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.mean(samples),
+        'max': max(samples),
+        'samples': samples,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "-C", harness.ROOT, "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Bench:
+    """Une configuration : racine temporaire, slots créés et BootManager"""
+
+    def __init__(self, plugin, args, sd_slots, rootfs_mb):
+        self.plugin = plugin
+        self.args = args
+        self.sd_slots = sd_slots
+        self.rootfs_mb = rootfs_mb
+        self.root = harness.BenchRoot(plugin, use_loop=args.loop)
+        self.tree = harness.make_rootfs_tree(os.path.join(self.root.path, "rootfs"), args.files, args.file_kb)
+        self.samples = {}
+        self.errors = {}
+
+    def setup(self):
+        self.root.redirect(self.sd_slots)
+        self.boot_manager = self.root.boot_manager()
+        registry = self.boot_manager.get_slot_registry()
+        for index, slot in enumerate(registry):
+            self.root.create_partition(slot.partition, self.rootfs_mb, self.tree if index % 2 == 0 else None)
+
+        # Démarré sur le slot 1 : la ligne de commande du noyau reprend son arg bootconfig
+        self.root.write_cmdline(registry.slot(1).arg.replace("${bootargs} ", "console=ttyS0,115200 "))
+
+    def plan_sd_card(self):
+        """Carte SD juste assez grande pour sd_slots slots de rootfs_mb, et son plan"""
+        sdlayout, = harness.import_modules("sdlayout")
+        align_mb = self.boot_manager.get_sd_alignment_mb(self.root.sd_device)
+        card_mb = self.sd_slots * self.rootfs_mb + sdlayout.SD_MIN_FAT_SIZE_MB + 4 * align_mb
+        for slot in self.boot_manager.get_slot_registry():
+            if slot.storage == 'sd':
+                self.root.release(slot.partition)
+        self.root.create_disk(self.root.sd_device, card_mb)
+        plan = sdlayout.plan_sd_layout(self.boot_manager.get_sd_card_sectors(self.root.sd_device),
+                                       self.sd_slots, self.rootfs_mb, align_mb=align_mb)
+        # Les nœuds de partition existent déjà (pas de relecture de table sur une image fichier)
+        for part in plan['partitions']:
+            self.root.create_partition(self.plugin.partition_path(self.root.sd_device, part['number']),
+                                       part['size_mb'], fstype=None)
+        return plan
+
+    def timed(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.samples.setdefault(name, []).append(time.perf_counter() - start)
+        return result
+
+    def check_result(self, name, result):
+        success, message = result
+        if not success:
+            self.errors[name] = " ".join(message.split())
+
+    def run(self):
+        bm = self.boot_manager
+        repeat = self.args.repeat
+        selected = set(self.args.only or OPERATIONS)
+
+        for _ in range(repeat):
+            if "get_multiboot_slots_cold" in selected:
+                bm.slot_cache.invalidate_device(self.root.emmc_device)
+                bm.slot_cache.invalidate_device(self.root.sd_device)
+                self.timed("get_multiboot_slots_cold", bm.get_multiboot_slots)
+            if "get_multiboot_slots_warm" in selected:
+                bm.get_multiboot_slots()
+                self.timed("get_multiboot_slots_warm", bm.get_multiboot_slots)
+            if "check_slot_has_image" in selected:
+                for slot in bm.get_slot_layout():
+                    self.timed("check_slot_has_image", bm.check_slot_has_image, slot)
+            if "get_boot_images_cold" in selected:
+                self.plugin.invalidate_bootconfig(bm.bootconfig_path)
+                self.timed("get_boot_images_cold", bm.get_boot_images)
+            if "get_boot_images" in selected:
+                self.timed("get_boot_images", bm.get_boot_images)
+            if "get_current_boot" in selected:
+                self.timed("get_current_boot", bm.get_current_boot)
+
+        # Slot 1 repeuplé avant chaque effacement (non mesuré)
+        slot = bm.get_slot_registry().slot(1).as_dict()
+        for mode, name in ((self.plugin.WIPE_FAST, "delete_slot_image_fast"),
+                           (self.plugin.WIPE_THOROUGH, "delete_slot_image_thorough")):
+            if name not in selected:
+                continue
+            if mode == self.plugin.WIPE_THOROUGH and os.geteuid() != 0:
+                self.errors[name] = "skipped: mounting needs root"
+                continue
+            for _ in range(repeat):
+                self.root.create_partition(slot['partition'], self.rootfs_mb, self.tree)
+                self.check_result(name, self.timed(name, bm.delete_slot_image, slot, mode))
+
+        if "partition_sd_card" in selected:
+            for _ in range(self.args.sd_repeat):
+                plan = self.plan_sd_card()
+                self.check_result("partition_sd_card", self.timed(
+                    "partition_sd_card", bm.partition_sd_card, self.root.sd_device, plan))
+
+    def result(self):
+        return {
+            'sd_slots': self.sd_slots,
+            'slots': len(self.boot_manager.get_slot_registry()),
+            'rootfs_mb': self.rootfs_mb,
+            'storage': 'loop' if self.args.loop else 'file',
+            'operations': dict((name, summarize(samples)) for name, samples in self.samples.items()),
+            'errors': self.errors,
+        }
+
+
+def run_config(plugin, args, sd_slots, rootfs_mb):
+    bench = Bench(plugin, args, sd_slots, rootfs_mb)
+    output = sys.stdout if args.verbose else io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            bench.setup()
+            bench.run()
+        return bench.result()
+    finally:
+        bench.root.cleanup()
+
+
+def config_key(config):
+    return (config['sd_slots'], config['rootfs_mb'], config['storage'])
+
+
+def print_results(results, base=None):
+    base_configs = dict((config_key(c), c) for c in base['configs']) if base else {}
+    for config in results['configs']:
+        print("%d slots (%d SD), rootfs %d MB, %s images" % (
+            config['slots'], config['sd_slots'], config['rootfs_mb'], config['storage']))
+        previous = base_configs.get(config_key(config), {}).get('operations', {})
+        for name in OPERATIONS:
+            stats = config['operations'].get(name)
+            if stats is None:
+                continue
+            line = "  %-28s median %9.2f ms  min %9.2f ms  (%d runs)" % (
+                name, stats['median'] * 1000, stats['min'] * 1000, stats['runs'])
+            if name in previous and previous[name]['median'] > 0:
+                line += "  x%.2f vs base" % (stats['median'] / previous[name]['median'])
+            print(line)
+        for name, error in sorted(config['errors'].items()):
+            print("  %-28s %s" % (name, error))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument("--sd-slots", type=int_list, default=[4], help="SD slot counts, e.g. 4,8,16")
+    parser.add_argument("--rootfs-mb", type=int_list, default=[1024], help="rootfs sizes in MB, e.g. 1024,2048")
+    parser.add_argument("--files", type=int, default=500, help="files in each populated rootfs")
+    parser.add_argument("--file-kb", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sd-repeat", type=int, default=1, help="runs of partition_sd_card")
+    parser.add_argument("--only", type=lambda v: v.split(","), help="comma separated operations")
+    parser.add_argument("--loop", action="store_true", help="attach partitions to loop devices (root)")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    parser.add_argument("--verbose", action="store_true", help="show the plugin log")
+    args = parser.parse_args()
+
+    if args.loop and os.geteuid() != 0:
+        sys.exit("--loop needs root")
+    unknown = set(args.only or ()) - set(OPERATIONS)
+    if unknown:
+        sys.exit("Unknown operations: %s" % ", ".join(sorted(unknown)))
+
+    plugin = harness.load_plugin()
+    sdlayout, = harness.import_modules("sdlayout")
+    if min(args.rootfs_mb) < sdlayout.SD_MIN_SLOT_SIZE_MB:
+        sys.exit("rootfs size must be at least %d MB (SD slot minimum)" % sdlayout.SD_MIN_SLOT_SIZE_MB)
+
+    results = {
+        'version': RESULTS_VERSION,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git': git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'args': dict((k, v) for k, v in vars(args).items() if k not in ('output', 'compare')),
+        'configs': [],
+    }
+    for sd_slots in args.sd_slots:
+        for rootfs_mb in args.rootfs_mb:
+            results['configs'].append(run_config(plugin, args, sd_slots, rootfs_mb))
+
+    base = None
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+    print_results(results, base)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print("Results written to %s" % args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Comparaison avant/après des profils de systèmes de fichiers sur images fichier
+
+Pour chaque profil (default, sd), une image est formatée avec les commandes
+de fsprofile, montée en loop avec les options du profil, puis reçoit :
+- une installation simulée (arborescence de petits fichiers façon rootfs)
+- des écritures aléatoires de 4 Ko avec fdatasync (base de données, EPG...)
+
+Sont mesurés : la durée de chaque phase, les écritures vues par le
+périphérique loop (/sys/block/loopN/stat) et le nombre d'unités
+d'effacement touchées par les données des fichiers (filefrag). Sur une
+image fichier le coût d'effacement d'une vraie carte n'existe pas : les
+chiffres de localité et d'alignement sont ceux qui se transposent à la SD.
+
+Usage (root) : python3 benchmarks/fsprofile_bench.py [--size-mb 1024] [--files 3000]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+import harness
+from harness import run
+
+
+def loop_write_stats(loop):
+    """(écritures terminées, secteurs écrits) du périphérique loop"""
+    with open("/sys/block/%s/stat" % os.path.basename(loop)) as f:
+        fields = f.read().split()
+    return int(fields[4]), int(fields[6])
+
+
+def populate_rootfs(root, count, rng):
+    """Arborescence de petits fichiers (1 à 64 Ko) répartis dans 100 dossiers"""
+    payload = os.urandom(64 * 1024)
+    for i in range(count):
+        directory = os.path.join(root, "usr", "lib", "d%02d" % (i % 100))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "f%05d" % i), 'wb') as f:
+            f.write(payload[:rng.randint(1, 64) * 1024])
+    os.sync()
+
+
+def random_writes(path, file_mb, count, rng, sync_every=16):
+    block = os.urandom(4096)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.posix_fallocate(fd, 0, file_mb * 1024 * 1024)
+        os.fsync(fd)
+        blocks = file_mb * 256
+        for i in range(count):
+            os.pwrite(fd, block, rng.randrange(blocks) * 4096)
+            if i % sync_every == sync_every - 1:
+                os.fdatasync(fd)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+FILEFRAG_EXTENT_RE = re.compile(r'^\s*\d+:\s+\d+\.\.\s*\d+:\s+(\d+)\.\.\s*(\d+):')
+
+
+def erase_blocks_touched(root, erase_block, block_size=4096):
+    """(unités d'effacement touchées par les données, nombre d'extents)"""
+    paths = [os.path.join(directory, name) for directory, _dirs, names in os.walk(root) for name in names]
+    touched = set()
+    extents = 0
+    per_erase = erase_block // block_size
+    for start in range(0, len(paths), 500):
+        out = subprocess.run(["filefrag", "-v", "-b%d" % block_size] + paths[start:start + 500],
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode()
+        for line in out.splitlines():
+            match = FILEFRAG_EXTENT_RE.match(line)
+            if match:
+                first, last = int(match.group(1)), int(match.group(2))
+                touched.update(range(first // per_erase, last // per_erase + 1))
+                extents += 1
+    return len(touched), extents
+
+
+def bench_profile(fsprofile, name, args, workdir):
+    profile = fsprofile.get_profile(name)
+    erase_block = args.erase_block_mb * 1024 * 1024
+    image = os.path.join(workdir, "%s.img" % name)
+    with open(image, 'wb') as f:
+        f.truncate(args.size_mb * 1024 * 1024)
+
+    start = time.time()
+    for argv in fsprofile.ext4_commands(image, profile, erase_block):
+        run(argv)
+    mkfs_time = time.time() - start
+
+    loop = subprocess.check_output(["losetup", "-f", "--show", image]).decode().strip()
+    mount_point = os.path.join(workdir, name)
+    os.makedirs(mount_point, exist_ok=True)
+    options = fsprofile.mount_options(profile)
+    try:
+        run(["mount"] + (["-o", options] if options else []) + [loop, mount_point])
+        try:
+            rng = random.Random(42)
+            writes_before = loop_write_stats(loop)
+            start = time.time()
+            populate_rootfs(mount_point, args.files, rng)
+            install_time = time.time() - start
+            writes_install = loop_write_stats(loop)
+
+            start = time.time()
+            random_writes(os.path.join(mount_point, "random.db"), args.random_file_mb, args.random_writes, rng)
+            random_time = time.time() - start
+            writes_random = loop_write_stats(loop)
+
+            touched, extents = erase_blocks_touched(os.path.join(mount_point, "usr"), erase_block)
+        finally:
+            run(["umount", mount_point])
+    finally:
+        run(["losetup", "-d", loop])
+        os.remove(image)
+
+    return {
+        'profile': name,
+        'mkfs': mkfs_time,
+        'install': install_time,
+        'install_ios': writes_install[0] - writes_before[0],
+        'install_mb': (writes_install[1] - writes_before[1]) * 512 / (1024.0 * 1024.0),
+        'random': random_time,
+        'random_ios': writes_random[0] - writes_install[0],
+        'erase_blocks': touched,
+        'extents': extents,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument("--size-mb", type=int, default=1024, help="image size (MB)")
+    parser.add_argument("--files", type=int, default=3000, help="files written by the install phase")
+    parser.add_argument("--random-file-mb", type=int, default=64)
+    parser.add_argument("--random-writes", type=int, default=2000)
+    parser.add_argument("--erase-block-mb", type=int, default=4)
+    parser.add_argument("--card-gb", type=int, default=16, help="card size used for the layout comparison")
+    args = parser.parse_args()
+
+    if os.geteuid() != 0:
+        sys.exit("This benchmark needs root (loop devices and mount)")
+
+    fsprofile, sdlayout = harness.import_modules("fsprofile", "sdlayout")
+
+    print("Partition layout on a %d GB card (erase block %d MB):" % (args.card_gb, args.erase_block_mb))
+    erase_sectors = args.erase_block_mb * 1024 * 1024 // 512
+    total_sectors = args.card_gb * 1000 ** 3 // 512
+    for name in ('default', 'sd'):
+        profile = fsprofile.get_profile(name)
+        plan = sdlayout.plan_sd_layout(total_sectors, align_mb=fsprofile.alignment_mb(
+            profile, args.erase_block_mb * 1024 * 1024))
+        aligned = sum(1 for part in plan['partitions'] if part['start'] % erase_sectors == 0)
+        print("  %-8s %d/%d partitions start on an erase block boundary" % (name, aligned, len(plan['partitions'])))
+
+    workdir = tempfile.mkdtemp(prefix="fsprofile_bench.")
+    try:
+        results = [bench_profile(fsprofile, name, args, workdir) for name in ('default', 'sd')]
+    finally:
+        for name in ('default', 'sd'):
+            path = os.path.join(workdir, name)
+            if os.path.isdir(path):
+                os.rmdir(path)
+        os.rmdir(workdir)
+
+    print("")
+    print("%-8s %8s %9s %11s %10s %9s %11s %13s %8s" % (
+        "profile", "mkfs s", "install s", "install IOs", "install MB", "random s", "random IOs", "erase blocks", "extents"))
+    for r in results:
+        print("%-8s %8.2f %9.2f %11d %10.1f %9.2f %11d %13d %8d" % (
+            r['profile'], r['mkfs'], r['install'], r['install_ios'], r['install_mb'],
+            r['random'], r['random_ios'], r['erase_blocks'], r['extents']))
+
+
+if __name__ == '__main__':
+    main()
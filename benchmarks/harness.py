@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""Banc d'essai commun : le plugin chargé hors récepteur
+
+Les modules Enigma2 (Plugins, Screens, Components, Tools.Directories,
+enigma.eTimer) sont remplacés par des classes minimales quand ils sont
+absents, puis le paquet est importé depuis la racine du dépôt.
+BenchRoot crée un dossier temporaire qui tient lieu de /data, /boot,
+/media, /dev et /proc/cmdline : les slots y sont des images fichier (ou des périphériques
+loop en root), et les chemins du plugin sont redirigés le temps du banc.
+"""
+import os
+import sys
+import types
+import shutil
+import tempfile
+import functools
+import subprocess
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "DreamBootManager"
+
+# Constantes de plugin.py contenant des chemins /media
+MEDIA_PATH_CONSTANTS = ("IMAGE_SEARCH_DIRS", "BACKUP_LOCATIONS", "CHUNK_STORE_LOCATIONS", "DOWNLOAD_CACHE_LOCATIONS")
+
+
+class Stub:
+    """Écran, composant ou descripteur factice"""
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+    def __getattr__(self, name):
+        return Stub()
+
+    def __call__(self, *args, **kwargs):
+        return Stub()
+
+
+class StubScreen(Stub):
+    """Screen : les widgets sont rangés dans un dict (self["menu"] = ...)"""
+
+    def __init__(self, session=None, *args, **kwargs):
+        Stub.__init__(self, session, *args, **kwargs)
+        self.session = session
+        self.widgets = {}
+        self.onLayoutFinish = []
+
+    def __setitem__(self, name, widget):
+        self.widgets[name] = widget
+
+    def __getitem__(self, name):
+        return self.widgets[name]
+
+    def setTitle(self, title):
+        self.title = title
+
+    def close(self, *result):
+        self.result = result
+
+
+class StubMessageBox(Stub):
+    TYPE_YESNO = 0
+    TYPE_INFO = 1
+    TYPE_WARNING = 2
+    TYPE_ERROR = 3
+
+
+class StubPluginDescriptor(Stub):
+    WHERE_PLUGINMENU = 0
+    WHERE_EXTENSIONSMENU = 1
+
+
+class StubTimer:
+    """eTimer sans boucle principale : start() ne déclenche rien"""
+
+    def __init__(self):
+        self.callback = []
+
+    def start(self, msec, single_shot=False):
+        pass
+
+    def stop(self):
+        pass
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def install_enigma2_stubs():
+    """Remplace les modules Enigma2 absents (sans effet sur un récepteur)"""
+    if "enigma" in sys.modules or importlib.util.find_spec("enigma") is not None:
+        return
+    for name in ("Plugins", "Screens", "Components", "Components.Sources", "Tools"):
+        _module(name)
+    _module("Plugins.Plugin", PluginDescriptor=StubPluginDescriptor)
+    _module("Screens.Screen", Screen=StubScreen)
+    _module("Screens.MessageBox", MessageBox=StubMessageBox)
+    _module("Screens.ChoiceBox", ChoiceBox=Stub)
+    _module("Components.Label", Label=Stub)
+    _module("Components.MenuList", MenuList=Stub)
+    _module("Components.ActionMap", ActionMap=Stub, HelpableActionMap=Stub)
+    _module("Components.ProgressBar", ProgressBar=Stub)
+    _module("Components.Sources.StaticText", StaticText=Stub)
+    _module("Tools.Directories", fileExists=os.path.exists, pathExists=os.path.exists)
+    _module("enigma", eTimer=StubTimer)
+
+
+def import_modules(*names):
+    """Importe des modules du plugin (ex. "plugin", "fsprofile") et les retourne dans l'ordre"""
+    install_enigma2_stubs()
+    if PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            PACKAGE, os.path.join(ROOT, "__init__.py"), submodule_search_locations=[ROOT])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[PACKAGE] = package
+        spec.loader.exec_module(package)
+    return [importlib.import_module("%s.%s" % (PACKAGE, name)) for name in names]
+
+
+def load_plugin():
+    return import_modules("plugin")[0]
+
+
+def run(argv):
+    subprocess.run(argv, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def make_rootfs_tree(path, files=500, file_kb=16, name="Bench Image"):
+    """Arborescence façon rootfs : /etc/issue, dossiers système et files fichiers de file_kb Ko"""
+    payload = os.urandom(file_kb * 1024)
+    for directory in ("bin", "sbin", "etc", "lib", "boot", "usr/lib"):
+        os.makedirs(os.path.join(path, directory), exist_ok=True)
+    with open(os.path.join(path, "etc", "issue"), 'w') as f:
+        f.write("Welcome to %s \\n \\l\n" % name)
+    for i in range(files):
+        directory = os.path.join(path, "usr", "lib", "d%02d" % (i % 50))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "f%05d" % i), 'wb') as f:
+            f.write(payload)
+    return path
+
+
+class BenchRoot:
+    """Racine temporaire data/ boot/ media/ dev/ et redirection des chemins du plugin
+
+    use_loop=True attache chaque partition à un périphérique loop (root requis) :
+    dev/mmcblk0p5 devient alors un lien vers /dev/loopN.
+    """
+
+    def __init__(self, plugin, use_loop=False):
+        self.plugin = plugin
+        self.use_loop = use_loop
+        self.path = tempfile.mkdtemp(prefix="dreambootmanager_bench.")
+        self.data_dir = self._dir("data")
+        self.boot_dir = self._dir("boot")
+        self.media_dir = self._dir("media")
+        self.dev_dir = self._dir("dev")
+        self.images_dir = self._dir("images")
+        self.emmc_device = os.path.join(self.dev_dir, "mmcblk0")
+        self.sd_device = os.path.join(self.dev_dir, "mmcblk1")
+        self.cmdline_path = os.path.join(self.path, "cmdline")
+        self.loops = {}
+        self.saved = {}
+
+    def _dir(self, name):
+        path = os.path.join(self.path, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def media(self, path):
+        """/media/hdd -> <racine>/media/hdd"""
+        if path == "/media" or path.startswith("/media/"):
+            return self.media_dir + path[len("/media"):]
+        return path
+
+    def _set(self, name, value):
+        if name not in self.saved:
+            self.saved[name] = getattr(self.plugin, name)
+        setattr(self.plugin, name, value)
+
+    def redirect(self, sd_slots=None):
+        """Redirige les chemins du plugin vers la racine ; sd_slots fixe le nombre de slots SD"""
+        self._set("DATA_DIR", self.data_dir)
+        self._set("BOOT_DIR", self.boot_dir)
+        self._set("MEDIA_DIR", self.media_dir)
+        self._set("CMDLINE_PATH", self.cmdline_path)
+        self._set("EMMC_DEVICE", self.emmc_device)
+        self._set("SD_CARD_DEVICE", self.sd_device)
+        self._set("DREAMCARD_PARTITION", self.plugin.partition_path(self.sd_device, 1))
+        self._set("DREAMCARD_MOUNT", self.media(self.saved.get("DREAMCARD_MOUNT", self.plugin.DREAMCARD_MOUNT)))
+        for name in MEDIA_PATH_CONSTANTS:
+            value = self.saved.get(name, getattr(self.plugin, name))
+            self._set(name, [self.media(item) if isinstance(item, str) else (self.media(item[0]),) + tuple(item[1:])
+                             for item in value])
+        if sd_slots is not None:
+            build = self.saved.get("build_slot_registry", self.plugin.build_slot_registry)
+            self._set("build_slot_registry", functools.partial(build, sd_default_slots=sd_slots))
+
+    def restore(self):
+        for name, value in self.saved.items():
+            setattr(self.plugin, name, value)
+        self.saved = {}
+
+    def write_cmdline(self, text):
+        """Contenu de /proc/cmdline vu par le plugin"""
+        with open(self.cmdline_path, 'w') as f:
+            f.write(text.rstrip('\n') + '\n')
+
+    def boot_manager(self):
+        """BootManager neuf, cache des slots et manifestes dans data/ (DATA_DIR redirigé)"""
+        return self.plugin.BootManager()
+
+    def create_partition(self, node, size_mb, tree=None, fstype="ext4"):
+        """Crée la partition node (chemin sous dev/) : image creuse, ext4 rempli depuis tree si donné"""
+        self.release(node)
+        image = os.path.join(self.images_dir, os.path.basename(node) + ".img")
+        with open(image, 'wb') as f:
+            f.truncate(size_mb * 1024 * 1024)
+        if fstype == "ext4":
+            run(["mke2fs", "-q", "-F", "-t", "ext4"] + (["-d", tree] if tree else []) + [image])
+        if self.use_loop:
+            loop = subprocess.check_output(["losetup", "-f", "--show", image]).decode().strip()
+            self.loops[node] = loop
+            os.symlink(loop, node)
+        else:
+            os.rename(image, node)
+        return node
+
+    def create_disk(self, node, size_mb):
+        """Disque entier (image fichier) : la carte SD passée à partition_sd_card"""
+        with open(node, 'wb') as f:
+            f.truncate(size_mb * 1024 * 1024)
+        return node
+
+    def release(self, node):
+        loop = self.loops.pop(node, None)
+        if loop is not None:
+            subprocess.call(["losetup", "-d", loop], stderr=subprocess.DEVNULL)
+        if os.path.lexists(node):
+            os.remove(node)
+
+    def cleanup(self):
+        for mount_point in sorted((os.path.join(self.media_dir, name) for name in os.listdir(self.media_dir)),
+                                  reverse=True):
+            if os.path.ismount(mount_point):
+                subprocess.call(["umount", "-l", mount_point], stderr=subprocess.DEVNULL)
+        for node in list(self.loops):
+            self.release(node)
+        self.restore()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+        return False
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Inventaire des disques et partitions depuis sysfs
+
+Lit /sys/block/*/size, les fichiers start/size de chaque partition et les
+tailles de blocs logique/physique, puis détecte le type de système de
+fichiers en lisant directement les octets magiques du superblock. Aucun
+processus externe n'est lancé (pas de fdisk | grep | awk).
+"""
+import os
+import struct
+
+SYS_BLOCK = "/sys/block"
+DEV_DIR = "/dev"
+SYSFS_SECTOR_SIZE = 512
+
+EXT_SUPERBLOCK_OFFSET = 1024
+EXT_MAGIC = 0xEF53
+EXT_COMPAT_HAS_JOURNAL = 0x0004
+EXT_INCOMPAT_EXT4 = 0x0040 | 0x0080 | 0x0200  # extents, 64bit, flex_bg
+
+
+def read_sysfs(path, default=None):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except (OSError, IOError):
+        return default
+
+
+def read_sysfs_int(path, default=0):
+    value = read_sysfs(path)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def detect_fstype(device):
+    """Type de système de fichiers d'après les octets magiques, None si inconnu"""
+    try:
+        with open(device, 'rb') as f:
+            head = f.read(4096 + 2048)
+    except (OSError, IOError):
+        return None
+
+    if len(head) >= EXT_SUPERBLOCK_OFFSET + 0x68:
+        sb = head[EXT_SUPERBLOCK_OFFSET:]
+        if struct.unpack_from('<H', sb, 0x38)[0] == EXT_MAGIC:
+            compat, incompat = struct.unpack_from('<II', sb, 0x5C)
+            if incompat & EXT_INCOMPAT_EXT4:
+                return 'ext4'
+            if compat & EXT_COMPAT_HAS_JOURNAL:
+                return 'ext3'
+            return 'ext2'
+
+    if len(head) >= 512 and head[510:512] == b'\x55\xaa':
+        if head[82:87] == b'FAT32':
+            return 'vfat'
+        if head[54:59] in (b'FAT16', b'FAT12'):
+            return 'vfat'
+        if head[3:11] == b'EXFAT   ':
+            return 'exfat'
+        if head[3:11] == b'NTFS    ':
+            return 'ntfs'
+
+    if head[4086:4096] in (b'SWAPSPACE2', b'SWAP-SPACE'):
+        return 'swap'
+
+    if head[512:520] == b'EFI PART':
+        return 'gpt'
+
+    return None
+
+
+class Partition:
+    """Partition d'un disque (positions en secteurs de 512 octets)"""
+
+    def __init__(self, disk, name, number, start, size):
+        self.disk = disk
+        self.name = name
+        self.device = os.path.join(DEV_DIR, name)
+        self.number = number
+        self.start = start
+        self.size = size
+        self._fstype = None
+        self._fstype_probed = False
+
+    @property
+    def size_bytes(self):
+        return self.size * SYSFS_SECTOR_SIZE
+
+    @property
+    def fstype(self):
+        """Détecté à la première demande puis mémorisé"""
+        if not self._fstype_probed:
+            self._fstype = detect_fstype(self.device)
+            self._fstype_probed = True
+        return self._fstype
+
+    def __repr__(self):
+        return "<Partition %s #%d start=%d size=%d>" % (self.device, self.number, self.start, self.size)
+
+
+class Disk:
+    """Disque bloc et ses partitions"""
+
+    def __init__(self, name, size, logical_block_size, physical_block_size, removable):
+        self.name = name
+        self.device = os.path.join(DEV_DIR, name)
+        self.size = size
+        self.logical_block_size = logical_block_size
+        self.physical_block_size = physical_block_size
+        self.removable = removable
+        self.partitions = []
+
+    @property
+    def size_bytes(self):
+        return self.size * SYSFS_SECTOR_SIZE
+
+    @property
+    def size_mib(self):
+        return self.size_bytes // (1024 * 1024)
+
+    def partition(self, number):
+        for part in self.partitions:
+            if part.number == number:
+                return part
+        return None
+
+    def __repr__(self):
+        return "<Disk %s size=%d parts=%d>" % (self.device, self.size, len(self.partitions))
+
+
+class BlockInventory:
+    """Modèle en mémoire des disques et partitions, indexé par nom et chemin /dev"""
+
+    def __init__(self, disks):
+        self.disks = dict((disk.name, disk) for disk in disks)
+        self.partitions = {}
+        for disk in disks:
+            for part in disk.partitions:
+                self.partitions[part.device] = part
+
+    def disk(self, device):
+        return self.disks.get(os.path.basename(device))
+
+    def partition(self, device):
+        return self.partitions.get(device)
+
+    def exists(self, device):
+        return self.disk(device) is not None or device in self.partitions
+
+
+def scan_disk(name, sys_block=SYS_BLOCK):
+    """Lit un disque et ses partitions depuis sysfs"""
+    base = os.path.join(sys_block, name)
+    disk = Disk(
+        name,
+        read_sysfs_int(os.path.join(base, "size")),
+        read_sysfs_int(os.path.join(base, "queue", "logical_block_size"), SYSFS_SECTOR_SIZE),
+        read_sysfs_int(os.path.join(base, "queue", "physical_block_size"), SYSFS_SECTOR_SIZE),
+        read_sysfs_int(os.path.join(base, "removable")) == 1,
+    )
+    try:
+        entries = os.listdir(base)
+    except OSError:
+        entries = []
+    for entry in entries:
+        part_dir = os.path.join(base, entry)
+        number = read_sysfs_int(os.path.join(part_dir, "partition"), None)
+        if number is None:
+            continue
+        disk.partitions.append(Partition(
+            disk, entry, number,
+            read_sysfs_int(os.path.join(part_dir, "start")),
+            read_sysfs_int(os.path.join(part_dir, "size")),
+        ))
+    disk.partitions.sort(key=lambda part: part.number)
+    return disk
+
+
+def scan_block_devices(sys_block=SYS_BLOCK):
+    """Construit l'inventaire de tous les disques présents"""
+    try:
+        names = sorted(os.listdir(sys_block))
+    except OSError:
+        names = []
+    return BlockInventory([scan_disk(name, sys_block) for name in names])
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""Modèle de bootconfig.txt
+
+Le fichier est analysé une seule fois : clés d'en-tête (default, timeout...)
+puis sections [nom] avec leurs entrées cmd/arg. Les lignes brutes sont
+conservées dans leur ordre d'origine pour que la réécriture soit exacte.
+Les modèles analysés sont mis en cache sur (mtime, taille) du fichier.
+"""
+import os
+import re
+import threading
+
+SECTION_RE = re.compile(r'^\s*\[([^\]]+)\]\s*$')
+KEY_RE = re.compile(r'^\s*([A-Za-z_][\w.]*)\s*=(.*)$')
+ROOT_RE = re.compile(r'(?:^|\s)root=(\S+)')
+
+
+class BootSection:
+    """Section [nom] de bootconfig.txt"""
+
+    def __init__(self, name, header_line):
+        self.name = name
+        self.lines = [header_line]
+        self.values = {}
+        self.index = None
+
+    @property
+    def cmd(self):
+        return self.values.get('cmd')
+
+    @property
+    def arg(self):
+        return self.values.get('arg')
+
+    @property
+    def root(self):
+        """Périphérique root= déclaré dans arg"""
+        match = ROOT_RE.search(self.arg or '')
+        return match.group(1) if match else None
+
+    def is_image(self):
+        return self.cmd is not None and self.arg is not None
+
+    def as_image(self):
+        """Format dict historique utilisé par les écrans"""
+        return {
+            'name': self.name,
+            'cmd': self.cmd,
+            'arg': self.arg,
+            'index': self.index,
+            'source': 'bootconfig'
+        }
+
+
+class BootConfig:
+    """bootconfig.txt analysé, avec accès indexé par nom, index et root"""
+
+    def __init__(self, text=''):
+        self.header_lines = []
+        self.header = {}
+        self.sections = []
+        self.parse(text)
+
+    def parse(self, text):
+        section = None
+        for line in text.splitlines(True):
+            match = SECTION_RE.match(line)
+            if match:
+                section = BootSection(match.group(1).strip(), line)
+                self.sections.append(section)
+                continue
+
+            key_match = KEY_RE.match(line)
+            if section is None:
+                self.header_lines.append(line)
+                if key_match:
+                    self.header.setdefault(key_match.group(1), key_match.group(2).strip())
+            else:
+                section.lines.append(line)
+                if key_match:
+                    section.values.setdefault(key_match.group(1), key_match.group(2).strip())
+        self.reindex()
+
+    def reindex(self):
+        """Reconstruit les index après une modification"""
+        self.images = [section for section in self.sections if section.is_image()]
+        self.by_name = {}
+        self.by_root = {}
+        for index, section in enumerate(self.images):
+            section.index = index
+            self.by_name.setdefault(section.name, section)
+            if section.root:
+                self.by_root.setdefault(section.root, section)
+
+    def to_text(self):
+        """Texte complet, identique à l'original si rien n'a été modifié"""
+        lines = list(self.header_lines)
+        for section in self.sections:
+            lines.extend(section.lines)
+        return ''.join(lines)
+
+    def image(self, index):
+        if 0 <= index < len(self.images):
+            return self.images[index]
+        return None
+
+    def find(self, name):
+        return self.by_name.get(name)
+
+    def find_by_root(self, root):
+        return self.by_root.get(root)
+
+    def image_list(self):
+        return [section.as_image() for section in self.images]
+
+    @property
+    def default(self):
+        try:
+            return int(self.header.get('default', ''))
+        except ValueError:
+            return None
+
+    def set_header(self, key, value):
+        """Modifie (ou ajoute en tête) une clé d'en-tête"""
+        value = str(value)
+        for i, line in enumerate(self.header_lines):
+            match = KEY_RE.match(line)
+            if match and match.group(1) == key:
+                ending = line[len(line.rstrip('\r\n')):] or '\n'
+                self.header_lines[i] = '%s=%s%s' % (key, value, ending)
+                break
+        else:
+            self.header_lines.insert(0, '%s=%s\n' % (key, value))
+        self.header[key] = value
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def load_bootconfig(path):
+    """Retourne le BootConfig de path, relu seulement si mtime ou taille ont changé"""
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+
+    with open(path, 'r', newline='') as f:
+        config = BootConfig(f.read())
+
+    with _cache_lock:
+        _cache[path] = (key, config)
+    return config
+
+
+def invalidate_bootconfig(path=None):
+    """Oublie le modèle en cache (tous les fichiers si path est None)"""
+    with _cache_lock:
+        if path is None:
+            _cache.clear()
+        else:
+            _cache.pop(path, None)
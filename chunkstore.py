@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""Sauvegardes incrémentales dédupliquées des slots
+
+Le flux tar du slot est découpé en morceaux dont les frontières dépendent
+du contenu : une empreinte sur une fenêtre glissante (crc32 des 48 octets
+précédents) est évaluée à chaque frontière d'enregistrement tar (512
+octets), et une coupure a lieu quand ses bits de poids faible sont nuls.
+Comme toute insertion dans un tar est un multiple de 512 octets, les
+frontières se réalignent juste après une modification : d'une sauvegarde
+à l'autre, seuls les morceaux modifiés sont écrits.
+
+Chaque morceau est compressé (zlib) et rangé sous son sha256. Un manifeste
+JSON par sauvegarde liste les morceaux dans l'ordre. Disposition compatible
+FAT32 : 256 sous-dossiers au plus, morceaux de 2 Mio maximum, aucun fichier
+proche de la limite de 4 Go.
+
+    store/
+        chunks/ab/cdef0123...   morceau sha256 "abcdef0123..." compressé
+        backups/mmcblk0p5_20261018-0730.json
+"""
+import os
+import io
+import json
+import time
+import zlib
+import hashlib
+import tarfile
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from .fileutils import fsync_dir, write_if_changed
+from .installer import extract_tar_stream
+
+CHUNK_MIN_SIZE = 128 * 1024
+CHUNK_MAX_SIZE = 2 * 1024 * 1024
+# Frontière candidate tous les 512 octets, 1 chance sur 1024 : morceaux de ~512 Kio en moyenne
+CHUNK_ALIGN = 512
+CHUNK_MASK = (1 << 10) - 1
+CHUNK_WINDOW = 48
+CHUNK_COMPRESS_LEVEL = 3
+STORE_MAX_WORKERS = max(1, os.cpu_count() or 1)
+STORE_COPY_BUFFER = 1024 * 1024
+STORE_EXCLUDE = ('lost+found',)
+
+
+class StoreError(Exception):
+    """Magasin de morceaux illisible ou incohérent"""
+    pass
+
+
+class ChunkStore:
+    """Magasin de morceaux adressés par sha256 et manifestes de sauvegarde"""
+
+    def __init__(self, root):
+        self.root = root
+        self.chunks_dir = os.path.join(root, "chunks")
+        self.backups_dir = os.path.join(root, "backups")
+        for directory in (self.chunks_dir, self.backups_dir):
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self._known = None
+        # Dossiers de morceaux modifiés, synchronisés avant l'écriture du manifeste
+        self._unsynced_dirs = set()
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunks_dir, digest[:2], digest[2:])
+
+    def known_chunks(self):
+        """Ensemble des morceaux présents (listé une fois, puis tenu à jour)"""
+        if self._known is None:
+            known = set()
+            for prefix in os.listdir(self.chunks_dir):
+                directory = os.path.join(self.chunks_dir, prefix)
+                if len(prefix) == 2 and os.path.isdir(directory):
+                    known.update(prefix + name for name in os.listdir(directory) if not name.endswith('.tmp'))
+            self._known = known
+        return self._known
+
+    def put_chunk(self, data):
+        """Range un morceau s'il est nouveau ; retourne (sha256, taille, octets écrits)"""
+        digest = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            if digest in self.known_chunks():
+                return digest, len(data), 0
+        compressed = zlib.compress(data, CHUNK_COMPRESS_LEVEL)
+        path = self.chunk_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "%s.%d.tmp" % (path, threading.get_ident())
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+            # Un morceau connu n'est jamais réécrit : il doit être complet sur disque
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        with self.lock:
+            self._known.add(digest)
+            self._unsynced_dirs.add(os.path.dirname(path))
+        return digest, len(data), len(compressed)
+
+    def sync_chunks(self):
+        """Rend durables les entrées des morceaux écrits depuis le dernier appel"""
+        with self.lock:
+            directories, self._unsynced_dirs = self._unsynced_dirs, set()
+        for directory in sorted(directories):
+            fsync_dir(directory)
+        fsync_dir(self.chunks_dir)
+
+    def get_chunk(self, digest):
+        """Relit, décompresse et vérifie un morceau"""
+        try:
+            with open(self.chunk_path(digest), 'rb') as f:
+                data = zlib.decompress(f.read())
+        except (OSError, zlib.error) as e:
+            raise StoreError("Chunk %s unreadable: %s" % (digest, str(e)))
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise StoreError("Chunk %s is corrupted" % digest)
+        return data
+
+    def list_backups(self):
+        """Manifestes de sauvegarde, les plus récents d'abord"""
+        backups = []
+        for name in os.listdir(self.backups_dir):
+            if name.endswith('.json'):
+                try:
+                    backups.append(self.load_manifest(os.path.join(self.backups_dir, name)))
+                except StoreError as e:
+                    print("[BootManager]", str(e))
+        return sorted(backups, key=lambda manifest: manifest['created'], reverse=True)
+
+    def load_manifest(self, path):
+        try:
+            with open(path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            raise StoreError("Invalid backup manifest %s: %s" % (path, str(e)))
+        manifest['path'] = path
+        return manifest
+
+    def save_manifest(self, manifest):
+        """Écrit le manifeste, après que tous ses morceaux sont sur disque"""
+        self.sync_chunks()
+        name = "%s_%s.json" % (manifest['slot'], time.strftime("%Y%m%d-%H%M%S", time.localtime(manifest['created'])))
+        path = os.path.join(self.backups_dir, name)
+        write_if_changed(path, json.dumps(manifest, separators=(',', ':')))
+        manifest['path'] = path
+        return path
+
+    def delete_backup(self, manifest):
+        """Supprime un manifeste ; ses morceaux partent au prochain garbage_collect"""
+        os.remove(manifest['path'])
+
+    def prune(self, keep):
+        """Ne garde que les keep sauvegardes les plus récentes de chaque slot"""
+        seen = collections.Counter()
+        removed = 0
+        for manifest in self.list_backups():
+            seen[manifest['slot']] += 1
+            if seen[manifest['slot']] > keep:
+                self.delete_backup(manifest)
+                removed += 1
+        return removed
+
+    def garbage_collect(self):
+        """Supprime les morceaux qu'aucun manifeste ne référence (et les .tmp orphelins)
+
+        Retourne (morceaux supprimés, octets libérés).
+        """
+        referenced = set()
+        for manifest in self.list_backups():
+            referenced.update(digest for digest, size in manifest['chunks'])
+        removed = freed = 0
+        for prefix in os.listdir(self.chunks_dir):
+            directory = os.path.join(self.chunks_dir, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.endswith('.tmp') or prefix + name not in referenced:
+                    path = os.path.join(directory, name)
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                    removed += 1
+            if not os.listdir(directory):
+                os.rmdir(directory)
+        self._known = None
+        return removed, freed
+
+
+class Chunker:
+    """Objet fichier en écriture : découpe le flux en morceaux et les range en parallèle"""
+
+    def __init__(self, store, max_workers=STORE_MAX_WORKERS):
+        self.store = store
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.pending = collections.deque()
+        self.buffer = bytearray()
+        self.scan_from = CHUNK_MIN_SIZE
+        self.chunks = []
+        self.bytes_in = 0
+        self.bytes_written = 0
+        self.new_chunks = 0
+
+    def _find_cut(self, final):
+        """Position de coupure dans le tampon (aligné sur une frontière d'enregistrement), ou None"""
+        view = memoryview(self.buffer)
+        try:
+            limit = min(len(view), CHUNK_MAX_SIZE)
+            position = self.scan_from
+            while position <= limit:
+                if not zlib.crc32(view[position - CHUNK_WINDOW:position]) & CHUNK_MASK:
+                    return position
+                position += CHUNK_ALIGN
+            self.scan_from = position
+        finally:
+            view.release()
+        if len(self.buffer) >= CHUNK_MAX_SIZE:
+            return CHUNK_MAX_SIZE
+        if final and self.buffer:
+            return len(self.buffer)
+        return None
+
+    def _cut(self, final=False):
+        while True:
+            cut = self._find_cut(final)
+            if cut is None:
+                return
+            self.pending.append(self.executor.submit(self.store.put_chunk, bytes(self.buffer[:cut])))
+            del self.buffer[:cut]
+            self.scan_from = CHUNK_MIN_SIZE
+            while len(self.pending) > 2 * self.max_workers:
+                self._collect_oldest()
+
+    def _collect_oldest(self):
+        digest, size, written = self.pending.popleft().result()
+        self.chunks.append([digest, size])
+        self.bytes_written += written
+        if written:
+            self.new_chunks += 1
+
+    def write(self, data):
+        self.buffer += data
+        self.bytes_in += len(data)
+        if len(self.buffer) >= CHUNK_MIN_SIZE:
+            self._cut()
+        return len(data)
+
+    def close(self):
+        self._cut(final=True)
+        while self.pending:
+            self._collect_oldest()
+        self.executor.shutdown(wait=True)
+
+    def abort(self):
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.executor.shutdown(wait=True)
+
+
+class ChunkReader:
+    """Objet fichier en lecture : recompose le flux d'une sauvegarde, morceaux préchargés en parallèle"""
+
+    def __init__(self, store, manifest, max_workers=STORE_MAX_WORKERS, on_read=None):
+        self.store = store
+        self.digests = iter(digest for digest, size in manifest['chunks'])
+        self.max_workers = max_workers
+        self.on_read = on_read
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.pending = collections.deque()
+        self.chunk = b''
+        self.chunk_start = 0
+        self.offset = 0
+        self._prefetch()
+
+    def _prefetch(self):
+        while len(self.pending) < 2 * self.max_workers:
+            digest = next(self.digests, None)
+            if digest is None:
+                return
+            self.pending.append(self.executor.submit(self.store.get_chunk, digest))
+
+    def read(self, size=-1):
+        parts = []
+        while size < 0 or size > 0:
+            if self.offset >= len(self.chunk):
+                if not self.pending:
+                    break
+                self.chunk_start += len(self.chunk)
+                self.chunk = self.pending.popleft().result()
+                self.offset = 0
+                self._prefetch()
+            available = len(self.chunk) - self.offset
+            count = available if size < 0 else min(size, available)
+            parts.append(self.chunk[self.offset:self.offset + count])
+            self.offset += count
+            if size > 0:
+                size -= count
+        data = b''.join(parts)
+        if data and self.on_read is not None:
+            self.on_read(self.tell())
+        return data
+
+    def tell(self):
+        return self.chunk_start + self.offset
+
+    def seek(self, position, whence=os.SEEK_SET):
+        """Retour en arrière possible seulement dans le morceau courant"""
+        if whence == os.SEEK_CUR:
+            position += self.tell()
+        if whence == os.SEEK_END or not self.chunk_start <= position <= self.chunk_start + len(self.chunk):
+            raise io.UnsupportedOperation("seek outside the current chunk")
+        self.offset = position - self.chunk_start
+        return position
+
+    def close(self):
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.executor.shutdown(wait=True)
+
+
+def backup_tree(store, root, slot, info=None, progress=None, max_workers=STORE_MAX_WORKERS):
+    """Sauvegarde incrémentale de l'arborescence root (slot monté) dans store
+
+    slot identifie la source (ex. "mmcblk0p5"), info est ajouté au manifeste.
+    progress(bytes_in, total, files) est appelé au fil de l'archivage.
+    Retourne le manifeste enregistré, enrichi des statistiques de la sauvegarde.
+    """
+    st = os.statvfs(root)
+    total = (st.f_blocks - st.f_bfree) * st.f_frsize
+    state = {'files': 0}
+    start_time = time.time()
+
+    def member_filter(tarinfo):
+        if os.path.normpath(tarinfo.name) in STORE_EXCLUDE:
+            return None
+        state['files'] += 1
+        if progress is not None:
+            progress(chunker.bytes_in, total, state['files'])
+        return tarinfo
+
+    chunker = Chunker(store, max_workers)
+    try:
+        with tarfile.open(fileobj=chunker, mode='w|', format=tarfile.PAX_FORMAT,
+                          bufsize=STORE_COPY_BUFFER, copybufsize=STORE_COPY_BUFFER) as tar:
+            tar.add(root, arcname='.', recursive=True, filter=member_filter)
+        chunker.close()
+    except BaseException:
+        chunker.abort()
+        raise
+
+    manifest = dict(info or {})
+    manifest.update({
+        'slot': slot,
+        'created': int(time.time()),
+        'files': state['files'],
+        'size': chunker.bytes_in,
+        'chunks': chunker.chunks,
+    })
+    store.save_manifest(manifest)
+
+    elapsed = time.time() - start_time
+    manifest.update({
+        'new_chunks': chunker.new_chunks,
+        'bytes_written': chunker.bytes_written,
+        'elapsed': elapsed,
+        'throughput': chunker.bytes_in / elapsed if elapsed > 0 else 0.0,
+    })
+    return manifest
+
+
+def restore_tree(store, manifest, target, progress=None, max_workers=STORE_MAX_WORKERS):
+    """Extrait une sauvegarde dans target (slot monté) en relisant les morceaux dans l'ordre
+
+    progress(bytes_read, total, member) est appelé à chaque fichier extrait.
+    Retourne un dict {files, bytes, elapsed, throughput}.
+    """
+    total = manifest['size']
+    state = {'position': 0}
+    start_time = time.time()
+
+    def on_read(position):
+        state['position'] = position
+
+    def on_member(name):
+        if progress is not None:
+            progress(state['position'], total, name)
+
+    reader = ChunkReader(store, manifest, max_workers, on_read)
+    try:
+        files = extract_tar_stream(reader, target, on_member)
+    except tarfile.TarError as e:
+        raise StoreError("Invalid backup stream: %s" % str(e))
+    finally:
+        reader.close()
+
+    elapsed = time.time() - start_time
+    return {
+        'files': files,
+        'bytes': total,
+        'elapsed': elapsed,
+        'throughput': total / elapsed if elapsed > 0 else 0.0,
+    }
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Clonage d'un slot ext2/3/4 vers une autre partition, blocs utilisés seulement
+
+Les bitmaps de blocs de la source indiquent les blocs alloués ; seuls ces
+blocs sont copiés, à la même position, avec de grandes lectures/écritures
+dans un tampon aligné sur la page (ou copy_file_range entre deux fichiers
+image). Le système de fichiers obtenu a la taille de la source : il est
+ensuite vérifié puis agrandi à la taille de la partition cible.
+"""
+import os
+import mmap
+import stat
+import time
+
+from .ext4 import Ext4Reader, Ext4Error
+
+CLONE_BUFFER_SIZE = 4 * 1024 * 1024
+# Trous plus petits que cela (en octets) copiés avec les blocs voisins : moins d'appels système
+CLONE_MERGE_GAP = 128 * 1024
+
+
+class CloneError(Exception):
+    """Clonage bloc à bloc impossible (format, taille ou erreur d'E/S)"""
+    pass
+
+
+def device_size(path):
+    """Taille en octets d'un périphérique bloc ou d'une image"""
+    with open(path, 'rb') as f:
+        return f.seek(0, os.SEEK_END)
+
+
+def used_runs(source, merge_gap=CLONE_MERGE_GAP):
+    """Lit les bitmaps de la source : (runs en octets [(offset, longueur)], taille du FS en octets)"""
+    try:
+        with Ext4Reader(source) as reader:
+            block_runs = reader.allocated_block_runs()
+            block_size = reader.block_size
+            fs_bytes = reader.sb['blocks_count'] * block_size
+    except (Ext4Error, OSError) as e:
+        raise CloneError("Cannot read block bitmaps of %s: %s" % (source, str(e)))
+
+    runs = []
+    for start, count in block_runs:
+        offset, length = start * block_size, count * block_size
+        if runs and offset - (runs[-1][0] + runs[-1][1]) <= merge_gap:
+            runs[-1] = (runs[-1][0], offset + length - runs[-1][0])
+        else:
+            runs.append((offset, length))
+    return runs, fs_bytes
+
+
+def _copy_range_pwrite(src_fd, dst_fd, view, offset, length):
+    done = 0
+    while done < length:
+        chunk = min(length - done, len(view))
+        got = os.preadv(src_fd, [view[:chunk]], offset + done)
+        if got <= 0:
+            raise CloneError("Short read at offset %d" % (offset + done))
+        written = 0
+        while written < got:
+            written += os.pwrite(dst_fd, view[written:got], offset + done + written)
+        done += got
+        yield got
+
+
+def _copy_range_cfr(src_fd, dst_fd, offset, length, chunk_size):
+    done = 0
+    while done < length:
+        copied = os.copy_file_range(src_fd, dst_fd, min(length - done, chunk_size), offset + done, offset + done)
+        if copied <= 0:
+            raise CloneError("Short copy at offset %d" % (offset + done))
+        done += copied
+        yield copied
+
+
+def clone_used_blocks(source, target, progress=None, buffer_size=CLONE_BUFFER_SIZE):
+    """Copie les blocs alloués du système de fichiers source vers target
+
+    target doit être au moins aussi grand que le système de fichiers source.
+    progress(done, total) reçoit les octets copiés. Retourne un dict
+    {bytes, fs_bytes, runs, elapsed, throughput, method}.
+    """
+    start_time = time.time()
+    runs, fs_bytes = used_runs(source)
+    target_size = device_size(target)
+    if target_size < fs_bytes:
+        raise CloneError("Target (%d MB) is smaller than the source filesystem (%d MB)" % (
+            target_size >> 20, fs_bytes >> 20))
+
+    total = sum(length for offset, length in runs)
+    src_fd = os.open(source, os.O_RDONLY)
+    try:
+        dst_fd = os.open(target, os.O_WRONLY)
+        try:
+            # copy_file_range ne fonctionne qu'entre fichiers réguliers (images)
+            use_cfr = (hasattr(os, 'copy_file_range') and
+                       stat.S_ISREG(os.fstat(src_fd).st_mode) and stat.S_ISREG(os.fstat(dst_fd).st_mode))
+            buf = mmap.mmap(-1, buffer_size)
+            view = memoryview(buf)
+            done = 0
+            try:
+                for offset, length in runs:
+                    run_done = 0
+                    if use_cfr:
+                        try:
+                            for copied in _copy_range_cfr(src_fd, dst_fd, offset, length, buffer_size):
+                                run_done += copied
+                                if progress is not None:
+                                    progress(done + run_done, total)
+                        except OSError:
+                            # Non supporté par ce système de fichiers : repli sur pread/pwrite
+                            use_cfr = False
+                            run_done = 0
+                    if run_done < length:
+                        for copied in _copy_range_pwrite(src_fd, dst_fd, view, offset, length):
+                            run_done += copied
+                            if progress is not None:
+                                progress(done + run_done, total)
+                    done += run_done
+            finally:
+                view.release()
+                buf.close()
+            os.fsync(dst_fd)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+    elapsed = time.time() - start_time
+    return {
+        'bytes': total,
+        'fs_bytes': fs_bytes,
+        'runs': len(runs),
+        'elapsed': elapsed,
+        'throughput': total / elapsed if elapsed > 0 else 0.0,
+        'method': 'copy_file_range' if use_cfr else 'pread/pwrite',
+    }
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""Exécution des commandes externes sans shell
+
+Toutes les commandes du plugin (mount, umount, mkfs, tune2fs, cp...) passent
+par un CommandRunner : argv en liste (pas de /bin/sh, rien à échapper),
+délai maximal, stdout et stderr capturés, et durée de chaque commande
+gardée dans un historique circulaire. Le backend qui lance réellement les
+processus est interchangeable : FakeBackend rejoue des réponses programmées
+et enregistre les appels, pour tester sans récepteur.
+"""
+import time
+import tempfile
+import threading
+import subprocess
+import collections
+
+# Délai par défaut (mount, umount...) ; mkfs et e2fsck passent le leur
+COMMAND_TIMEOUT = 60
+COMMAND_HISTORY_SIZE = 100
+
+
+class CommandResult:
+    """Résultat d'une commande : code de sortie, sorties capturées, durée"""
+
+    def __init__(self, argv, returncode, stdout=b'', stderr=b'', elapsed=0.0, error=None, timed_out=False):
+        self.argv = argv
+        self.returncode = returncode
+        self.stdout = stdout or b''
+        self.stderr = stderr or b''
+        self.elapsed = elapsed
+        # Lancement impossible ou délai dépassé (returncode vaut alors -1)
+        self.error = error
+        self.timed_out = timed_out
+        self.finished_at = time.time()
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    @property
+    def output(self):
+        return self.stdout.decode('utf-8', 'replace')
+
+    def error_message(self):
+        """Dernière ligne de stderr, sinon la cause de l'échec"""
+        if self.timed_out:
+            return self.error
+        lines = self.stderr.decode('utf-8', 'replace').strip().split('\n')
+        if lines[-1]:
+            return lines[-1]
+        return self.error or "exit code %d" % self.returncode
+
+    def as_dict(self):
+        return {
+            'argv': self.argv,
+            'returncode': self.returncode,
+            'elapsed': self.elapsed,
+            'error': None if self.ok else self.error_message(),
+            'timed_out': self.timed_out,
+            'finished_at': self.finished_at,
+        }
+
+    def __repr__(self):
+        return "<CommandResult %s -> %d (%.3f s)>" % (" ".join(self.argv), self.returncode, self.elapsed)
+
+
+class SubprocessBackend:
+    """Lance les processus avec subprocess, sans shell"""
+
+    def run(self, argv, timeout, input=None):
+        """Retourne (returncode, stdout, stderr) ; lève OSError ou subprocess.TimeoutExpired"""
+        proc = subprocess.run(argv, input=input, stdin=None if input is not None else subprocess.DEVNULL,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+        return proc.returncode, proc.stdout, proc.stderr
+
+    def start(self, argv, stderr):
+        """Processus en arrière-plan (objet Popen), stderr vers un fichier"""
+        return subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=stderr)
+
+
+class FakeProcess:
+    """Processus terminé immédiatement, interface de Popen utilisée par RunningCommand"""
+
+    def __init__(self, returncode):
+        self.returncode = returncode
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+    def terminate(self):
+        pass
+
+    def kill(self):
+        pass
+
+
+class FakeBackend:
+    """Backend de test : aucune commande lancée
+
+    respond(prefix, ...) programme la réponse des commandes dont l'argv commence
+    par prefix (nom du programme ou liste) ; la dernière réponse programmée est
+    prioritaire. Les autres commandes réussissent sans sortie. calls garde tous
+    les argv reçus.
+    """
+
+    def __init__(self, default_returncode=0):
+        self.default_returncode = default_returncode
+        self.responses = []
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def respond(self, prefix, returncode=0, stdout=b'', stderr=b'', timeout=False):
+        if isinstance(prefix, str):
+            prefix = [prefix]
+        self.responses.insert(0, (list(prefix), returncode, stdout, stderr, timeout))
+
+    def lookup(self, argv):
+        for prefix, returncode, stdout, stderr, timeout in self.responses:
+            if argv[:len(prefix)] == prefix:
+                return returncode, stdout, stderr, timeout
+        return self.default_returncode, b'', b'', False
+
+    def run(self, argv, timeout, input=None):
+        with self.lock:
+            self.calls.append(list(argv))
+        returncode, stdout, stderr, timed_out = self.lookup(argv)
+        if timed_out:
+            raise subprocess.TimeoutExpired(argv, timeout)
+        return returncode, stdout, stderr
+
+    def start(self, argv, stderr):
+        with self.lock:
+            self.calls.append(list(argv))
+        returncode, _stdout, error, _timed_out = self.lookup(argv)
+        stderr.write(error)
+        return FakeProcess(returncode)
+
+
+class RunningCommand:
+    """Commande longue lancée en arrière-plan (cp -a), suivie par poll()
+
+    Passé timeout secondes, le processus est tué comme dans CommandRunner.run.
+    """
+
+    def __init__(self, runner, argv, timeout=None):
+        self.runner = runner
+        self.argv = argv
+        self.timeout = timeout
+        self.timed_out = False
+        self.start_time = time.time()
+        # stderr dans un fichier : un tube plein bloquerait le processus
+        self.errors = tempfile.TemporaryFile()
+        try:
+            self.process = runner.backend.start(argv, self.errors)
+            self.launch_error = None
+        except OSError as e:
+            self.process = None
+            self.launch_error = str(e)
+        self.result = None
+
+    def remaining(self):
+        """Secondes restantes avant le délai maximal, None sans délai"""
+        if self.timeout is None:
+            return None
+        return max(0.0, self.timeout - (time.time() - self.start_time))
+
+    def poll(self):
+        """None tant que la commande tourne, sinon son code de sortie"""
+        if self.process is None:
+            return -1
+        returncode = self.process.poll()
+        if returncode is None and self.remaining() == 0:
+            self.timed_out = True
+            self.kill()
+            returncode = self.process.wait()
+        return returncode
+
+    def wait(self):
+        """Attend la fin et retourne le CommandResult (enregistré dans l'historique)"""
+        if self.result is not None:
+            return self.result
+        returncode = -1
+        if self.process is not None:
+            try:
+                returncode = self.process.wait(self.remaining())
+            except subprocess.TimeoutExpired:
+                self.timed_out = True
+                self.kill()
+                returncode = self.process.wait()
+        self.errors.seek(0)
+        stderr = self.errors.read()
+        self.errors.close()
+        error = self.launch_error
+        if self.timed_out:
+            returncode = -1
+            error = "timed out after %d s" % self.timeout
+        self.result = CommandResult(self.argv, returncode, stderr=stderr, elapsed=time.time() - self.start_time,
+                                    error=error, timed_out=self.timed_out)
+        self.runner.record(self.result)
+        return self.result
+
+    def terminate(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def kill(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+
+
+class CommandRunner:
+    """Point d'entrée unique des commandes externes, avec historique des durées"""
+
+    def __init__(self, backend=None, history_size=COMMAND_HISTORY_SIZE):
+        self.backend = backend if backend is not None else SubprocessBackend()
+        self.history = collections.deque(maxlen=history_size)
+        self.lock = threading.Lock()
+
+    def run(self, argv, timeout=COMMAND_TIMEOUT, input=None):
+        """Exécute argv et attend sa fin ; ne lève pas d'exception (voir CommandResult.error)"""
+        argv = [str(arg) for arg in argv]
+        start_time = time.time()
+        try:
+            returncode, stdout, stderr = self.backend.run(argv, timeout, input)
+            result = CommandResult(argv, returncode, stdout, stderr)
+        except subprocess.TimeoutExpired:
+            result = CommandResult(argv, -1, error="timed out after %d s" % timeout, timed_out=True)
+        except OSError as e:
+            result = CommandResult(argv, -1, error=str(e))
+        result.elapsed = time.time() - start_time
+        self.record(result)
+        return result
+
+    def spawn(self, argv, timeout=None):
+        """Lance argv en arrière-plan et retourne un RunningCommand (tué après timeout secondes)"""
+        return RunningCommand(self, [str(arg) for arg in argv], timeout)
+
+    def record(self, result):
+        with self.lock:
+            self.history.append(result)
+
+    def recent(self, count=None):
+        """Dernières commandes exécutées, la plus ancienne en premier"""
+        with self.lock:
+            results = list(self.history)
+        return results[-count:] if count else results
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""Téléchargement d'archives d'images avec reprise et cache local
+
+Les fichiers sont écrits en flux avec un tampon de taille fixe dans un
+fichier .part. Après une coupure, le téléchargement reprend avec un en-tête
+HTTP Range (validé par If-Range sur l'ETag ou la date de modification).
+Une fois terminé, le fichier est rangé dans un cache adressé par son
+SHA256 : une URL déjà téléchargée, ou une autre URL au contenu identique,
+est servie depuis le cache sans réseau.
+"""
+import os
+import re
+import json
+import time
+import socket
+import hashlib
+import http.client
+import urllib.request
+import urllib.error
+
+from .fileutils import write_if_changed
+
+DOWNLOAD_BUFFER_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = 30
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_RETRY_DELAY = 2.0
+USER_AGENT = "DreamBootManager"
+
+NETWORK_ERRORS = (urllib.error.URLError, socket.timeout, ConnectionError, http.client.HTTPException)
+
+
+class DownloadError(Exception):
+    """Téléchargement impossible ou contenu invalide"""
+    pass
+
+
+def url_extension(url):
+    """Extension d'archive de l'URL (.tar.xz, .zip...), conservée dans le cache"""
+    path = urllib.request.urlparse(url).path.lower()
+    match = re.search(r'(\.tar\.(gz|bz2|xz)|\.tgz|\.tbz2|\.txz|\.tar|\.zip)$', path)
+    return match.group(1) if match else ""
+
+
+class DownloadCache:
+    """Cache adressé par contenu : objects/<sha[:2]>/<sha><ext> + index des URL"""
+
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.partial_dir = os.path.join(root, "partial")
+        self.index_path = os.path.join(root, "index.json")
+        for directory in (self.objects_dir, self.partial_dir):
+            os.makedirs(directory, exist_ok=True)
+        self.index = self.load_index()
+
+    def load_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self):
+        write_if_changed(self.index_path, json.dumps(self.index, indent=1, sort_keys=True))
+
+    def object_path(self, sha256, extension=""):
+        return os.path.join(self.objects_dir, sha256[:2], sha256 + extension)
+
+    def find_object(self, sha256):
+        """Chemin de l'objet sha256 s'il est en cache"""
+        directory = os.path.join(self.objects_dir, sha256[:2])
+        try:
+            for name in os.listdir(directory):
+                if name.startswith(sha256):
+                    return os.path.join(directory, name)
+        except OSError:
+            pass
+        return None
+
+    def lookup(self, url=None, sha256=None):
+        """Objet en cache pour cette URL ou cette empreinte, sinon None"""
+        if sha256 is None and url in self.index:
+            sha256 = self.index[url]['sha256']
+        if sha256 is None:
+            return None
+        return self.find_object(sha256)
+
+    def partial_paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.partial_dir, key)
+        return base + ".part", base + ".json"
+
+    def store(self, url, part_path, sha256, size):
+        """Range le fichier complet dans le cache et met à jour l'index"""
+        existing = self.find_object(sha256)
+        if existing is not None:
+            os.remove(part_path)
+            path = existing
+        else:
+            path = self.object_path(sha256, url_extension(url))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.rename(part_path, path)
+        self.index[url] = {'sha256': sha256, 'size': size, 'time': int(time.time())}
+        self.save_index()
+        return path
+
+
+def open_url(url, offset=0, validator=None, timeout=DOWNLOAD_TIMEOUT):
+    headers = {'User-Agent': USER_AGENT}
+    if offset:
+        headers['Range'] = 'bytes=%d-' % offset
+        if validator:
+            headers['If-Range'] = validator
+    return urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout)
+
+
+def download(url, cache, expected_sha256=None, progress=None, retries=DOWNLOAD_RETRIES):
+    """Télécharge url dans le cache (ou l'y retrouve)
+
+    progress(done, total) est appelé pendant le transfert (total peut être 0).
+    Retourne un dict {path, sha256, size, cached, resumed, elapsed}.
+    """
+    start_time = time.time()
+    if expected_sha256:
+        expected_sha256 = expected_sha256.lower()
+
+    cached = cache.lookup(sha256=expected_sha256) if expected_sha256 else cache.lookup(url=url)
+    if cached is not None:
+        sha256 = expected_sha256 or cache.index[url]['sha256']
+        return {'path': cached, 'sha256': sha256, 'size': os.path.getsize(cached),
+                'cached': True, 'resumed': 0, 'elapsed': time.time() - start_time}
+
+    part_path, meta_path = cache.partial_paths(url)
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+
+    resumed = 0
+    attempt = 0
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        try:
+            response = open_url(url, offset, meta.get('validator'))
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and offset:
+                # Plage invalide : le .part est complet ou périmé, on recommence
+                os.remove(part_path)
+                meta = {}
+                continue
+            raise DownloadError("HTTP error %d for %s" % (e.code, url))
+        except NETWORK_ERRORS as e:
+            attempt += 1
+            if attempt > retries:
+                raise DownloadError("Cannot connect to %s: %s" % (url, str(e)))
+            time.sleep(DOWNLOAD_RETRY_DELAY)
+            continue
+
+        with response:
+            status = response.getcode()
+            if offset and status == 206:
+                resumed += offset
+            else:
+                offset = 0
+            length = response.headers.get('Content-Length')
+            total = offset + int(length) if length else 0
+            meta = {
+                'validator': response.headers.get('ETag') or response.headers.get('Last-Modified'),
+                'total': total or meta.get('total', 0),
+            }
+            write_if_changed(meta_path, json.dumps(meta))
+
+            # Empreinte calculée pendant le transfert ; en cas de reprise,
+            # la partie déjà présente est rehachée une fois
+            hasher = hashlib.sha256()
+            if offset:
+                with open(part_path, 'rb') as f:
+                    for data in iter(lambda: f.read(DOWNLOAD_BUFFER_SIZE), b''):
+                        hasher.update(data)
+
+            done = offset
+            try:
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    while True:
+                        data = response.read(DOWNLOAD_BUFFER_SIZE)
+                        if not data:
+                            break
+                        f.write(data)
+                        hasher.update(data)
+                        done += len(data)
+                        if progress is not None:
+                            progress(done, total)
+            except NETWORK_ERRORS as e:
+                attempt += 1
+                if attempt > retries:
+                    raise DownloadError("Download of %s interrupted: %s" % (url, str(e)))
+                print("[BootManager] Download interrupted at %d bytes, resuming: %s" % (done, str(e)))
+                time.sleep(DOWNLOAD_RETRY_DELAY)
+                continue
+
+        if total and done < total:
+            attempt += 1
+            if attempt > retries:
+                raise DownloadError("Download of %s incomplete (%d/%d bytes)" % (url, done, total))
+            print("[BootManager] Download truncated at %d/%d bytes, resuming" % (done, total))
+            time.sleep(DOWNLOAD_RETRY_DELAY)
+            continue
+        break
+
+    sha256 = hasher.hexdigest()
+
+    if expected_sha256 and sha256 != expected_sha256:
+        os.remove(part_path)
+        raise DownloadError("Checksum mismatch for %s" % url)
+
+    size = os.path.getsize(part_path)
+    path = cache.store(url, part_path, sha256, size)
+    try:
+        os.remove(meta_path)
+    except OSError:
+        pass
+    return {'path': path, 'sha256': sha256, 'size': size, 'cached': False,
+            'resumed': resumed, 'elapsed': time.time() - start_time}
@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+"""Lecteur ext2/3/4 en lecture seule, sans montage
+
+Lit directement le superblock, les descripteurs de groupes, les inodes et les
+extents/blocs de répertoire depuis un périphérique bloc (/dev/mmcblkXpY) ou
+une image fichier créée avec mke2fs. Aucun montage, donc ni rejeu du journal
+ni écriture d'atime.
+"""
+import stat
+import struct
+
+EXT4_SUPERBLOCK_OFFSET = 1024
+EXT4_SUPERBLOCK_SIZE = 1024
+EXT4_MAGIC = 0xEF53
+EXT4_ROOT_INO = 2
+
+# Flags des features
+COMPAT_SPARSE_SUPER2 = 0x0200
+INCOMPAT_FILETYPE = 0x0002
+INCOMPAT_META_BG = 0x0010
+INCOMPAT_EXTENTS = 0x0040
+INCOMPAT_64BIT = 0x0080
+INCOMPAT_INLINE_DATA = 0x8000
+RO_COMPAT_SPARSE_SUPER = 0x0001
+RO_COMPAT_GDT_CSUM = 0x0010
+RO_COMPAT_BIGALLOC = 0x0200
+RO_COMPAT_METADATA_CSUM = 0x0400
+
+# Flags de groupe de blocs
+EXT4_BG_BLOCK_UNINIT = 0x0002
+
+# Flags d'inode
+EXT4_EXTENTS_FL = 0x00080000
+EXT4_INLINE_DATA_FL = 0x10000000
+
+EXT4_EXTENT_MAGIC = 0xF30A
+EXT4_INIT_MAX_LEN = 32768
+
+MAX_SYMLINK_DEPTH = 8
+
+
+class Ext4Error(Exception):
+    """Erreur de lecture ou format non supporté"""
+    pass
+
+
+def parse_superblock(data):
+    """Décode les champs utiles d'un superblock ext2/3/4 (1024 octets)"""
+    if len(data) < EXT4_SUPERBLOCK_SIZE:
+        raise Ext4Error("Short superblock")
+
+    magic = struct.unpack_from('<H', data, 0x38)[0]
+    if magic != EXT4_MAGIC:
+        raise Ext4Error("Bad ext4 magic 0x%04x" % magic)
+
+    (inodes_count, blocks_count_lo, r_blocks_count_lo, free_blocks_lo,
+     free_inodes_count, first_data_block, log_block_size, log_cluster_size,
+     blocks_per_group, clusters_per_group, inodes_per_group, mtime, wtime,
+     mnt_count, max_mnt_count) = struct.unpack_from('<IIIIIIIIIIIIIHh', data, 0)
+
+    state, errors = struct.unpack_from('<HH', data, 0x3A)
+    lastcheck = struct.unpack_from('<I', data, 0x40)[0]
+    rev_level = struct.unpack_from('<I', data, 0x4C)[0]
+    inode_size = struct.unpack_from('<H', data, 0x58)[0] if rev_level >= 1 else 128
+    feature_compat, feature_incompat, feature_ro_compat = struct.unpack_from('<III', data, 0x5C)
+    uuid = data[0x68:0x78]
+    volume_name = data[0x78:0x88].split(b'\0', 1)[0].decode('utf-8', 'replace')
+    reserved_gdt_blocks = struct.unpack_from('<H', data, 0xCE)[0]
+    desc_size = struct.unpack_from('<H', data, 0xFE)[0]
+    blocks_count_hi, r_blocks_count_hi, free_blocks_hi = struct.unpack_from('<III', data, 0x150)
+    kbytes_written = struct.unpack_from('<Q', data, 0x178)[0]
+    error_count, first_error_time = struct.unpack_from('<II', data, 0x194)
+    last_error_time = struct.unpack_from('<I', data, 0x1CC)[0]
+    backup_bgs = struct.unpack_from('<II', data, 0x24C)
+
+    is_64bit = bool(feature_incompat & INCOMPAT_64BIT)
+    if not is_64bit:
+        blocks_count_hi = r_blocks_count_hi = free_blocks_hi = 0
+        desc_size = 32
+    elif desc_size < 32:
+        desc_size = 32
+
+    return {
+        'inodes_count': inodes_count,
+        'blocks_count': blocks_count_lo | (blocks_count_hi << 32),
+        'reserved_blocks_count': r_blocks_count_lo | (r_blocks_count_hi << 32),
+        'free_blocks_count': free_blocks_lo | (free_blocks_hi << 32),
+        'free_inodes_count': free_inodes_count,
+        'first_data_block': first_data_block,
+        'block_size': 1024 << log_block_size,
+        'blocks_per_group': blocks_per_group,
+        'inodes_per_group': inodes_per_group,
+        'mtime': mtime,
+        'wtime': wtime,
+        'mnt_count': mnt_count,
+        'max_mnt_count': max_mnt_count,
+        'state': state,
+        'errors': errors,
+        'lastcheck': lastcheck,
+        'rev_level': rev_level,
+        'inode_size': inode_size,
+        'feature_compat': feature_compat,
+        'feature_incompat': feature_incompat,
+        'feature_ro_compat': feature_ro_compat,
+        'uuid': uuid.hex(),
+        'volume_name': volume_name,
+        'desc_size': desc_size,
+        'reserved_gdt_blocks': reserved_gdt_blocks,
+        'backup_bgs': backup_bgs,
+        'kbytes_written': kbytes_written,
+        'error_count': error_count,
+        'first_error_time': first_error_time,
+        'last_error_time': last_error_time,
+    }
+
+
+def read_superblock(device):
+    """Lit et décode le superblock d'un périphérique ou d'une image"""
+    with open(device, 'rb') as f:
+        f.seek(EXT4_SUPERBLOCK_OFFSET)
+        return parse_superblock(f.read(EXT4_SUPERBLOCK_SIZE))
+
+
+class Ext4Inode:
+    """Inode décodé (mode, taille, flags et i_block brut)"""
+
+    def __init__(self, number, data):
+        self.number = number
+        self.mode = struct.unpack_from('<H', data, 0x00)[0]
+        size_lo = struct.unpack_from('<I', data, 0x04)[0]
+        self.flags = struct.unpack_from('<I', data, 0x20)[0]
+        self.block = data[0x28:0x28 + 60]
+        size_hi = struct.unpack_from('<I', data, 0x6C)[0] if len(data) >= 0x70 else 0
+        self.size = size_lo | (size_hi << 32)
+
+    def is_dir(self):
+        return stat.S_ISDIR(self.mode)
+
+    def is_reg(self):
+        return stat.S_ISREG(self.mode)
+
+    def is_symlink(self):
+        return stat.S_ISLNK(self.mode)
+
+
+class Ext4Reader:
+    """Accès en lecture seule à un système de fichiers ext2/3/4"""
+
+    def __init__(self, device):
+        self.device = device
+        self.f = open(device, 'rb')
+        try:
+            self.f.seek(EXT4_SUPERBLOCK_OFFSET)
+            self.sb = parse_superblock(self.f.read(EXT4_SUPERBLOCK_SIZE))
+        except Exception:
+            self.f.close()
+            raise
+        self.block_size = self.sb['block_size']
+        self.group_count = (self.sb['blocks_count'] - self.sb['first_data_block'] +
+                            self.sb['blocks_per_group'] - 1) // self.sb['blocks_per_group']
+        self._descriptors = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
+
+    def read_block(self, block, count=1):
+        """Lit count blocs consécutifs à partir du numéro de bloc donné"""
+        self.f.seek(block * self.block_size)
+        data = self.f.read(count * self.block_size)
+        if len(data) != count * self.block_size:
+            raise Ext4Error("Short read at block %d" % block)
+        return data
+
+    def group_descriptor(self, group):
+        """Retourne le descripteur brut d'un groupe de blocs"""
+        if group not in self._descriptors:
+            if group >= self.group_count:
+                raise Ext4Error("Group %d out of range" % group)
+            desc_size = self.sb['desc_size']
+            table_block = self.sb['first_data_block'] + 1
+            offset = table_block * self.block_size + group * desc_size
+            self.f.seek(offset)
+            self._descriptors[group] = self.f.read(desc_size)
+        return self._descriptors[group]
+
+    def _descriptor_block(self, desc, lo_offset, hi_offset):
+        value = struct.unpack_from('<I', desc, lo_offset)[0]
+        if len(desc) >= 64:
+            value |= struct.unpack_from('<I', desc, hi_offset)[0] << 32
+        return value
+
+    def inode_table_block(self, group):
+        return self._descriptor_block(self.group_descriptor(group), 0x08, 0x28)
+
+    def block_bitmap_block(self, group):
+        return self._descriptor_block(self.group_descriptor(group), 0x00, 0x20)
+
+    def inode_bitmap_block(self, group):
+        return self._descriptor_block(self.group_descriptor(group), 0x04, 0x24)
+
+    def group_flags(self, group):
+        return struct.unpack_from('<H', self.group_descriptor(group), 0x12)[0]
+
+    def group_first_block(self, group):
+        return self.sb['first_data_block'] + group * self.sb['blocks_per_group']
+
+    def group_block_count(self, group):
+        """Nombre de blocs du groupe (le dernier groupe peut être incomplet)"""
+        return min(self.sb['blocks_per_group'], self.sb['blocks_count'] - self.group_first_block(group))
+
+    def group_has_superblock(self, group):
+        """Vrai si le groupe contient le superblock ou une copie de secours"""
+        if group == 0:
+            return True
+        if self.sb['feature_compat'] & COMPAT_SPARSE_SUPER2:
+            return group in self.sb['backup_bgs']
+        if not self.sb['feature_ro_compat'] & RO_COMPAT_SPARSE_SUPER or group == 1:
+            return True
+        for base in (3, 5, 7):
+            power = base
+            while power < group:
+                power *= base
+            if power == group:
+                return True
+        return False
+
+    def _group_metadata_runs(self, group):
+        """Blocs de métadonnées d'un groupe dont le bitmap n'est pas initialisé"""
+        first = self.group_first_block(group)
+        runs = []
+        if self.sb['feature_incompat'] & INCOMPAT_META_BG:
+            # Emplacement des descripteurs variable : tout le groupe par prudence
+            return [(first, self.group_block_count(group))]
+        if self.group_has_superblock(group):
+            gdt_blocks = (self.group_count * self.sb['desc_size'] + self.block_size - 1) // self.block_size
+            runs.append((first, 1 + gdt_blocks + self.sb['reserved_gdt_blocks']))
+        inode_table_blocks = (self.sb['inodes_per_group'] * self.sb['inode_size'] + self.block_size - 1) // self.block_size
+        runs.append((self.block_bitmap_block(group), 1))
+        runs.append((self.inode_bitmap_block(group), 1))
+        runs.append((self.inode_table_block(group), inode_table_blocks))
+        return runs
+
+    def allocated_block_runs(self):
+        """Runs (premier bloc, nombre) des blocs alloués d'après les bitmaps, triés et fusionnés"""
+        if self.sb['feature_ro_compat'] & RO_COMPAT_BIGALLOC:
+            raise Ext4Error("bigalloc filesystems are not supported")
+        uninit_flags = self.sb['feature_ro_compat'] & (RO_COMPAT_GDT_CSUM | RO_COMPAT_METADATA_CSUM)
+
+        # Zone de démarrage avant le premier groupe (bloc 0 avec des blocs de 1 Kio)
+        runs = [(0, self.sb['first_data_block'])] if self.sb['first_data_block'] else []
+        for group in range(self.group_count):
+            if uninit_flags and self.group_flags(group) & EXT4_BG_BLOCK_UNINIT:
+                runs.extend(self._group_metadata_runs(group))
+                continue
+            first = self.group_first_block(group)
+            count = self.group_block_count(group)
+            bitmap = int.from_bytes(self.read_block(self.block_bitmap_block(group)), 'little')
+            bitmap &= (1 << count) - 1
+            position = 0
+            while bitmap:
+                zeros = (bitmap & -bitmap).bit_length() - 1
+                bitmap >>= zeros
+                position += zeros
+                ones = (~bitmap & (bitmap + 1)).bit_length() - 1
+                runs.append((first + position, ones))
+                bitmap >>= ones
+                position += ones
+
+        merged = []
+        for start, count in sorted(runs):
+            if merged and start <= merged[-1][0] + merged[-1][1]:
+                last_start, last_count = merged[-1]
+                merged[-1] = (last_start, max(last_count, start + count - last_start))
+            else:
+                merged.append((start, count))
+        return merged
+
+    def read_inode(self, number):
+        """Lit l'inode numéro number"""
+        if number < 1 or number > self.sb['inodes_count']:
+            raise Ext4Error("Inode %d out of range" % number)
+        group, index = divmod(number - 1, self.sb['inodes_per_group'])
+        inode_size = self.sb['inode_size']
+        offset = self.inode_table_block(group) * self.block_size + index * inode_size
+        self.f.seek(offset)
+        data = self.f.read(inode_size)
+        if len(data) != inode_size:
+            raise Ext4Error("Short read on inode %d" % number)
+        return Ext4Inode(number, data)
+
+    def _extent_runs(self, node):
+        """Parcourt l'arbre d'extents et produit (bloc logique, bloc physique, longueur, initialisé)"""
+        magic, entries, _max, depth = struct.unpack_from('<HHHH', node, 0)
+        if magic != EXT4_EXTENT_MAGIC:
+            raise Ext4Error("Bad extent header")
+        for i in range(entries):
+            offset = 12 + i * 12
+            if depth == 0:
+                ee_block, ee_len, start_hi, start_lo = struct.unpack_from('<IHHI', node, offset)
+                initialized = ee_len <= EXT4_INIT_MAX_LEN
+                if not initialized:
+                    ee_len -= EXT4_INIT_MAX_LEN
+                yield ee_block, (start_hi << 32) | start_lo, ee_len, initialized
+            else:
+                ei_block, leaf_lo, leaf_hi = struct.unpack_from('<IIH', node, offset)
+                child = self.read_block((leaf_hi << 32) | leaf_lo)
+                for run in self._extent_runs(child):
+                    yield run
+
+    def _indirect_runs(self, block, level, logical, limit):
+        """Parcourt les blocs indirects (ext2/ext3)"""
+        per_block = self.block_size // 4
+        span = per_block ** level
+        pointers = struct.unpack('<%dI' % per_block, self.read_block(block))
+        for pointer in pointers:
+            if logical >= limit:
+                return
+            if pointer:
+                if level == 1:
+                    yield logical, pointer, 1, True
+                else:
+                    for run in self._indirect_runs(pointer, level - 1, logical, limit):
+                        yield run
+            logical += span // per_block if level > 1 else 1
+
+    def _blockmap_runs(self, inode, limit):
+        pointers = struct.unpack('<15I', inode.block)
+        for logical in range(12):
+            if logical >= limit:
+                return
+            if pointers[logical]:
+                yield logical, pointers[logical], 1, True
+        per_block = self.block_size // 4
+        logical = 12
+        for level, pointer in ((1, pointers[12]), (2, pointers[13]), (3, pointers[14])):
+            if logical >= limit:
+                return
+            if pointer:
+                for run in self._indirect_runs(pointer, level, logical, limit):
+                    yield run
+            logical += per_block ** level
+
+    def data_runs(self, inode):
+        """Retourne les runs de blocs de données d'un inode"""
+        limit = (inode.size + self.block_size - 1) // self.block_size
+        if inode.flags & EXT4_EXTENTS_FL:
+            return self._extent_runs(inode.block)
+        return self._blockmap_runs(inode, limit)
+
+    def read_data(self, inode, max_size=None):
+        """Lit le contenu d'un inode (fichier, répertoire ou lien long)"""
+        size = inode.size if max_size is None else min(inode.size, max_size)
+        if inode.flags & EXT4_INLINE_DATA_FL:
+            # Seule la partie stockée dans i_block est lue (60 octets)
+            return inode.block[:size]
+
+        data = bytearray(size)
+        for logical, physical, length, initialized in self.data_runs(inode):
+            start = logical * self.block_size
+            if start >= size:
+                continue
+            length = min(length, (size - start + self.block_size - 1) // self.block_size)
+            if initialized:
+                chunk = self.read_block(physical, length)
+                end = min(size, start + len(chunk))
+                data[start:end] = chunk[:end - start]
+        return bytes(data)
+
+    def _iter_dirents(self, inode):
+        data = self.read_data(inode)
+        if inode.flags & EXT4_INLINE_DATA_FL:
+            # Répertoire inline : inode parent puis entrées
+            parent = struct.unpack_from('<I', data, 0)[0]
+            yield '.', inode.number, 2
+            yield '..', parent, 2
+            data = data[4:]
+        has_filetype = bool(self.sb['feature_incompat'] & INCOMPAT_FILETYPE)
+        offset = 0
+        while offset + 8 <= len(data):
+            ino, rec_len, name_len, file_type = struct.unpack_from('<IHBB', data, offset)
+            if rec_len < 8:
+                break
+            if not has_filetype:
+                name_len |= file_type << 8
+                file_type = 0
+            if ino and name_len:
+                name = data[offset + 8:offset + 8 + name_len].decode('utf-8', 'surrogateescape')
+                yield name, ino, file_type
+            offset += rec_len
+
+    def scandir(self, inode):
+        """Liste les entrées (nom, inode, type) d'un inode répertoire"""
+        if not inode.is_dir():
+            raise Ext4Error("Inode %d is not a directory" % inode.number)
+        return list(self._iter_dirents(inode))
+
+    def _readlink(self, inode):
+        if inode.size < 60 and not inode.flags & (EXT4_EXTENTS_FL | EXT4_INLINE_DATA_FL):
+            # Lien symbolique rapide : cible stockée dans i_block
+            return inode.block[:inode.size].decode('utf-8', 'surrogateescape')
+        return self.read_data(inode).decode('utf-8', 'surrogateescape')
+
+    def lookup(self, path, follow=True, _depth=0):
+        """Résout un chemin absolu en inode"""
+        if _depth > MAX_SYMLINK_DEPTH:
+            raise Ext4Error("Too many levels of symbolic links")
+        inode = self.read_inode(EXT4_ROOT_INO)
+        parts = [part for part in path.split('/') if part and part != '.']
+        current = []
+        for i, part in enumerate(parts):
+            if not inode.is_dir():
+                raise Ext4Error("Not a directory: /%s" % '/'.join(current))
+            if part == '..':
+                current = current[:-1]
+                inode = self.lookup('/' + '/'.join(current), _depth=_depth)
+                continue
+            for name, ino, _type in self._iter_dirents(inode):
+                if name == part:
+                    break
+            else:
+                raise Ext4Error("No such file: %s" % path)
+            inode = self.read_inode(ino)
+            last = i == len(parts) - 1
+            if inode.is_symlink() and (follow or not last):
+                target = self._readlink(inode)
+                if not target.startswith('/'):
+                    target = '/' + '/'.join(current + [target])
+                rest = '/'.join(parts[i + 1:])
+                return self.lookup(target.rstrip('/') + '/' + rest, follow, _depth + 1)
+            current.append(part)
+        return inode
+
+    def exists(self, path):
+        try:
+            self.lookup(path)
+            return True
+        except Ext4Error:
+            return False
+
+    def listdir(self, path='/'):
+        """Liste les noms d'un répertoire (sans . et ..)"""
+        return [name for name, _ino, _type in self.scandir(self.lookup(path))
+                if name not in ('.', '..')]
+
+    def read_file(self, path, max_size=None):
+        """Lit le contenu d'un fichier régulier"""
+        inode = self.lookup(path)
+        if not inode.is_reg():
+            raise Ext4Error("Not a regular file: %s" % path)
+        return self.read_data(inode, max_size)
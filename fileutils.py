@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Écritures de fichiers de configuration économes et atomiques
+
+Le contenu est comparé avant écriture : un fichier inchangé n'est pas
+réécrit (usure eMMC). Sinon l'écriture passe par un fichier temporaire
+dans le même répertoire, fsync puis rename, si bien qu'une coupure de
+courant laisse toujours l'ancienne ou la nouvelle version complète.
+"""
+import os
+import stat
+import tempfile
+
+DEFAULT_FILE_MODE = 0o644
+
+
+def fsync_dir(path):
+    """Synchronise l'entrée de répertoire après un rename"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_if_changed(path, content, mode=None):
+    """Écrit content dans path seulement s'il diffère, de façon atomique
+
+    Retourne True si le fichier a été écrit, False s'il était déjà à jour.
+    """
+    data = content.encode('utf-8') if isinstance(content, str) else content
+
+    try:
+        st = os.stat(path)
+        with open(path, 'rb') as f:
+            current = f.read()
+    except OSError:
+        st = None
+        current = None
+
+    if current == data:
+        if mode is not None and stat.S_IMODE(st.st_mode) != mode:
+            os.chmod(path, mode)
+        return False
+
+    if mode is None:
+        mode = stat.S_IMODE(st.st_mode) if st is not None else DEFAULT_FILE_MODE
+
+    write_atomic(path, data, mode)
+    return True
+
+
+def write_atomic(path, data, mode=None):
+    """Remplace path par data via un fichier temporaire, fsync puis rename
+
+    mode=None ne change pas les droits (FAT ne les supporte pas).
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.%s.' % os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.rename(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    fsync_dir(directory)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Profils de création des systèmes de fichiers (eMMC interne, carte SD)
+
+Les cartes SD écrivent par unités d'effacement (souvent 4 Mo) : une écriture
+à cheval sur deux unités, ou des métadonnées éparpillées, coûtent plusieurs
+cycles lecture-effacement-écriture dans le contrôleur. Le profil "sd" aligne
+les partitions sur l'unité d'effacement détectée (sysfs preferred_erase_size)
+ou configurée, crée l'ext4 avec stride/stripe-width égaux à cette unité et
+des groupes flex_bg plus grands (métadonnées regroupées), enregistre un
+intervalle de commit du journal plus long dans le superblock, et monte les
+slots en noatime. Le profil "default" reproduit les commandes historiques.
+"""
+import os
+
+from .blockdev import SYS_BLOCK, read_sysfs_int
+
+MIB = 1024 * 1024
+EXT4_BLOCK_SIZE = 4096
+# Unité d'effacement supposée quand sysfs ne la donne pas (valeur courante des cartes SDHC)
+DEFAULT_ERASE_BLOCK = 4 * MIB
+MAX_ERASE_BLOCK = 64 * MIB
+# FAT32 exige au moins 65525 clusters ; secteurs réservés créés par mkfs.fat
+FAT32_MIN_CLUSTERS = 65525
+FAT32_RESERVED_BYTES = 32 * 512
+
+FS_PROFILES = {
+    'default': {
+        'erase_block': None,
+        'align': False,
+        'raid': False,
+        'flex_bg': None,
+        'commit': None,
+        'mount_options': None,
+        'fat_cluster_kb': None,
+    },
+    'sd': {
+        # None : détectée dans sysfs, sinon DEFAULT_ERASE_BLOCK
+        'erase_block': None,
+        'align': True,
+        'raid': True,
+        'flex_bg': 64,
+        # Secondes entre deux commits du journal (5 par défaut dans le noyau)
+        'commit': 30,
+        'mount_options': 'noatime',
+        # Taille maximale : réduite sur les petites partitions DREAMCARD
+        'fat_cluster_kb': 32,
+    },
+}
+
+
+class ProfileError(Exception):
+    """Profil inconnu"""
+    pass
+
+
+def get_profile(name):
+    try:
+        return FS_PROFILES[name]
+    except KeyError:
+        raise ProfileError("Unknown filesystem profile: %s" % name)
+
+
+def detect_erase_block(device, sys_block=SYS_BLOCK):
+    """Unité d'effacement annoncée par le contrôleur (octets), None si inconnue"""
+    name = os.path.basename(device)
+    size = read_sysfs_int(os.path.join(sys_block, name, "device", "preferred_erase_size"), 0)
+    # Valeurs aberrantes (0, non puissance de 2, trop grandes) ignorées
+    if size <= 0 or size & (size - 1) or size > MAX_ERASE_BLOCK:
+        return None
+    return size
+
+
+def erase_block_size(profile, device=None, sys_block=SYS_BLOCK):
+    """Unité d'effacement à utiliser pour ce profil (octets), au moins 1 MiB"""
+    size = profile['erase_block']
+    if size is None and device is not None:
+        size = detect_erase_block(device, sys_block)
+    return max(MIB, size or DEFAULT_ERASE_BLOCK)
+
+
+def alignment_mb(profile, erase_block):
+    """Alignement des partitions en MiB"""
+    return erase_block // MIB if profile['align'] else 1
+
+
+def ext4_commands(partition, profile, erase_block, fast=False):
+    """Commandes (argv) créant l'ext4 de partition selon le profil
+
+    fast=True initialise tables d'inodes et journal paresseusement (effacement rapide).
+    """
+    argv = ["mkfs.ext4", "-F"]
+    extended = []
+    if fast:
+        extended += ["lazy_itable_init=1", "lazy_journal_init=1", "nodiscard"]
+    if profile['raid']:
+        # Allocations alignées sur l'unité d'effacement
+        blocks = erase_block // EXT4_BLOCK_SIZE
+        argv += ["-b", str(EXT4_BLOCK_SIZE)]
+        extended += ["stride=%d" % blocks, "stripe_width=%d" % blocks]
+    if profile['flex_bg']:
+        argv += ["-G", str(profile['flex_bg'])]
+    if extended:
+        argv += ["-E", ",".join(extended)]
+    argv.append(partition)
+    return [argv] + tune_commands(partition, profile, erase_block, raid=False)
+
+
+def tune_commands(partition, profile, erase_block, raid=True):
+    """Commandes tune2fs appliquant le profil à un ext4 existant (clone)"""
+    extended = []
+    if raid and profile['raid']:
+        blocks = erase_block // EXT4_BLOCK_SIZE
+        extended += ["stride=%d" % blocks, "stripe_width=%d" % blocks]
+    if profile['commit']:
+        # Options de montage par défaut enregistrées dans le superblock
+        extended.append("mount_opts=commit=%d" % profile['commit'])
+    if not extended:
+        return []
+    return [["tune2fs", "-E", ",".join(extended), partition]]
+
+
+def fat32_clusters(size, cluster_size):
+    """Nombre approximatif de clusters d'un FAT32 de size octets"""
+    # Chaque cluster occupe aussi 4 octets dans chacune des deux FAT
+    return (size - FAT32_RESERVED_BYTES) // (cluster_size + 8)
+
+
+def fat_cluster_sectors(profile, size):
+    """Secteurs par cluster pour une partition FAT32 de size octets, None pour le choix de mkfs.fat
+
+    La taille du profil est divisée par deux jusqu'à obtenir assez de
+    clusters ; None si même un cluster d'un secteur n'y suffit pas.
+    """
+    if not profile['fat_cluster_kb']:
+        return None
+    sectors = profile['fat_cluster_kb'] * 1024 // 512
+    while sectors >= 1:
+        if fat32_clusters(size, sectors * 512) >= FAT32_MIN_CLUSTERS:
+            return sectors
+        sectors //= 2
+    return None
+
+
+def fat_commands(partition, profile, label, size):
+    """Commande mkfs.fat de la partition DREAMCARD (size en octets)"""
+    argv = ["mkfs.fat", "-F", "32", "-n", label]
+    sectors = fat_cluster_sectors(profile, size)
+    if sectors:
+        argv += ["-s", str(sectors)]
+    argv.append(partition)
+    return [argv]
+
+
+def mount_options(profile, readonly=False):
+    """Options -o de mount pour ce profil, None si aucune"""
+    options = []
+    if readonly:
+        options.append("ro")
+    if profile['mount_options']:
+        options.append(profile['mount_options'])
+    return ",".join(options) or None
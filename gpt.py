@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Écriture d'une table de partitions GPT en une seule transaction
+
+La table complète (MBR protecteur, en-tête et entrées primaires, copie de
+secours en fin de disque) est construite en mémoire puis écrite en une
+passe, suivie d'une seule relecture de la table par le noyau. Fonctionne
+aussi sur une image fichier ou un périphérique loop.
+"""
+import os
+import re
+import stat
+import time
+import uuid
+import zlib
+import fcntl
+import struct
+
+from .blockdev import SYS_BLOCK, read_sysfs_int
+
+SECTOR_SIZE = 512
+GPT_ENTRY_COUNT = 128
+GPT_ENTRY_SIZE = 128
+GPT_ENTRIES_SECTORS = GPT_ENTRY_COUNT * GPT_ENTRY_SIZE // SECTOR_SIZE
+GPT_FIRST_USABLE_LBA = 2 + GPT_ENTRIES_SECTORS
+
+GPT_TYPE_BASIC_DATA = uuid.UUID('EBD0A0A2-B9E5-4433-87C0-68B6B72699C7')
+GPT_TYPE_LINUX_FS = uuid.UUID('0FC63DAF-8483-4772-8E79-3D69D8477DE4')
+
+# ioctl de relecture de la table de partitions (_IO(0x12, 95))
+BLKRRPART = 0x125F
+
+
+class GPTError(Exception):
+    """Table de partitions invalide ou impossible à écrire"""
+    pass
+
+
+def partition_path(device, number):
+    """Nœud d'une partition : /dev/mmcblk1 -> /dev/mmcblk1p2, /dev/sda -> /dev/sda2"""
+    if re.search(r'\d$', device):
+        return "%sp%d" % (device, number)
+    return "%s%d" % (device, number)
+
+
+def disk_sectors(device):
+    """Nombre de secteurs de 512 octets du disque ou de l'image"""
+    with open(device, 'rb') as f:
+        return f.seek(0, os.SEEK_END) // SECTOR_SIZE
+
+
+def _protective_mbr(total_sectors):
+    mbr = bytearray(SECTOR_SIZE)
+    size = min(total_sectors - 1, 0xFFFFFFFF)
+    # Entrée unique de type 0xEE couvrant tout le disque
+    struct.pack_into('<B3sB3sII', mbr, 446, 0x00, b'\x00\x02\x00', 0xEE, b'\xff\xff\xff', 1, size)
+    mbr[510:512] = b'\x55\xaa'
+    return bytes(mbr)
+
+
+def _entries(partitions):
+    table = bytearray(GPT_ENTRY_COUNT * GPT_ENTRY_SIZE)
+    for i, part in enumerate(partitions):
+        name = part.get('name', '')[:36].encode('utf-16-le')
+        struct.pack_into('<16s16sQQQ72s', table, i * GPT_ENTRY_SIZE,
+                         part['type'].bytes_le, part.get('guid', uuid.uuid4()).bytes_le,
+                         part['start'], part['end'], 0, name)
+    return bytes(table)
+
+
+def _header(disk_guid, current_lba, backup_lba, last_usable, entries_lba, entries_crc):
+    header = bytearray(SECTOR_SIZE)
+    struct.pack_into('<8sIIIIQQQQ16sQIII', header, 0,
+                     b'EFI PART', 0x00010000, 92, 0, 0,
+                     current_lba, backup_lba, GPT_FIRST_USABLE_LBA, last_usable,
+                     disk_guid.bytes_le, entries_lba, GPT_ENTRY_COUNT, GPT_ENTRY_SIZE, entries_crc)
+    struct.pack_into('<I', header, 16, zlib.crc32(bytes(header[:92])) & 0xFFFFFFFF)
+    return bytes(header)
+
+
+def validate_layout(partitions, total_sectors):
+    """Vérifie que les partitions tiennent dans la zone utilisable sans se chevaucher"""
+    last_usable = total_sectors - GPT_ENTRIES_SECTORS - 2
+    if len(partitions) > GPT_ENTRY_COUNT:
+        raise GPTError("Too many partitions")
+    previous_end = GPT_FIRST_USABLE_LBA - 1
+    for i, part in enumerate(sorted(partitions, key=lambda p: p['start'])):
+        if part['end'] < part['start']:
+            raise GPTError("Partition %d ends before it starts" % (i + 1))
+        if part['start'] <= previous_end:
+            raise GPTError("Partition %d overlaps the previous one" % (i + 1))
+        if part['end'] > last_usable:
+            raise GPTError("Partition %d exceeds the disk size" % (i + 1))
+        previous_end = part['end']
+    return last_usable
+
+
+def write_gpt(device, partitions, total_sectors=None):
+    """Écrit une nouvelle table GPT contenant partitions
+
+    Chaque partition est un dict {'start', 'end' (LBA inclus), 'type' (UUID), 'name'}.
+    """
+    if total_sectors is None:
+        total_sectors = disk_sectors(device)
+    last_usable = validate_layout(partitions, total_sectors)
+
+    disk_guid = uuid.uuid4()
+    entries = _entries(partitions)
+    entries_crc = zlib.crc32(entries) & 0xFFFFFFFF
+    backup_lba = total_sectors - 1
+    backup_entries_lba = backup_lba - GPT_ENTRIES_SECTORS
+
+    primary = (_protective_mbr(total_sectors) +
+               _header(disk_guid, 1, backup_lba, last_usable, 2, entries_crc) +
+               entries)
+    backup = entries + _header(disk_guid, backup_lba, 1, last_usable, backup_entries_lba, entries_crc)
+
+    with open(device, 'r+b') as f:
+        f.seek(0)
+        f.write(primary)
+        f.seek(backup_entries_lba * SECTOR_SIZE)
+        f.write(backup)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def reread_partition_table(device):
+    """Demande au noyau de relire la table (sans effet sur une image fichier)"""
+    if not stat.S_ISBLK(os.stat(device).st_mode):
+        return True
+    fd = os.open(device, os.O_RDONLY)
+    try:
+        fcntl.ioctl(fd, BLKRRPART)
+        return True
+    except OSError as e:
+        print("[BootManager] BLKRRPART failed on %s: %s" % (device, str(e)))
+        return False
+    finally:
+        os.close(fd)
+
+
+def partitions_ready(device, partitions, sys_block=SYS_BLOCK):
+    """Vrai si /dev et sysfs exposent partitions avec leurs limites prévues
+
+    Les nœuds d'une ancienne table existent encore quand le noyau n'a pas
+    relu la table : start et size de sysfs doivent donc correspondre au plan.
+    """
+    name = os.path.basename(device)
+    for index, part in enumerate(partitions, 1):
+        node = partition_path(device, part.get('number', index))
+        base = os.path.join(sys_block, name, os.path.basename(node))
+        if not os.path.exists(base) or not os.path.exists(node):
+            return False
+        if (read_sysfs_int(os.path.join(base, "start"), -1) != part['start'] or
+                read_sysfs_int(os.path.join(base, "size"), -1) != part['end'] - part['start'] + 1):
+            return False
+    return True
+
+
+def wait_for_partitions(device, partitions, timeout=10.0, interval=0.1, sys_block=SYS_BLOCK):
+    """Attend que /sys/block et /dev exposent les partitions du plan, aux bonnes limites"""
+    if not stat.S_ISBLK(os.stat(device).st_mode):
+        return True
+    deadline = time.time() + timeout
+    while True:
+        if partitions_ready(device, partitions, sys_block):
+            return True
+        if time.time() >= deadline:
+            return False
+        time.sleep(interval)
@@ -8,6 +8,26 @@ mkdir -p "$PLUGIN_DIR"
 # Download plugin files
 wget -q -O "$PLUGIN_DIR/plugin.py" "$REPO_URL/plugin.py"
 wget -q -O "$PLUGIN_DIR/__init__.py" "$REPO_URL/__init__.py"
+wget -q -O "$PLUGIN_DIR/ext4.py" "$REPO_URL/ext4.py"
+wget -q -O "$PLUGIN_DIR/slotcache.py" "$REPO_URL/slotcache.py"
+wget -q -O "$PLUGIN_DIR/bootconfig.py" "$REPO_URL/bootconfig.py"
+wget -q -O "$PLUGIN_DIR/slots.py" "$REPO_URL/slots.py"
+wget -q -O "$PLUGIN_DIR/sdlayout.py" "$REPO_URL/sdlayout.py"
+wget -q -O "$PLUGIN_DIR/fsprofile.py" "$REPO_URL/fsprofile.py"
+wget -q -O "$PLUGIN_DIR/fileutils.py" "$REPO_URL/fileutils.py"
+wget -q -O "$PLUGIN_DIR/gpt.py" "$REPO_URL/gpt.py"
+wget -q -O "$PLUGIN_DIR/jobs.py" "$REPO_URL/jobs.py"
+wget -q -O "$PLUGIN_DIR/commands.py" "$REPO_URL/commands.py"
+wget -q -O "$PLUGIN_DIR/tracing.py" "$REPO_URL/tracing.py"
+wget -q -O "$PLUGIN_DIR/slothealth.py" "$REPO_URL/slothealth.py"
+wget -q -O "$PLUGIN_DIR/blockdev.py" "$REPO_URL/blockdev.py"
+wget -q -O "$PLUGIN_DIR/installer.py" "$REPO_URL/installer.py"
+wget -q -O "$PLUGIN_DIR/download.py" "$REPO_URL/download.py"
+wget -q -O "$PLUGIN_DIR/verify.py" "$REPO_URL/verify.py"
+wget -q -O "$PLUGIN_DIR/clone.py" "$REPO_URL/clone.py"
+wget -q -O "$PLUGIN_DIR/backup.py" "$REPO_URL/backup.py"
+wget -q -O "$PLUGIN_DIR/chunkstore.py" "$REPO_URL/chunkstore.py"
+wget -q -O "$PLUGIN_DIR/kernelsync.py" "$REPO_URL/kernelsync.py"
 wget -q -O "$PLUGIN_DIR/plugin.png" "$REPO_URL/plugin.png"
 
 ### Check if plugin installed correctly
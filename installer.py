@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""Installation en flux d'une archive rootfs dans un slot monté
+
+L'archive (.tar.gz, .tar.bz2, .tar.xz ou .zip) est lue une seule fois et
+extraite directement dans le point de montage du slot, avec des tampons de
+taille fixe. Rien n'est copié dans /tmp. Les empreintes md5/sha256 de
+l'archive sont calculées pendant la lecture et le débit est mesuré.
+"""
+import os
+import re
+import bz2
+import gzip
+import lzma
+import time
+import shutil
+import hashlib
+import tarfile
+import zipfile
+
+INSTALL_BUFFER_SIZE = 256 * 1024
+ARCHIVE_EXTENSIONS = ('.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz', '.tar', '.zip')
+NESTED_ROOTFS_RE = re.compile(r'(^|/)rootfs\.tar(\.(gz|bz2|xz))?$')
+
+
+class InstallError(Exception):
+    """Archive invalide ou extraction impossible"""
+    pass
+
+
+def is_image_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+class StreamHasher:
+    """Calcule md5 et sha256 de l'archive dans l'ordre des octets
+
+    Les lectures sont fournies avec leur position. Les octets sont hachés
+    dès qu'ils prolongent la partie déjà hachée ; un trou (lecture en avant,
+    cas du zip) est comblé en relisant seulement la zone manquante.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.md5 = hashlib.md5()
+        self.sha256 = hashlib.sha256()
+        self.hashed = 0
+        self.gap_file = None
+
+    def _update(self, data):
+        self.md5.update(data)
+        self.sha256.update(data)
+        self.hashed += len(data)
+
+    def _fill_gap(self, until):
+        if self.gap_file is None:
+            self.gap_file = open(self.path, 'rb')
+        self.gap_file.seek(self.hashed)
+        while self.hashed < until:
+            data = self.gap_file.read(min(INSTALL_BUFFER_SIZE, until - self.hashed))
+            if not data:
+                break
+            self._update(data)
+
+    def feed(self, position, data):
+        end = position + len(data)
+        if end <= self.hashed:
+            return
+        if position > self.hashed:
+            self._fill_gap(position)
+        self._update(data[self.hashed - position:])
+
+    def finish(self, size):
+        """Hache ce qui n'a pas été lu (fin de fichier) et retourne les empreintes"""
+        if self.hashed < size:
+            self._fill_gap(size)
+        if self.gap_file is not None:
+            self.gap_file.close()
+            self.gap_file = None
+        return self.md5.hexdigest(), self.sha256.hexdigest()
+
+
+class HashingReader:
+    """Objet fichier qui transmet chaque lecture au StreamHasher et compte les octets"""
+
+    def __init__(self, f, hasher, on_read=None):
+        self.f = f
+        self.hasher = hasher
+        self.on_read = on_read
+        self.position = f.tell()
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        if data:
+            self.hasher.feed(self.position, data)
+            self.position += len(data)
+            if self.on_read is not None:
+                self.on_read(self.position)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self.position = self.f.seek(offset, whence)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def seekable(self):
+        return True
+
+
+def open_decompressed(fileobj):
+    """Couche de décompression d'après les octets magiques (tar brut sinon)
+
+    GzipFile, LZMAFile et BZ2File lisent les flux concaténés produits par les
+    compresseurs parallèles (pigz, pixz, pbzip2, sauvegardes de slots), ce que
+    le mode flux de tarfile ne sait pas faire.
+    """
+    position = fileobj.tell()
+    magic = fileobj.read(6)
+    fileobj.seek(position)
+    if magic.startswith(b'\x1f\x8b'):
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    if magic.startswith(b'\xfd7zXZ\x00'):
+        return lzma.LZMAFile(fileobj, mode='rb')
+    if magic.startswith(b'BZh'):
+        return bz2.BZ2File(fileobj, mode='rb')
+    return fileobj
+
+
+def safe_member_path(name):
+    """Chemin relatif au slot, None si le membre remonte au-dessus de la racine"""
+    normalized = os.path.normpath(name.lstrip('/'))
+    if normalized == '..' or normalized.startswith('../'):
+        return None
+    return normalized
+
+
+def is_inside(target, path):
+    """Vrai si path, liens symboliques résolus, reste dans target"""
+    root = os.path.realpath(target)
+    resolved = os.path.realpath(path)
+    return resolved == root or resolved.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def prepare_member_path(target, name):
+    """Chemin d'extraction de name, None s'il sortirait du slot
+
+    Le dossier parent est résolu : un lien symbolique créé plus tôt par
+    l'archive (lib -> /usr/lib) ne doit pas faire écrire hors du slot. Un
+    lien déjà présent à l'emplacement du membre est supprimé avant
+    l'extraction, comme le fait GNU tar, pour ne pas écrire à travers lui.
+    """
+    path = os.path.join(target, name)
+    if not is_inside(target, os.path.dirname(path)):
+        return None
+    if os.path.islink(path):
+        os.unlink(path)
+    return path
+
+
+def extract_tar_stream(fileobj, target, on_member=None):
+    """Extrait une archive tar lue en flux dans target"""
+    count = 0
+    with tarfile.open(fileobj=open_decompressed(fileobj), mode='r|', bufsize=INSTALL_BUFFER_SIZE) as tar:
+        for member in tar:
+            name = safe_member_path(member.name)
+            if name is None:
+                print("[BootManager] Skipping unsafe archive member:", member.name)
+                continue
+            if name == '.':
+                continue
+            if member.islnk():
+                # Lien physique : la cible doit être un fichier du slot
+                link = safe_member_path(member.linkname)
+                if link is None or not is_inside(target, os.path.join(target, link)):
+                    print("[BootManager] Skipping unsafe hard link:", member.name)
+                    continue
+                member.linkname = link
+            if prepare_member_path(target, name) is None:
+                print("[BootManager] Skipping archive member outside the slot:", member.name)
+                continue
+            member.name = name
+            if hasattr(tarfile, 'fully_trusted_filter'):
+                # rootfs complet : liens absolus, nœuds de périphériques et propriétaires conservés
+                tar.extract(member, target, filter='fully_trusted')
+            else:
+                tar.extract(member, target)
+            count += 1
+            if on_member is not None:
+                on_member(member.name)
+    return count
+
+
+def extract_zip(reader, target, on_member=None):
+    """Extrait un zip ; un rootfs.tar.* imbriqué est lui-même extrait en flux"""
+    count = 0
+    with zipfile.ZipFile(reader) as archive:
+        # Ordre physique des membres pour une lecture séquentielle
+        members = sorted(archive.infolist(), key=lambda info: info.header_offset)
+        nested = [info for info in members if NESTED_ROOTFS_RE.search(info.filename)]
+        if len(nested) == 1:
+            with archive.open(nested[0]) as stream:
+                return extract_tar_stream(stream, target, on_member)
+
+        for info in members:
+            name = safe_member_path(info.filename)
+            if name is None:
+                print("[BootManager] Skipping unsafe archive member:", info.filename)
+                continue
+            if name == '.':
+                continue
+            path = prepare_member_path(target, name)
+            if path is None:
+                print("[BootManager] Skipping archive member outside the slot:", info.filename)
+                continue
+            if info.is_dir():
+                os.makedirs(path, exist_ok=True)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with archive.open(info) as src, open(path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, INSTALL_BUFFER_SIZE)
+                mode = (info.external_attr >> 16) & 0o7777
+                if mode:
+                    os.chmod(path, mode)
+            count += 1
+            if on_member is not None:
+                on_member(name)
+    return count
+
+
+def install_archive(archive_path, target, progress=None):
+    """Extrait archive_path dans target en une passe
+
+    progress(bytes_read, total_bytes, member) est appelé pendant la lecture.
+    Retourne un dict {files, bytes, elapsed, throughput, md5, sha256}.
+    """
+    if not os.path.isdir(target):
+        raise InstallError("Target %s is not a directory" % target)
+
+    total = os.path.getsize(archive_path)
+    hasher = StreamHasher(archive_path)
+    state = {'position': 0}
+    start_time = time.time()
+
+    def on_read(position):
+        state['position'] = position
+
+    def on_member(name):
+        if progress is not None:
+            progress(state['position'], total, name)
+
+    try:
+        with open(archive_path, 'rb') as f:
+            reader = HashingReader(f, hasher, on_read)
+            if zipfile.is_zipfile(archive_path):
+                files = extract_zip(reader, target, on_member)
+            else:
+                files = extract_tar_stream(reader, target, on_member)
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError, lzma.LZMAError) as e:
+        raise InstallError("Invalid archive %s: %s" % (os.path.basename(archive_path), str(e)))
+
+    md5, sha256 = hasher.finish(total)
+    elapsed = time.time() - start_time
+    return {
+        'files': files,
+        'bytes': total,
+        'elapsed': elapsed,
+        'throughput': total / elapsed if elapsed > 0 else 0.0,
+        'md5': md5,
+        'sha256': sha256,
+    }
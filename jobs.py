@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Exécution d'opérations longues sur un thread de travail
+
+Un Job lance une fonction sur un thread séparé. La fonction reçoit le job
+(argument nommé job) pour publier sa progression (pourcentage + étape) et
+marquer les points où l'annulation est possible. La progression transite
+par une queue que l'écran vide depuis la boucle principale (eTimer), de
+sorte que l'interface reste réactive pendant toute l'opération.
+"""
+import queue
+import threading
+import time
+
+
+class JobCancelled(Exception):
+    """Levée à un point d'annulation quand l'utilisateur a annulé le job"""
+    pass
+
+
+class Job:
+    """Opération exécutée en arrière-plan avec progression et annulation"""
+
+    def __init__(self, name, func, *args, **kwargs):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.events = queue.Queue()
+        self.percent = 0
+        self.step = ""
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.cancel_requested = threading.Event()
+        self.done = threading.Event()
+        self.start_time = None
+        self.elapsed = 0.0
+        self.thread = None
+
+    def start(self):
+        self.start_time = time.time()
+        self.thread = threading.Thread(target=self.run, name="Job-%s" % self.name)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args, job=self, **self.kwargs)
+        except JobCancelled:
+            self.cancelled = True
+            print("[BootManager] Job '%s' cancelled" % self.name)
+        except Exception as e:
+            self.error = str(e)
+            print("[BootManager] Job '%s' failed: %s" % (self.name, self.error))
+        finally:
+            self.elapsed = time.time() - self.start_time
+            self.events.put((100 if self.error is None and not self.cancelled else self.percent, "Finished"))
+            self.done.set()
+
+    def progress(self, percent, step):
+        """Publie la progression (appelé depuis le thread de travail)"""
+        self.percent = max(0, min(100, int(percent)))
+        self.step = step
+        self.events.put((self.percent, step))
+
+    def checkpoint(self):
+        """Point d'annulation : lève JobCancelled si l'annulation a été demandée"""
+        if self.cancel_requested.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        """Demande l'annulation au prochain point d'annulation"""
+        self.cancel_requested.set()
+
+    def poll(self):
+        """Vide la queue de progression (appelé depuis la boucle principale)"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def is_done(self):
+        return self.done.is_set()
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Copie du noyau des slots SD vers la partition FAT32 DREAMCARD
+
+Le bootloader ne lit pas l'ext4 de la carte SD : les entrées des slots SD
+chargent /kernelN.img avec fatload depuis la partition 1 (DREAMCARD). Le
+noyau est lu directement dans le rootfs du slot (/boot/kernel.img, sans
+montage) puis copié sous le nom attendu par l'entrée bootconfig. Une copie
+déjà identique (taille puis SHA256) n'est pas réécrite ; sinon l'écriture
+passe par un fichier temporaire et un rename, si bien qu'un noyau à moitié
+copié n'est jamais démarré.
+"""
+import os
+import re
+import hashlib
+
+from .ext4 import Ext4Reader, Ext4Error
+from .fileutils import write_atomic
+from .verify import hash_file
+
+SLOT_KERNEL_PATH = "/boot/kernel.img"
+# Un noyau plus gros n'est pas un noyau : on évite de charger n'importe quoi en mémoire
+KERNEL_MAX_SIZE = 64 * 1024 * 1024
+
+FATLOAD_RE = re.compile(r'\bfatload\s+\S+\s+\S+\s+\S+\s+(/[^\s;]+)')
+
+
+class KernelSyncError(Exception):
+    """Noyau introuvable dans le slot ou copie impossible"""
+    pass
+
+
+def fat_kernel_name(cmd):
+    """Fichier chargé par fatload dans une commande bootconfig (ex. /kernel2.img), sinon None"""
+    match = FATLOAD_RE.search(cmd or '')
+    return match.group(1) if match else None
+
+
+def read_slot_kernel(partition, path=SLOT_KERNEL_PATH):
+    """Lit le noyau dans le rootfs ext4 non monté de partition"""
+    try:
+        with Ext4Reader(partition) as reader:
+            inode = reader.lookup(path)
+            if not inode.is_reg():
+                raise KernelSyncError("%s is not a regular file in %s" % (path, partition))
+            if inode.size == 0 or inode.size > KERNEL_MAX_SIZE:
+                raise KernelSyncError("Invalid kernel size in %s: %d bytes" % (partition, inode.size))
+            return reader.read_data(inode)
+    except (Ext4Error, OSError) as e:
+        raise KernelSyncError("Cannot read %s from %s: %s" % (path, partition, str(e)))
+
+
+def sync_kernel(data, target_path):
+    """Écrit data dans target_path sauf si une copie identique y est déjà
+
+    Retourne True si le fichier a été écrit, False s'il était à jour.
+    """
+    try:
+        if os.path.getsize(target_path) == len(data):
+            if hash_file(target_path, ('sha256',))['sha256'] == hashlib.sha256(data).hexdigest():
+                return False
+    except OSError:
+        pass
+
+    try:
+        write_atomic(target_path, data)
+    except OSError as e:
+        raise KernelSyncError("Cannot write %s: %s" % (target_path, str(e)))
+    return True
@@ -3,12 +3,11 @@ import os
 import re
 import glob
 import shutil
-import tarfile
-import hashlib
-import zipfile
-import urllib.request
-import urllib.error
+import threading
+import time
+import queue
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from Plugins.Plugin import PluginDescriptor
 from Screens.Screen import Screen
 from Screens.MessageBox import MessageBox
@@ -19,6 +18,87 @@ from Components.ProgressBar import ProgressBar
 from Components.Sources.StaticText import StaticText
 from Tools.Directories import fileExists, pathExists
 from enigma import eTimer
+from .ext4 import Ext4Reader, Ext4Error
+from .slotcache import SLOT_CACHE_NAME, SlotCache, slot_signature
+from .slots import build_slot_registry
+from .sdlayout import LayoutError, describe_plan, layout_choices, plan_sd_layout
+from .fsprofile import alignment_mb, erase_block_size, ext4_commands, fat_commands, get_profile, mount_options, tune_commands
+from .bootconfig import ROOT_RE, BootConfig, load_bootconfig, invalidate_bootconfig
+from .fileutils import write_if_changed
+from .jobs import Job, JobCancelled
+from .commands import CommandRunner
+from .tracing import TRACE_EXPORT_DIR, TRACER, format_duration, span, traced
+from .slothealth import HealthCache, collect_health, describe_health
+from .blockdev import scan_block_devices
+from .installer import install_archive, is_image_archive
+from .download import DownloadCache, DownloadError, download
+from .clone import CloneError, clone_used_blocks
+from .kernelsync import KernelSyncError, fat_kernel_name, read_slot_kernel, sync_kernel
+from .backup import BACKUP_FORMATS, FAT32_MAX_FILE_SIZE, BackupError, backup_tree
+from .chunkstore import ChunkStore, StoreError, restore_tree
+from .chunkstore import backup_tree as store_backup_tree
+from .verify import MANIFEST_DIR_NAME, VERIFY_MAX_WORKERS, VerifyError, build_manifest, check_manifest, find_expected_checksums, manifest_path, read_manifest, verify_files, write_manifest
+from .gpt import GPTError, disk_sectors, partition_path, reread_partition_table, wait_for_partitions, write_gpt
+
+# Modes d'effacement d'un slot
+WIPE_FAST = "fast"
+WIPE_THOROUGH = "thorough"
+
+# Répertoires du récepteur (redirigés vers un dossier temporaire par benchmarks/harness.py)
+DATA_DIR = "/data"
+BOOT_DIR = "/boot"
+MEDIA_DIR = "/media"
+# Ligne de commande du noyau : root= désigne le rootfs de l'image en cours d'exécution
+CMDLINE_PATH = "/proc/cmdline"
+
+EMMC_DEVICE = "/dev/mmcblk0"
+SD_CARD_DEVICE = "/dev/mmcblk1"
+# Partition FAT32 DREAMCARD : noyaux des slots SD chargés par fatload
+DREAMCARD_PARTITION = "/dev/mmcblk1p1"
+DREAMCARD_MOUNT = "/media/mmcblk1p1"
+
+# Attente maximale du sondage des slots (carte SD qui ne répond plus)
+SLOT_PROBE_TIMEOUT = 30
+
+# Profils de systèmes de fichiers (fsprofile.FS_PROFILES) : carte SD et eMMC interne
+SD_FS_PROFILE = "sd"
+INTERNAL_FS_PROFILE = "default"
+
+# Formatages simultanés lors du partitionnement de la SD card
+MKFS_MAX_PARALLEL = 3
+MKFS_TIMEOUT = 600
+
+# Emplacements où chercher les archives d'images à installer
+IMAGE_SEARCH_DIRS = [
+    "/media/hdd/images",
+    "/media/hdd",
+    "/media/usb/images",
+    "/media/usb",
+    "/media/mmcblk1p1/images",
+    "/media/mmcblk1p1",
+]
+
+# Sauvegardes de slots : partition FAT32 DREAMCARD en priorité, sinon disque dur
+BACKUP_LOCATIONS = [
+    ("/media/mmcblk1p1", "dreambootmanager/backups"),
+    ("/media/hdd", "dreambootmanager/backups"),
+]
+
+# Sauvegardes incrémentales dédupliquées, et nombre conservé par slot au nettoyage
+CHUNK_STORE_LOCATIONS = [
+    ("/media/mmcblk1p1", "dreambootmanager/store"),
+    ("/media/hdd", "dreambootmanager/store"),
+]
+STORE_KEEP_PER_SLOT = 3
+
+# Durée maximale des outils du clonage (e2fsck, resize2fs, copie cp -a)
+CLONE_TOOL_TIMEOUT = 1800
+
+# Cache des téléchargements : partition FAT32 DREAMCARD en priorité, sinon disque dur
+DOWNLOAD_CACHE_LOCATIONS = [
+    ("/media/mmcblk1p1", "dreambootmanager/cache"),
+    ("/media/hdd", "dreambootmanager/cache"),
+]
 
 class DreamBootManagerScreen(Screen):
     skin = """
@@ -41,11 +121,16 @@ class DreamBootManagerScreen(Screen):
             "2. Multiboot Deletion",
             "3. Flash Recovery Image",
             "4. Backup Recovery Image",
-            "5. SD Card Partition"
+            "5. SD Card Partition",
+            "6. Install Image to Slot",
+            "7. Download Image",
+            "8. Verify Checksums",
+            "9. Clone Slot",
+            "10. Slot Dashboard"
         ]
         
         self["menu"] = MenuList(menu_list)
-        self["status"] = Label("▲▼ Navigation   │   OK: Select   │   INFO: About   │   EXIT: Close")
+        self["status"] = Label("▲▼ Navigation   │   OK: Select   │   INFO: Performance   │   BLUE: About   │   EXIT: Close")
         
         # Essayer différentes configurations de ActionMap
         self["actions"] = ActionMap(["SetupActions", "ColorActions", "OkCancelActions", "NavigationActions"], 
@@ -54,7 +139,8 @@ class DreamBootManagerScreen(Screen):
             "cancel": self.close,
             "up": self.up,
             "down": self.down,
-            "info": self.show_info,
+            "info": self.show_performance_report,
+            "blue": self.show_info,
         }, -1)
         
     def up(self):
@@ -76,6 +162,16 @@ class DreamBootManagerScreen(Screen):
                 self.backup_recovery_image()
             elif "SD Card Partition" in selection:
                 self.sd_card_partition()
+            elif "Install Image to Slot" in selection:
+                self.install_image()
+            elif "Download Image" in selection:
+                self.download_image()
+            elif "Verify Checksums" in selection:
+                self.verify_checksums()
+            elif "Clone Slot" in selection:
+                self.clone_slot()
+            elif "Slot Dashboard" in selection:
+                self.slot_dashboard()
 
     def show_info(self):
         """Affiche les informations sur le plugin"""
@@ -83,9 +179,24 @@ class DreamBootManagerScreen(Screen):
         
         self.session.open(MessageBox, info_text, MessageBox.TYPE_INFO, timeout=10)
     
+    def show_performance_report(self):
+        """Latences p50/p95 des opérations de la session"""
+        self.session.open(PerformanceReportScreen)
+    
+    def slot_dashboard(self):
+        """Espace occupé et santé ext4 de tous les slots"""
+        boot_manager = get_boot_manager()
+        slots = boot_manager.get_slot_layout()
+        if not slots:
+            self.session.open(MessageBox,
+                "No multiboot slots found!\n\nCheck if multiboot is properly configured.",
+                MessageBox.TYPE_ERROR)
+            return
+        self.session.open(SlotHealthScreen, slots, boot_manager)
+    
     def multiboot_selector(self):
         """Affiche la liste des images depuis bootconfig.txt"""
-        boot_manager = BootManager()
+        boot_manager = get_boot_manager()
         images = boot_manager.get_boot_images()
         
         if not images:
@@ -98,8 +209,8 @@ class DreamBootManagerScreen(Screen):
     
     def multiboot_deletion(self):
         """Multiboot deletion functionality"""
-        boot_manager = BootManager()
-        slots = boot_manager.get_multiboot_slots()
+        boot_manager = get_boot_manager()
+        slots = boot_manager.get_slot_layout()
         
         if not slots:
             self.session.open(MessageBox, 
@@ -107,7 +218,7 @@ class DreamBootManagerScreen(Screen):
                 MessageBox.TYPE_ERROR)
             return
         
-        self.session.openWithCallback(self.on_slot_selected, SlotSelectionScreen, slots, "Delete Slot Image")
+        self.session.openWithCallback(self.on_slot_selected, SlotSelectionScreen, slots, "Delete Slot Image", boot_manager)
     
     def flash_recovery_image(self):
         """Ouvre le Flash Manager ou Software Manager"""
@@ -126,25 +237,136 @@ class DreamBootManagerScreen(Screen):
                     MessageBox.TYPE_INFO)
     
     def backup_recovery_image(self):
-        """Ouvre l'écran de sauvegarde complète"""
+        """Sauvegarde/restauration intégrée d'un slot, ou outil de sauvegarde de l'image"""
+        choices = [
+            ("Backup a slot", "backup"),
+            ("Restore a slot backup", "restore"),
+            ("Incremental backup of a slot", "store_backup"),
+            ("Restore an incremental backup", "store_restore"),
+            ("Clean up incremental backups", "store_clean"),
+        ]
+        if self.find_system_backup_screen() is not None:
+            choices.append(("System image backup", "system"))
+        from Screens.ChoiceBox import ChoiceBox
+        self.session.openWithCallback(self.on_backup_choice, ChoiceBox, title="Backup Recovery Image", list=choices)
+    
+    def find_system_backup_screen(self):
+        """Écran de sauvegarde complète fourni par l'image, None s'il n'existe pas"""
         try:
             # Essayer d'importer l'écran de sauvegarde depuis Screens
             from Screens.BackupRestore import BackupScreen
-            self.session.open(BackupScreen)
+            return BackupScreen
         except ImportError:
-            try:
-                # Essayer un autre chemin possible
-                from Screens.ImageBackup import ImageBackup
-                self.session.open(ImageBackup)
-            except ImportError:
-                try:
-                    # Essayer avec SoftwareManager
-                    from Plugins.SystemPlugins.SoftwareManager.BackupRestore import ImageBackup
-                    self.session.open(ImageBackup)
-                except ImportError:
-                    self.session.open(MessageBox,
-                        "Backup feature not available on this image!\n\nPlease use the built-in backup function from the software manager.",
-                        MessageBox.TYPE_INFO)
+            pass
+        try:
+            # Essayer un autre chemin possible
+            from Screens.ImageBackup import ImageBackup
+            return ImageBackup
+        except ImportError:
+            pass
+        try:
+            # Essayer avec SoftwareManager
+            from Plugins.SystemPlugins.SoftwareManager.BackupRestore import ImageBackup
+            return ImageBackup
+        except ImportError:
+            return None
+    
+    def on_backup_choice(self, choice):
+        """Aiguillage sauvegarde / restauration / outil système"""
+        if choice is None:
+            return
+        boot_manager = get_boot_manager()
+        if choice[1] == "system":
+            self.session.open(self.find_system_backup_screen())
+        elif choice[1] in ("backup", "store_backup"):
+            slots = boot_manager.get_slot_layout()
+            if not slots:
+                self.session.open(MessageBox,
+                    "No multiboot slots found!\n\nCheck if multiboot is properly configured.",
+                    MessageBox.TYPE_ERROR)
+                return
+            incremental = choice[1] == "store_backup"
+            self.session.openWithCallback(lambda slot_info: self.on_backup_slot_selected(slot_info, incremental),
+                SlotSelectionScreen, slots, "Backup: Select Slot", boot_manager)
+        elif choice[1] == "store_restore":
+            backups = boot_manager.find_incremental_backups()
+            if not backups:
+                self.session.open(MessageBox, "No incremental backup found!", MessageBox.TYPE_INFO)
+                return
+            choices = [("%s %s - %s (%d MB)" % (manifest['slot'], manifest.get('image_name') or "",
+                datetime.fromtimestamp(manifest['created']).strftime("%Y-%m-%d %H:%M"), manifest['size'] >> 20),
+                manifest['path']) for manifest in backups]
+            from Screens.ChoiceBox import ChoiceBox
+            self.session.openWithCallback(self.on_restore_backup_selected, ChoiceBox, title="Select backup to restore", list=choices)
+        elif choice[1] == "store_clean":
+            self.run_job("Clean up incremental backups", self.on_backup_done, boot_manager.clean_incremental_backups)
+        else:
+            backups = boot_manager.find_slot_backups()
+            if not backups:
+                self.session.open(MessageBox,
+                    "No slot backup found!\n\nBackups are stored in:\n%s" % "\n".join(
+                        os.path.join(mount_point, subdir) for mount_point, subdir in BACKUP_LOCATIONS),
+                    MessageBox.TYPE_INFO)
+                return
+            choices = [("%s (%d MB)" % (os.path.basename(path), os.path.getsize(path) // (1024 * 1024)), path) for path in backups]
+            from Screens.ChoiceBox import ChoiceBox
+            self.session.openWithCallback(self.on_restore_backup_selected, ChoiceBox, title="Select backup to restore", list=choices)
+    
+    def on_backup_slot_selected(self, slot_info, incremental=False):
+        """Choix de la compression puis sauvegarde en arrière-plan"""
+        if slot_info is None:
+            return
+        if slot_info.get('image_exists') is False:
+            self.session.open(MessageBox, "%s is empty, nothing to back up." % slot_info['name'], MessageBox.TYPE_INFO)
+            return
+        if incremental:
+            self.run_job("Backup %s" % slot_info['name'], self.on_backup_done,
+                get_boot_manager().incremental_backup_slot, slot_info)
+            return
+        choices = [("gzip (faster)", "gz"), ("xz (smaller)", "xz")]
+        from Screens.ChoiceBox import ChoiceBox
+        self.session.openWithCallback(
+            lambda choice: choice and self.run_job("Backup %s" % slot_info['name'], self.on_backup_done,
+                get_boot_manager().backup_slot, slot_info, choice[1]),
+            ChoiceBox, title="Compression", list=choices)
+    
+    def on_backup_done(self, job):
+        """Callback à la fin de la sauvegarde"""
+        success, message = self.job_outcome(job)
+        if success:
+            self.session.open(MessageBox, "✓ %s" % message, MessageBox.TYPE_INFO)
+        else:
+            self.session.open(MessageBox, "✗ Backup failed:\n\n%s" % message, MessageBox.TYPE_ERROR)
+    
+    def on_restore_backup_selected(self, choice):
+        """Choix du slot dans lequel restaurer la sauvegarde"""
+        if choice is None:
+            return
+        backup_path = choice[1]
+        boot_manager = get_boot_manager()
+        slots = boot_manager.get_slot_layout()
+        if not slots:
+            self.session.open(MessageBox,
+                "No multiboot slots found!\n\nCheck if multiboot is properly configured.",
+                MessageBox.TYPE_ERROR)
+            return
+        self.session.openWithCallback(
+            lambda slot_info: self.on_restore_slot_selected(slot_info, backup_path),
+            SlotSelectionScreen, slots, "Restore Backup: Select Slot", boot_manager)
+    
+    def on_restore_slot_selected(self, slot_info, backup_path):
+        """Confirme la restauration (le slot est effacé)"""
+        if slot_info is None:
+            return
+        message = "Restore:\n%s\n\ninto %s (%s)?\n\nEverything in this slot will be erased!" % (
+            os.path.basename(backup_path), slot_info['name'], slot_info['partition'])
+        # Manifeste .json : sauvegarde incrémentale du magasin de morceaux
+        restore = get_boot_manager().restore_incremental_backup if backup_path.endswith('.json') else get_boot_manager().restore_slot_backup
+        self.session.openWithCallback(
+            lambda result: result and self.run_job("Restoring to %s" % slot_info['name'],
+                lambda job: self.on_install_done(job, slot_info),
+                restore, backup_path, slot_info),
+            MessageBox, message, MessageBox.TYPE_YESNO)
     
     def on_slot_selected(self, selected_slot):
         """Callback après sélection d'un slot"""
@@ -167,48 +389,298 @@ class DreamBootManagerScreen(Screen):
         self.multiboot_deletion()
     
     def confirm_deletion(self, result, slot_info):
-        """Confirme la suppression d'une image"""
+        """Confirme la suppression d'une image puis propose le mode d'effacement"""
         if result:
-            boot_manager = BootManager()
-            success, message = boot_manager.delete_slot_image(slot_info)
-            if success:
-                self.session.openWithCallback(self.return_to_deletion_menu, MessageBox,
-                    "✓ Image successfully deleted from:\n%s\n\nPartition: %s" % (slot_info['name'], slot_info['partition']),
-                    MessageBox.TYPE_INFO)
-            else:
-                self.session.openWithCallback(self.return_to_deletion_menu, MessageBox,
-                    "✗ Error deleting image from:\n%s\n\n%s" % (slot_info['name'], message),
-                    MessageBox.TYPE_ERROR)
+            choices = [
+                ("Fast (reformat the partition)", (WIPE_FAST, False)),
+                ("Fast + discard (reformat and free all flash blocks)", (WIPE_FAST, True)),
+                ("Thorough (delete files one by one, then reformat)", (WIPE_THOROUGH, False)),
+            ]
+            from Screens.ChoiceBox import ChoiceBox
+            self.session.openWithCallback(
+                lambda choice: self.on_wipe_mode_selected(choice, slot_info),
+                ChoiceBox, title="Wipe mode for %s" % slot_info['name'], list=choices)
         else:
             self.return_to_deletion_menu()
     
+    def on_wipe_mode_selected(self, choice, slot_info):
+        """Lance la suppression dans le mode choisi"""
+        if choice is None:
+            self.return_to_deletion_menu()
+            return
+        mode, discard = choice[1]
+        boot_manager = get_boot_manager()
+        self.run_job("Deleting %s" % slot_info['name'],
+            lambda job: self.on_deletion_done(job, slot_info),
+            boot_manager.delete_slot_image, slot_info, mode, discard)
+    
+    def on_deletion_done(self, job, slot_info):
+        """Callback à la fin du job de suppression"""
+        success, message = self.job_outcome(job)
+        if success:
+            self.session.openWithCallback(self.return_to_deletion_menu, MessageBox,
+                "✓ Image successfully deleted from:\n%s\n\nPartition: %s\n\n%s" % (slot_info['name'], slot_info['partition'], message),
+                MessageBox.TYPE_INFO)
+        else:
+            self.session.openWithCallback(self.return_to_deletion_menu, MessageBox,
+                "✗ Error deleting image from:\n%s\n\n%s" % (slot_info['name'], message),
+                MessageBox.TYPE_ERROR)
+    
     def sd_card_partition(self):
-        """SD Card partitioning functionality"""
-        message = "This will partition your SD card for multiboot:\n\n" \
-                 "• Partition 1: Remaining capacity FAT32 (DREAMCARD)\n" \
-                 "• Partition 2: 1.7 GB EXT4 (Slot 5)\n" \
-                 "• Partition 3: 1.7 GB EXT4 (Slot 6)\n" \
-                 "• Partition 4: 1.7 GB EXT4 (Slot 7)\n" \
-                 "• Partition 5: 1.7 GB EXT4 (Slot 8)\n\n" \
-                 "All data on the SD card will be lost!\n\nContinue?"
+        """Choix du schéma de partitionnement d'après la capacité réelle de la SD card"""
+        boot_manager = get_boot_manager()
+        total_sectors = boot_manager.get_sd_card_sectors()
+        if total_sectors is None:
+            self.session.open(MessageBox, "SD card not found at %s" % SD_CARD_DEVICE, MessageBox.TYPE_ERROR)
+            return
+        
+        align_mb = boot_manager.get_sd_alignment_mb()
+        choices = layout_choices(total_sectors, align_mb)
+        if not choices:
+            try:
+                plan_sd_layout(total_sectors, align_mb=align_mb)
+                error = "No layout fits this SD card"
+            except LayoutError as e:
+                error = str(e)
+            self.session.open(MessageBox, "✗ %s" % error, MessageBox.TYPE_ERROR)
+            return
         
+        from Screens.ChoiceBox import ChoiceBox
+        self.session.openWithCallback(self.on_sd_layout_selected, ChoiceBox, title="SD card layout", list=choices)
+    
+    def on_sd_layout_selected(self, choice):
+        """Prévisualise le plan choisi avant toute écriture"""
+        if choice is None:
+            return
+        plan = choice[1]
+        message = "This will partition your SD card for multiboot:\n\n%s\nPartitions aligned to %d MB erase blocks\n\n" \
+                  "All data on the SD card will be lost!\n\nContinue?" % (describe_plan(plan), plan['align_mb'])
         self.session.openWithCallback(
-            lambda result: self.confirm_sd_partitioning(result),
+            lambda result: self.confirm_sd_partitioning(result, plan),
             MessageBox, message, MessageBox.TYPE_YESNO)
     
-    def confirm_sd_partitioning(self, result):
+    def confirm_sd_partitioning(self, result, plan=None):
         """Confirme le partitionnement de la SD card"""
         if result:
-            boot_manager = BootManager()
-            success, message = boot_manager.partition_sd_card()
-            if success:
-                self.session.openWithCallback(self.auto_restart_gui, MessageBox,
-                    "✓ SD card partitioned successfully!\n\n%s\n\nGUI will restart automatically in 3 seconds." % message,
-                    MessageBox.TYPE_INFO, timeout=3)
-            else:
+            boot_manager = get_boot_manager()
+            self.run_job("SD Card Partition", self.on_sd_partitioning_done, boot_manager.partition_sd_card, SD_CARD_DEVICE, plan)
+    
+    def on_sd_partitioning_done(self, job):
+        """Callback à la fin du job de partitionnement"""
+        success, message = self.job_outcome(job)
+        if success:
+            self.session.openWithCallback(self.auto_restart_gui, MessageBox,
+                "✓ SD card partitioned successfully!\n\n%s\n\nGUI will restart automatically in 3 seconds." % message,
+                MessageBox.TYPE_INFO, timeout=3)
+        else:
+            self.session.open(MessageBox,
+                "✗ Error partitioning SD card:\n\n%s" % message,
+                MessageBox.TYPE_ERROR)
+    
+    def run_job(self, title, callback, func, *args, **kwargs):
+        """Lance une opération BootManager en arrière-plan avec écran de progression"""
+        job = Job(title, func, *args, **kwargs).start()
+        self.session.openWithCallback(callback, JobProgressScreen, job, title)
+    
+    def job_outcome(self, job):
+        """Convertit un job terminé en (success, message)"""
+        if job.cancelled:
+            return False, "Cancelled by user"
+        if job.error is not None:
+            return False, job.error
+        return job.result
+    
+    def install_image(self):
+        """Choix de l'archive à installer dans un slot"""
+        boot_manager = get_boot_manager()
+        archives = boot_manager.find_image_archives()
+        
+        if not archives:
+            self.session.open(MessageBox,
+                "No image archive found!\n\nCopy a .tar.gz, .tar.bz2, .tar.xz or .zip image to:\n%s" % "\n".join(IMAGE_SEARCH_DIRS),
+                MessageBox.TYPE_INFO)
+            return
+        
+        choices = [("%s (%d MB)" % (os.path.basename(path), os.path.getsize(path) // (1024 * 1024)), path) for path in archives]
+        from Screens.ChoiceBox import ChoiceBox
+        self.session.openWithCallback(self.on_archive_selected, ChoiceBox, title="Select image archive", list=choices)
+    
+    def on_archive_selected(self, choice):
+        """Callback après choix de l'archive : sélection du slot cible"""
+        if choice is None:
+            return
+        archive_path = choice[1]
+        boot_manager = get_boot_manager()
+        slots = boot_manager.get_slot_layout()
+        
+        if not slots:
+            self.session.open(MessageBox,
+                "No multiboot slots found!\n\nCheck if multiboot is properly configured.",
+                MessageBox.TYPE_ERROR)
+            return
+        
+        self.session.openWithCallback(
+            lambda slot: self.on_install_slot_selected(slot, archive_path),
+            SlotSelectionScreen, slots, "Install Image: Select Slot", boot_manager)
+    
+    def on_install_slot_selected(self, slot_info, archive_path):
+        """Confirme l'installation (le slot est effacé)"""
+        if slot_info is None:
+            return
+        
+        message = "Install:\n%s\n\ninto %s (%s)?\n\nEverything in this slot will be erased!" % (
+            os.path.basename(archive_path), slot_info['name'], slot_info['partition'])
+        self.session.openWithCallback(
+            lambda result: self.confirm_install(result, archive_path, slot_info),
+            MessageBox, message, MessageBox.TYPE_YESNO)
+    
+    def confirm_install(self, result, archive_path, slot_info):
+        """Lance l'installation en arrière-plan"""
+        if result:
+            boot_manager = get_boot_manager()
+            self.run_job("Installing to %s" % slot_info['name'],
+                lambda job: self.on_install_done(job, slot_info),
+                boot_manager.install_image_to_slot, archive_path, slot_info)
+    
+    def on_install_done(self, job, slot_info):
+        """Callback à la fin du job d'installation"""
+        success, message = self.job_outcome(job)
+        if success:
+            self.session.open(MessageBox,
+                "✓ Image installed into %s\n\n%s" % (slot_info['name'], message),
+                MessageBox.TYPE_INFO)
+        else:
+            self.session.open(MessageBox,
+                "✗ Error installing image into %s:\n\n%s" % (slot_info['name'], message),
+                MessageBox.TYPE_ERROR)
+    
+    def download_image(self):
+        """Saisie de l'URL de l'archive à télécharger"""
+        from Screens.VirtualKeyBoard import VirtualKeyBoard
+        self.session.openWithCallback(self.on_download_url_entered, VirtualKeyBoard,
+            title="Image URL (http/https)", text="http://")
+    
+    def on_download_url_entered(self, url):
+        """Lance le téléchargement en arrière-plan"""
+        if not url or not url.startswith(("http://", "https://")):
+            return
+        boot_manager = get_boot_manager()
+        self.run_job("Download Image", self.on_download_done, boot_manager.download_image, url)
+    
+    def on_download_done(self, job):
+        """Callback à la fin du téléchargement : proposer l'installation"""
+        success, info = self.job_outcome(job)
+        if not success:
+            self.session.open(MessageBox, "✗ Download failed:\n\n%s" % info, MessageBox.TYPE_ERROR)
+            return
+        
+        source = "served from cache" if info['cached'] else "downloaded in %.0f s" % info['elapsed']
+        message = "✓ %s\n%.1f MB, %s\nSHA256: %s\n\nInstall it into a slot now?" % (
+            os.path.basename(info['path']), info['size'] / (1024.0 * 1024.0), source, info['sha256'])
+        self.session.openWithCallback(
+            lambda result: result and self.on_archive_selected((os.path.basename(info['path']), info['path'])),
+            MessageBox, message, MessageBox.TYPE_YESNO)
+    
+    def verify_checksums(self):
+        """Choix de ce qu'il faut vérifier : archives d'images ou slot installé"""
+        boot_manager = get_boot_manager()
+        choices = [("All image archives with checksum files", None)]
+        choices += [("Archive: %s" % os.path.basename(path), path) for path in boot_manager.find_image_archives()]
+        choices.append(("Installed slot (manifest)", "slot"))
+        from Screens.ChoiceBox import ChoiceBox
+        self.session.openWithCallback(self.on_verify_choice, ChoiceBox, title="Verify Checksums", list=choices)
+    
+    def on_verify_choice(self, choice):
+        """Lance la vérification choisie en arrière-plan"""
+        if choice is None:
+            return
+        boot_manager = get_boot_manager()
+        if choice[1] == "slot":
+            slots = boot_manager.get_slot_layout()
+            if not slots:
                 self.session.open(MessageBox,
-                    "✗ Error partitioning SD card:\n\n%s" % message,
+                    "No multiboot slots found!\n\nCheck if multiboot is properly configured.",
                     MessageBox.TYPE_ERROR)
+                return
+            self.session.openWithCallback(self.on_verify_slot_selected,
+                SlotSelectionScreen, slots, "Verify Slot: Select Slot", boot_manager)
+        else:
+            paths = [choice[1]] if choice[1] else None
+            self.run_job("Verify Checksums", self.on_verify_done, boot_manager.verify_image_archives, paths)
+    
+    def on_verify_slot_selected(self, slot_info):
+        """Vérifie le slot choisi contre son manifeste"""
+        if slot_info is None:
+            return
+        boot_manager = get_boot_manager()
+        self.run_job("Verifying %s" % slot_info['name'], self.on_verify_done, boot_manager.verify_slot, slot_info)
+    
+    def on_verify_done(self, job):
+        """Callback à la fin d'une vérification"""
+        success, message = self.job_outcome(job)
+        if success:
+            self.session.open(MessageBox, "✓ Verification passed\n\n%s" % message, MessageBox.TYPE_INFO)
+        else:
+            self.session.open(MessageBox, "✗ Verification failed:\n\n%s" % message, MessageBox.TYPE_ERROR)
+    
+    def clone_slot(self):
+        """Choix du slot source à cloner"""
+        boot_manager = get_boot_manager()
+        slots = boot_manager.get_slot_layout()
+        
+        if len(slots) < 2:
+            self.session.open(MessageBox,
+                "At least two multiboot slots are needed to clone an image.",
+                MessageBox.TYPE_ERROR)
+            return
+        
+        self.session.openWithCallback(self.on_clone_source_selected,
+            SlotSelectionScreen, slots, "Clone: Select Source Slot", boot_manager)
+    
+    def on_clone_source_selected(self, source_info):
+        """Choix du slot cible (tous les slots sauf la source)"""
+        if source_info is None:
+            return
+        if source_info.get('image_exists') is False:
+            self.session.open(MessageBox, "%s is empty, nothing to clone." % source_info['name'], MessageBox.TYPE_INFO)
+            return
+        
+        boot_manager = get_boot_manager()
+        targets = [slot for slot in boot_manager.get_slot_layout() if slot['partition'] != source_info['partition']]
+        self.session.openWithCallback(
+            lambda target_info: self.on_clone_target_selected(source_info, target_info),
+            SlotSelectionScreen, targets, "Clone %s to:" % source_info['name'], boot_manager)
+    
+    def on_clone_target_selected(self, source_info, target_info):
+        """Confirme le clonage (le slot cible est effacé)"""
+        if target_info is None:
+            return
+        
+        message = "Clone %s (%s)\n\ninto %s (%s)?\n\nEverything in the target slot will be erased!" % (
+            source_info['name'], source_info['partition'], target_info['name'], target_info['partition'])
+        self.session.openWithCallback(
+            lambda result: self.confirm_clone(result, source_info, target_info),
+            MessageBox, message, MessageBox.TYPE_YESNO)
+    
+    def confirm_clone(self, result, source_info, target_info):
+        """Lance le clonage en arrière-plan"""
+        if result:
+            boot_manager = get_boot_manager()
+            self.run_job("Cloning to %s" % target_info['name'],
+                lambda job: self.on_clone_done(job, target_info),
+                boot_manager.clone_slot, source_info, target_info)
+    
+    def on_clone_done(self, job, target_info):
+        """Callback à la fin du clonage"""
+        success, message = self.job_outcome(job)
+        if success:
+            self.session.open(MessageBox,
+                "✓ Image cloned into %s\n\n%s" % (target_info['name'], message),
+                MessageBox.TYPE_INFO)
+        else:
+            self.session.open(MessageBox,
+                "✗ Error cloning into %s:\n\n%s" % (target_info['name'], message),
+                MessageBox.TYPE_ERROR)
     
     def auto_restart_gui(self, result=None):
         """Redémarre automatiquement l'IGU après partitionnement réussi"""
@@ -219,7 +691,7 @@ class DreamBootManagerScreen(Screen):
     def on_image_selected(self, selected_image):
         """Callback après sélection d'une image"""
         if selected_image:
-            boot_manager = BootManager()
+            boot_manager = get_boot_manager()
             if boot_manager.set_boot_image(selected_image):
                 self.session.openWithCallback(self.reboot_confirmation, MessageBox,
                     "✓ '%s' selected successfully!\n\nReboot to start this image?" % selected_image['name'],
@@ -246,32 +718,81 @@ class SlotSelectionScreen(Screen):
     </screen>
     """
     
-    def __init__(self, session, slots, title="Select Slot"):
+    def __init__(self, session, slots, title="Select Slot", boot_manager=None):
         Screen.__init__(self, session)
         self.slots = slots
         self.setTitle(title)
         
         self["title"] = Label(title.upper())
+        self["menu"] = MenuList(self.build_slot_list())
+        self["status"] = Label("▲▼ Navigation   │   OK: Select   │   EXIT: Back")
+        
+        self["actions"] = ActionMap(["OkCancelActions", "NavigationActions"], {
+            "ok": self.ok,
+            "cancel": self.cancel,
+            "up": self.up,
+            "down": self.down
+        }, -1)
         
+        # Sondage asynchrone : la liste s'affiche tout de suite et se complète
+        # au fur et à mesure que les workers rendent leurs résultats
+        self.probe_results = None
+        self.probe_pending = 0
+        self.probe_timer = None
+        if boot_manager is not None:
+            pending = [slot for slot in self.slots if slot.get('image_exists') is None]
+            if pending:
+                self.probe_pending = len(pending)
+                self.probe_results = boot_manager.start_slot_probe(self.slots)
+                self.probe_timer = eTimer()
+                try:
+                    self.probe_timer_conn = self.probe_timer.timeout.connect(self.poll_probe_results)
+                except AttributeError:
+                    self.probe_timer.callback.append(self.poll_probe_results)
+                self.probe_timer.start(100, False)
+    
+    def build_slot_list(self):
+        """Construit les lignes affichées pour chaque slot"""
         slot_list = []
         for slot in self.slots:
-            if slot['image_exists']:
+            if slot.get('image_exists') is None:
+                # Sondage en cours
+                display_text = "%s\n… Probing\nPartition: %s" % (slot['name'], slot['partition'])
+            elif slot['image_exists']:
                 # Afficher le nom réel de l'image depuis /etc/issue
                 display_text = "%s\n✓ %s\nPartition: %s" % (slot['name'], slot['image_name'], slot['partition'])
             else:
                 # Pour les slots vides, afficher simplement "Empty"
                 display_text = "%s\n✗ Empty\nPartition: %s" % (slot['name'], slot['partition'])
             slot_list.append(display_text)
+        return slot_list
+    
+    def poll_probe_results(self):
+        """Récupère les résultats de sondage depuis la boucle principale"""
+        updated = False
+        while True:
+            try:
+                index, image_exists, image_name = self.probe_results.get_nowait()
+            except queue.Empty:
+                break
+            self.slots[index]['image_exists'] = image_exists
+            self.slots[index]['image_name'] = image_name
+            self.probe_pending -= 1
+            updated = True
         
-        self["menu"] = MenuList(slot_list)
-        self["status"] = Label("▲▼ Navigation   │   OK: Select   │   EXIT: Back")
+        if updated:
+            index = self["menu"].getSelectionIndex()
+            self["menu"].setList(self.build_slot_list())
+            self["menu"].moveToIndex(index)
         
-        self["actions"] = ActionMap(["OkCancelActions", "NavigationActions"], {
-            "ok": self.ok,
-            "cancel": self.cancel,
-            "up": self.up,
-            "down": self.down
-        }, -1)
+        if self.probe_pending <= 0:
+            self.stop_probe_timer()
+    
+    def stop_probe_timer(self):
+        """Arrête le timer de sondage"""
+        if self.probe_timer is not None:
+            self.probe_timer.stop()
+            self.probe_timer = None
     
     def up(self):
         self["menu"].up()
@@ -283,9 +804,14 @@ class SlotSelectionScreen(Screen):
         selection = self["menu"].getCurrent()
         if selection:
             index = self["menu"].getSelectionIndex()
+            if self.slots[index].get('image_exists') is None:
+                # Slot encore en cours de sondage
+                return
+            self.stop_probe_timer()
             self.close(self.slots[index])
     
     def cancel(self):
+        self.stop_probe_timer()
         self.close(None)
 
 
@@ -307,12 +833,13 @@ class ImageSelectionScreen(Screen):
         
         self["title"] = Label("SELECT BOOT IMAGE")
         
-        image_list = []
-        boot_manager = BootManager()
-        current_boot = boot_manager.get_current_boot()
+        # Entrée courante trouvée par root= dans le modèle déjà analysé : aucune écriture
+        current = get_boot_manager().get_current_boot_section()
+        current_index = current.index if current is not None else None
         
+        image_list = []
         for img in self.images:
-            status = " ← CURRENT" if img['name'] == current_boot else ""
+            status = " ← CURRENT" if img['index'] == current_index else ""
             display_text = "%s%s" % (img['name'], status)
             image_list.append(display_text)
         
@@ -342,15 +869,241 @@ class ImageSelectionScreen(Screen):
         self.close(None)
 
 
+class PerformanceReportScreen(Screen):
+    """Rapport des durées mesurées pendant la session (p50/p95 par opération)"""
+    skin = """
+    <screen position="center,center" size="1100,700" title="Performance Report">
+        <widget name="title" position="0,30" size="1100,60" font="Regular;32" halign="center" transparent="1" />
+        <widget name="header" position="50,100" size="1000,40" font="Regular;22" transparent="1" />
+        <widget name="menu" position="50,140" size="1000,460" itemHeight="40" font="Regular;22" transparent="1" />
+        <widget name="status" position="0,620" size="1100,50" font="Regular;22" halign="center" transparent="1" />
+    </screen>
+    """
+    
+    def __init__(self, session, tracer=TRACER):
+        Screen.__init__(self, session)
+        self.tracer = tracer
+        self.setTitle("Performance Report")
+        
+        self["title"] = Label("PERFORMANCE REPORT")
+        self["header"] = Label("%-28s %7s %10s %10s %10s" % ("Operation", "Calls", "p50", "p95", "Max"))
+        self["menu"] = MenuList(self.build_report_list())
+        self["status"] = Label("▲▼ Navigation   │   GREEN: Export to %s   │   RED: Reset   │   EXIT: Back" % TRACE_EXPORT_DIR)
+        
+        self["actions"] = ActionMap(["OkCancelActions", "ColorActions", "NavigationActions"], {
+            "ok": self.close,
+            "cancel": self.close,
+            "up": self.up,
+            "down": self.down,
+            "green": self.export,
+            "red": self.reset,
+        }, -1)
+    
+    def build_report_list(self):
+        """Une ligne par opération, les plus coûteuses (temps cumulé) en premier"""
+        rows = self.tracer.summary()
+        if not rows:
+            return ["No operation measured yet in this session"]
+        report = []
+        for name, stats in rows:
+            line = "%-28s %7d %10s %10s %10s" % (name, stats['count'], format_duration(stats['p50']),
+                                                  format_duration(stats['p95']), format_duration(stats['max']))
+            if stats['errors']:
+                line += "   %d failed" % stats['errors']
+            report.append(line)
+        return report
+    
+    def up(self):
+        self["menu"].up()
+    
+    def down(self):
+        self["menu"].down()
+    
+    def export(self):
+        """Écrit tous les spans du tampon en JSON lines"""
+        try:
+            path, count = self.tracer.export_jsonl()
+        except OSError as e:
+            self.session.open(MessageBox, "Export failed: %s" % str(e), MessageBox.TYPE_ERROR)
+            return
+        self.session.open(MessageBox, "%d spans written to\n%s" % (count, path), MessageBox.TYPE_INFO, timeout=10)
+    
+    def reset(self):
+        self.tracer.clear()
+        self["menu"].setList(self.build_report_list())
+
+
+class SlotHealthScreen(Screen):
+    """Tableau de bord des slots : espace, inodes, compteurs de montages et d'erreurs ext4"""
+    skin = """
+    <screen position="center,center" size="1200,700" title="Slot Dashboard">
+        <widget name="title" position="0,30" size="1200,60" font="Regular;32" halign="center" transparent="1" />
+        <widget name="menu" position="50,110" size="1100,490" itemHeight="98" font="Regular;22" transparent="1" />
+        <widget name="status" position="0,620" size="1200,50" font="Regular;22" halign="center" transparent="1" />
+    </screen>
+    """
+    
+    def __init__(self, session, slots, boot_manager):
+        Screen.__init__(self, session)
+        self.slots = slots
+        self.boot_manager = boot_manager
+        self.setTitle("Slot Dashboard")
+        
+        # Dernier état connu affiché tout de suite, relu en arrière-plan
+        self.health = [boot_manager.health_cache.get(slot['partition']) for slot in slots]
+        self.refreshing = set()
+        
+        self["title"] = Label("SLOT DASHBOARD")
+        self["menu"] = MenuList(self.build_health_list())
+        self["status"] = Label("▲▼ Navigation   │   GREEN: Refresh   │   EXIT: Back")
+        
+        self["actions"] = ActionMap(["OkCancelActions", "ColorActions", "NavigationActions"], {
+            "ok": self.cancel,
+            "cancel": self.cancel,
+            "up": self.up,
+            "down": self.down,
+            "green": self.refresh,
+        }, -1)
+        
+        self.health_results = None
+        self.health_timer = eTimer()
+        try:
+            self.health_timer_conn = self.health_timer.timeout.connect(self.poll_health_results)
+        except AttributeError:
+            self.health_timer.callback.append(self.poll_health_results)
+        self.refresh()
+    
+    def build_health_list(self):
+        """Trois lignes par slot : nom et image, espace et inodes, santé ext4"""
+        health_list = []
+        for index, slot in enumerate(self.slots):
+            title = slot['name']
+            if slot.get('image_exists'):
+                title += "  –  %s" % slot['image_name']
+            elif slot.get('image_exists') is False:
+                title += "  –  Empty"
+            title += "   (%s)" % slot['partition']
+            health = self.health[index]
+            if health is None:
+                lines = ["… Reading", ""]
+            else:
+                lines = describe_health(health)
+                if index in self.refreshing:
+                    title += "   … refreshing"
+            health_list.append("\n".join([title] + lines))
+        return health_list
+    
+    def refresh(self):
+        """Relit tous les slots en parallèle ; les lignes sont remplacées au fil des résultats"""
+        if self.refreshing:
+            return
+        self.refreshing = set(range(len(self.slots)))
+        self.health_results = self.boot_manager.start_health_scan(self.slots)
+        self["menu"].setList(self.build_health_list())
+        self.health_timer.start(100, False)
+    
+    def poll_health_results(self):
+        """Récupère les résultats des workers depuis la boucle principale"""
+        updated = False
+        while True:
+            try:
+                index, health = self.health_results.get_nowait()
+            except queue.Empty:
+                break
+            self.health[index] = health
+            self.refreshing.discard(index)
+            updated = True
+        
+        if updated:
+            index = self["menu"].getSelectionIndex()
+            self["menu"].setList(self.build_health_list())
+            self["menu"].moveToIndex(index)
+        
+        if not self.refreshing:
+            self.health_timer.stop()
+    
+    def up(self):
+        self["menu"].up()
+    
+    def down(self):
+        self["menu"].down()
+    
+    def cancel(self):
+        self.health_timer.stop()
+        self.close()
+
+
+class JobProgressScreen(Screen):
+    """Écran de progression d'un job exécuté en arrière-plan"""
+    skin = """
+    <screen position="center,center" size="900,400" title="Please wait">
+        <widget name="title" position="0,40" size="900,60" font="Regular;32" halign="center" transparent="1" />
+        <widget name="progress" position="100,150" size="700,30" borderWidth="2" />
+        <widget name="step" position="50,200" size="800,100" font="Regular;24" halign="center" transparent="1" />
+        <widget name="status" position="0,330" size="900,50" font="Regular;22" halign="center" transparent="1" />
+    </screen>
+    """
+    
+    def __init__(self, session, job, title="Please wait"):
+        Screen.__init__(self, session)
+        self.job = job
+        self.setTitle(title)
+        
+        self["title"] = Label(title.upper())
+        self["progress"] = ProgressBar()
+        self["step"] = Label("Starting...")
+        self["status"] = Label("EXIT: Cancel")
+        
+        self["actions"] = ActionMap(["OkCancelActions"], {
+            "cancel": self.cancel,
+        }, -1)
+        
+        self.poll_timer = eTimer()
+        try:
+            self.poll_timer_conn = self.poll_timer.timeout.connect(self.poll_job)
+        except AttributeError:
+            self.poll_timer.callback.append(self.poll_job)
+        self.poll_timer.start(200, False)
+        self.onLayoutFinish.append(self.poll_job)
+    
+    def poll_job(self):
+        """Met à jour la barre de progression depuis la queue du job"""
+        events = self.job.poll()
+        if events:
+            percent, step = events[-1]
+            self["progress"].setValue(percent)
+            self["step"].setText("%d%%   %s" % (percent, step))
+        
+        if self.job.is_done():
+            self.poll_timer.stop()
+            self.close(self.job)
+    
+    def cancel(self):
+        """Demande l'annulation au prochain point d'arrêt"""
+        if not self.job.is_done() and not self.job.cancel_requested.is_set():
+            self.job.cancel()
+            self["status"].setText("Cancelling after the current step...")
+
+
 class BootManager:
     """Gestionnaire de boot pour lire/écrire bootconfig.txt"""
     
     def __init__(self):
-        self.bootconfig_path = "/data/bootconfig.txt"
+        self.bootconfig_path = os.path.join(DATA_DIR, "bootconfig.txt")
         if not fileExists(self.bootconfig_path):
-            self.bootconfig_path = "/boot/bootconfig.txt"
+            self.bootconfig_path = os.path.join(BOOT_DIR, "bootconfig.txt")
+        self.inventory = None
+        self.slot_registry = None
+        # mount, mkfs, tune2fs... : sans shell, avec délai et historique des durées
+        self.commands = CommandRunner()
+        # Rootfs en cours d'exécution : il ne change pas avant le prochain redémarrage
+        self.running_root = None
         self.ensure_bootconfig()
         self.create_all_startup_files()
+        self.slot_cache = SlotCache(os.path.join(DATA_DIR, SLOT_CACHE_NAME))
+        self.manifest_dir = os.path.join(DATA_DIR, MANIFEST_DIR_NAME)
+        # Dernière lecture espace / santé de chaque slot (tableau de bord)
+        self.health_cache = HealthCache()
     
     def ensure_bootconfig(self):
         """S'assure que bootconfig.txt existe avec la configuration U-Boot correcte"""
@@ -360,237 +1113,307 @@ class BootManager:
     
     def create_default_bootconfig(self):
         """Crée le fichier bootconfig.txt par défaut avec la configuration U-Boot mise à jour"""
-        bootconfig_content = """default=0
-details=0
-timeout=10
-fb_pos=100,400
-fb_size=1080,300
-
-[Dreambox Image]
-cmd=ext4load mmc 1:5 1080000 /boot/kernel.img;bootm;
-arg=${bootargs} root=/dev/mmcblk0p5 rootfstype=ext4 kernel=/boot/kernel.img logo=osd0,loaded,0x7f800000 vout=1080p50hz,enable hdmimode=1080p50hz fb_width=1280 fb_height=720 panel_type=lcd_4
-
-[Dreambox Image 1]
-cmd=ext4load mmc 1:6 1080000 /boot/kernel.img;bootm;
-arg=${bootargs} root=/dev/mmcblk0p6 rootfstype=ext4 kernel=/boot/kernel.img logo=osd0,loaded,0x7f800000 vout=1080p50hz,enable hdmimode=1080p50hz fb_width=1280 fb_height=720 panel_type=lcd_4
-
-[Dreambox Image 2]
-cmd=ext4load mmc 1:7 1080000 /boot/kernel.img;bootm;
-arg=${bootargs} root=/dev/mmcblk0p7 rootfstype=ext4 kernel=/boot/kernel.img logo=osd0,loaded,0x7f800000 vout=1080p50hz,enable hdmimode=1080p50hz fb_width=1280 fb_height=720 panel_type=lcd_4
-
-[Dreambox Image 3]
-cmd=ext4load mmc 1:8 1080000 /boot/kernel.img;bootm;
-arg=${bootargs} root=/dev/mmcblk0p8 rootfstype=ext4 kernel=/boot/kernel.img logo=osd0,loaded,0x7f800000 vout=1080p50hz,enable hdmimode=1080p50hz fb_width=1280 fb_height=720 panel_type=lcd_4
-
-[SDcard Slot 5]
-cmd=fatload mmc 0:1 1080000 /kernel2.img;bootm;
-arg=${bootargs} root=/dev/mmcblk1p2 rootfstype=ext4 kernel=/kernel2.img logo=osd0,loaded,0x7f800000 vout=1080p50hz,enable hdmimode=1080p50hz fb_width=1280 fb_height=720 panel_type=lcd_4
-
-[SDcard Slot 6]
-cmd=fatload mmc 0:1 1080000 /kernel3.img;bootm;
-arg=${bootargs} root=/dev/mmcblk1p3 rootfstype=ext4 kernel=/kernel3.img logo=osd0,loaded,0x7f800000 vout=1080p50hz,enable hdmimode=1080p50hz fb_width=1280 fb_height=720 panel_type=lcd_4
-
-[SDcard Slot 7]
-cmd=fatload mmc 0:1 1080000 /kernel4.img;bootm;
-arg=${bootargs} root=/dev/mmcblk1p4 rootfstype=ext4 kernel=/kernel4.img logo=osd0,loaded,0x7f800000 vout=1080p50hz,enable hdmimode=1080p50hz fb_width=1280 fb_height=720 panel_type=lcd_4
-
-[SDcard Slot 8]
-cmd=fatload mmc 0:1 1080000 /kernel5.img;bootm;
-arg=${bootargs} root=/dev/mmcblk1p5 rootfstype=ext4 kernel=/kernel5.img logo=osd0,loaded,0x7f800000 vout=1080p50hz,enable hdmimode=1080p50hz fb_width=1280 fb_height=720 panel_type=lcd_4
-"""
-        try:
-            with open(self.bootconfig_path, 'w') as f:
-                f.write(bootconfig_content)
-            print("[BootManager] ✓ Default bootconfig.txt created successfully")
+        bootconfig_content = self.get_slot_registry().bootconfig_text()
+        try:
+            if write_if_changed(self.bootconfig_path, bootconfig_content):
+                invalidate_bootconfig(self.bootconfig_path)
+                print("[BootManager] ✓ Default bootconfig.txt created successfully")
             return True
         except Exception as e:
             print("[BootManager] ✗ Error creating bootconfig.txt:", str(e))
             return False
     
+    @traced("write_startup")
     def create_all_startup_files(self):
         """Crée tous les fichiers STARTUP pour les slots MMC et SD Card"""
         try:
-            mmc_startup_contents = {
-                'STARTUP_1': 'root=/dev/mmcblk0p5 rootfstype=ext4 kernel=/boot/kernel.img\n',
-                'STARTUP_2': 'root=/dev/mmcblk0p6 rootfstype=ext4 kernel=/boot/kernel.img\n',
-                'STARTUP_3': 'root=/dev/mmcblk0p7 rootfstype=ext4 kernel=/boot/kernel.img\n',
-                'STARTUP_4': 'root=/dev/mmcblk0p8 rootfstype=ext4 kernel=/boot/kernel.img\n'
-            }
-            
-            sd_startup_contents = {
-                'STARTUP_5': 'root=/dev/mmcblk1p2 rootfstype=ext4 kernel=/kernel2.img\n',
-                'STARTUP_6': 'root=/dev/mmcblk1p3 rootfstype=ext4 kernel=/kernel3.img\n',
-                'STARTUP_7': 'root=/dev/mmcblk1p4 rootfstype=ext4 kernel=/kernel4.img\n',
-                'STARTUP_8': 'root=/dev/mmcblk1p5 rootfstype=ext4 kernel=/kernel5.img\n'
-            }
-            
-            all_startup_contents = {**mmc_startup_contents, **sd_startup_contents}
-            
-            for startup_file, content in all_startup_contents.items():
+            for startup_file, content in self.get_slot_registry().startup_contents().items():
                 try:
-                    file_path = "/data/" + startup_file
-                    with open(file_path, 'w') as f:
-                        f.write(content)
-                    os.chmod(file_path, 0o755)
-                    print("[BootManager] Created %s in /data/" % startup_file)
+                    file_path = os.path.join(DATA_DIR, startup_file)
+                    if write_if_changed(file_path, content, 0o755):
+                        print("[BootManager] Created %s in /data/" % startup_file)
                 except Exception as e:
                     print("[BootManager] Error creating %s: %s" % (startup_file, str(e)))
             
-            print("[BootManager] ✓ All STARTUP files created successfully in /data/")
+            print("[BootManager] ✓ All STARTUP files up to date in /data/")
             return True
             
         except Exception as e:
             print("[BootManager] Error creating STARTUP files:", str(e))
             return False
     
-    def get_multiboot_slots(self):
-        """Récupère la liste des slots multiboot avec nom d'image"""
-        slots = []
-        
-        internal_slots = [
-            {'name': 'Slot 1 (Multiboot 1)', 'partition': '/dev/mmcblk0p5', 'mount_point': '/media/mmcblk0p5', 'startup_file': 'STARTUP_1'},
-            {'name': 'Slot 2 (Multiboot 2)', 'partition': '/dev/mmcblk0p6', 'mount_point': '/media/mmcblk0p6', 'startup_file': 'STARTUP_2'},
-            {'name': 'Slot 3 (Multiboot 3)', 'partition': '/dev/mmcblk0p7', 'mount_point': '/media/mmcblk0p7', 'startup_file': 'STARTUP_3'},
-            {'name': 'Slot 4 (Multiboot 4)', 'partition': '/dev/mmcblk0p8', 'mount_point': '/media/mmcblk0p8', 'startup_file': 'STARTUP_4'},
-        ]
+    @traced()
+    def get_slot_layout(self):
+        """Retourne les slots dont la partition existe, sans les sonder"""
+        # Inventaire sysfs relu à chaque affichage (quelques lectures de fichiers)
+        self.get_inventory(refresh=True)
         
-        sd_slots = [
-            {'name': 'SDcard Slot 5', 'partition': '/dev/mmcblk1p2', 'mount_point': '/media/mmcblk1p2', 'startup_file': 'STARTUP_5'},
-            {'name': 'SDcard Slot 6', 'partition': '/dev/mmcblk1p3', 'mount_point': '/media/mmcblk1p3', 'startup_file': 'STARTUP_6'},
-            {'name': 'SDcard Slot 7', 'partition': '/dev/mmcblk1p4', 'mount_point': '/media/mmcblk1p4', 'startup_file': 'STARTUP_7'},
-            {'name': 'SDcard Slot 8', 'partition': '/dev/mmcblk1p5', 'mount_point': '/media/mmcblk1p5', 'startup_file': 'STARTUP_8'},
-        ]
-        
-        for slot in internal_slots:
-            if self.check_partition_exists(slot['partition']):
-                image_exists, image_name = self.check_slot_has_image(slot)
-                slot['image_exists'] = image_exists
-                slot['image_name'] = image_name
-                slots.append(slot)
-        
-        for slot in sd_slots:
-            if self.check_partition_exists(slot['partition']):
-                image_exists, image_name = self.check_slot_has_image(slot)
-                slot['image_exists'] = image_exists
-                slot['image_name'] = image_name
+        slots = []
+        for registered in self.get_slot_registry():
+            if self.check_partition_exists(registered.partition):
+                slot = registered.as_dict()
+                # Réponse immédiate depuis le cache si le superblock n'a pas changé
+                slot['signature'] = slot_signature(slot['partition'])
+                cached = self.slot_cache.get(slot['partition'], slot['signature'])
+                if cached is not None:
+                    slot['image_exists'], slot['image_name'] = cached
+                else:
+                    slot['image_exists'] = None
+                    slot['image_name'] = None
                 slots.append(slot)
         
         return slots
     
-    def get_sd_card_size(self):
-        """Récupère la taille totale de la SD card en Mo"""
-        try:
-            cmd = "fdisk -l /dev/mmcblk1 | grep 'Disk /dev/mmcblk1' | awk '{print $3}'"
-            size_gb = float(os.popen(cmd).read().strip())
-            size_mb = int(size_gb * 1024)
-            return size_mb
-        except:
-            return 8192
-    
-    def partition_sd_card(self):
-        """Partitionne la SD card avec les partitions spécifiées"""
+    @traced()
+    def get_multiboot_slots(self):
+        """Récupère la liste des slots multiboot avec nom d'image"""
+        slots = self.get_slot_layout()
+        pending = [slot for slot in slots if slot['image_exists'] is None]
+        results = self.start_slot_probe(slots)
+        
+        deadline = time.time() + SLOT_PROBE_TIMEOUT
+        for _ in pending:
+            try:
+                index, image_exists, image_name = results.get(timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                break
+            slots[index]['image_exists'] = image_exists
+            slots[index]['image_name'] = image_name
+        
+        # Slots toujours sans réponse : inconnus, le worker continue en arrière-plan
+        for slot in pending:
+            if slot['image_exists'] is None:
+                print("[BootManager] ⚠ Probing %s timed out" % slot['partition'])
+                slot['image_exists'], slot['image_name'] = False, "Unknown"
+        
+        return slots
+    
+    def start_slot_probe(self, slots):
+        """Sonde les slots non cachés en arrière-plan, un worker par périphérique (eMMC / SD)
+        
+        Retourne une queue qui reçoit un tuple (index, image_exists, image_name)
+        dès qu'un slot a été sondé.
+        """
+        results = queue.Queue()
+        
+        # Regrouper par disque : les slots d'un même support sont sondés en série,
+        # les supports différents (eMMC et SD) en parallèle
+        groups = {}
+        for index, slot in enumerate(slots):
+            if slot.get('image_exists') is not None:
+                continue
+            device = re.sub(r'p\d+$', '', slot['partition'])
+            groups.setdefault(device, []).append(index)
+        
+        def probe_group(indexes):
+            for index in indexes:
+                try:
+                    image_exists, image_name = self.check_slot_has_image(slots[index])
+                except Exception as e:
+                    print("[BootManager] Error probing slot:", str(e))
+                    image_exists, image_name = False, "Empty"
+                self.slot_cache.put(slots[index]['partition'], slots[index].get('signature'), image_exists, image_name)
+                results.put((index, image_exists, image_name))
+            self.slot_cache.save()
+        
+        if groups:
+            executor = ThreadPoolExecutor(max_workers=len(groups))
+            for indexes in groups.values():
+                executor.submit(probe_group, indexes)
+            executor.shutdown(wait=False)
+        
+        return results
+    
+    def get_inventory(self, refresh=False):
+        """Retourne l'inventaire sysfs des disques et partitions"""
+        if self.inventory is None or refresh:
+            self.inventory = scan_block_devices()
+        return self.inventory
+    
+    def get_slot_registry(self):
+        """Registre des slots, reconstruit quand l'inventaire est relu"""
+        inventory = self.get_inventory()
+        if self.slot_registry is None or self.slot_registry.inventory is not inventory:
+            self.slot_registry = build_slot_registry(inventory, emmc_device=EMMC_DEVICE, sd_device=SD_CARD_DEVICE,
+                                                     media_dir=MEDIA_DIR)
+        return self.slot_registry
+    
+    def get_sd_card_sectors(self, device=SD_CARD_DEVICE):
+        """Taille réelle de la SD card en secteurs de 512 octets, None si absente"""
+        disk = self.get_inventory(refresh=True).disk(device)
+        if disk is not None and disk.size:
+            return disk.size
+        
+        # Image fichier (tests) : taille lue directement
         try:
-            print("[BootManager] Starting SD card partitioning...")
-            
-            if not self.check_partition_exists("/dev/mmcblk1"):
-                return False, "SD card not found at /dev/mmcblk1"
-            
-            sd_size_mb = self.get_sd_card_size()
-            print("[BootManager] SD card size:", sd_size_mb, "MB")
-            
-            fat32_size_mb = sd_size_mb - (4 * 1740)
-            ext4_size_mb = 1740
+            return disk_sectors(device)
+        except OSError as e:
+            print("[BootManager] Cannot read size of %s: %s" % (device, str(e)))
+            return None
+    
+    def get_fs_profile(self, partition):
+        """Profil de système de fichiers et unité d'effacement (octets) du support de partition"""
+        slot = self.get_slot_registry().find_by_partition(partition)
+        on_sd = slot.storage == 'sd' if slot is not None else partition.startswith(SD_CARD_DEVICE)
+        profile = get_profile(SD_FS_PROFILE if on_sd else INTERNAL_FS_PROFILE)
+        return profile, erase_block_size(profile, SD_CARD_DEVICE if on_sd else None)
+    
+    def get_sd_alignment_mb(self, device=SD_CARD_DEVICE):
+        """Alignement des partitions de la SD card (MiB) d'après son unité d'effacement"""
+        profile = get_profile(SD_FS_PROFILE)
+        return alignment_mb(profile, erase_block_size(profile, device))
+    
+    @traced()
+    def partition_sd_card(self, device=SD_CARD_DEVICE, plan=None, mkfs_parallel=MKFS_MAX_PARALLEL, job=None):
+        """Partitionne la SD card selon plan (sdlayout.plan_sd_layout), le schéma par défaut si None"""
+        try:
+            self.report_progress(job, 0, "Starting SD card partitioning...", checkpoint=True)
             
-            print("[BootManager] FAT32 partition size:", fat32_size_mb, "MB")
-            print("[BootManager] EXT4 partition size:", ext4_size_mb, "MB")
+            if not self.check_partition_exists(device):
+                return False, "SD card not found at %s" % device
             
-            for n in range(1, 6):
-                partition = "/dev/mmcblk1p%d" % n
-                umount_cmd = "umount -lf %s > /dev/null 2>&1" % partition
-                os.system(umount_cmd)
+            # Taille réelle en secteurs : la GPT de secours doit tomber pile en fin de disque
+            total_sectors = self.get_sd_card_sectors(device)
+            if total_sectors is None:
+                return False, "Cannot read the size of %s" % device
+            try:
+                if plan is None:
+                    plan = plan_sd_layout(total_sectors, align_mb=self.get_sd_alignment_mb(device))
+                elif plan['total_sectors'] != total_sectors:
+                    return False, "SD card size changed since the layout was planned, please retry"
+            except LayoutError as e:
+                return False, str(e)
+            print("[BootManager] SD card layout:\n%s" % describe_plan(plan))
             
-            sgdisk_cmd = "sgdisk -z /dev/mmcblk1"
-            result = os.system(sgdisk_cmd)
-            if result != 0:
-                return False, "Failed to clean partition table"
+            self.report_progress(job, 5, "Unmounting SD card partitions...", checkpoint=True)
+            # Toutes les partitions actuelles, y compris celles d'un schéma précédent plus grand
+            disk = self.get_inventory().disk(device)
+            numbers = set(part.number for part in disk.partitions) if disk is not None else set()
+            mounted = self.mounted_devices()
+            for n in sorted(numbers | set(part['number'] for part in plan['partitions'])):
+                partition = partition_path(device, n)
+                if partition in mounted:
+                    self.commands.run(["umount", "-lf", partition])
             
-            parted_cmd = "parted --script /dev/mmcblk1 mklabel gpt"
-            result = os.system(parted_cmd)
-            if result != 0:
-                return False, "Failed to create GPT partition table"
+            partitions = plan['partitions']
             
-            start = 1
-            end_fat32 = start + fat32_size_mb
-            parted_cmd = "parted --script /dev/mmcblk1 mkpart DREAMCARD fat16 %dMB %dMB" % (start, end_fat32)
-            result = os.system(parted_cmd)
-            if result != 0:
-                return False, "Failed to create partition 1 (FAT32)"
+            # Table complète écrite en une passe, puis une seule relecture par le noyau
+            # Dernier point d'annulation : au-delà, la carte est modifiée
+            self.report_progress(job, 15, "Writing GPT partition table...", checkpoint=True)
+            try:
+                write_gpt(device, partitions, total_sectors)
+            except (GPTError, OSError) as e:
+                return False, "Failed to write GPT partition table: %s" % str(e)
             
-            for i in range(4):
-                part_num = i + 2
-                start_ext4 = end_fat32 if i == 0 else end_fat32 + (i * ext4_size_mb)
-                end_ext4 = start_ext4 + ext4_size_mb
-                
-                parted_cmd = "parted --script /dev/mmcblk1 mkpart dreambox-rootfs ext4 %dMB %dMB" % (start_ext4, end_ext4)
-                result = os.system(parted_cmd)
-                if result != 0:
-                    return False, "Failed to create partition %d (EXT4)" % part_num
+            self.report_progress(job, 20, "Waiting for partition nodes...")
+            if not reread_partition_table(device):
+                # EBUSY : une partition est encore tenue (umount paresseux) ; partprobe
+                # réessaie partition par partition (BLKPG)
+                result = self.commands.run(["partprobe", device])
+                if not result.ok:
+                    return False, ("The kernel could not re-read the partition table of %s: %s\n\n"
+                                   "A partition is probably still in use. Remove and reinsert the SD card, "
+                                   "or reboot, before formatting." % (device, result.error_message()))
+            if not wait_for_partitions(device, partitions, timeout=10):
+                return False, "Partitions with the new layout did not appear after 10 s"
+            self.get_inventory(refresh=True)
             
-            os.system("partprobe /dev/mmcblk1")
-            os.system("sleep 2")
+            self.slot_cache.invalidate_device(device)
+            self.slot_cache.save()
+            self.health_cache.invalidate_device(device)
             
-            print("[BootManager] Formatting partitions...")
+            self.report_progress(job, 30, "Formatting partitions...")
             
-            mkfs_cmd = "mkfs.fat -F 32 -n DREAMCARD /dev/mmcblk1p1"
-            result = os.system(mkfs_cmd)
-            if result != 0:
-                return False, "Failed to format partition 1 (FAT32)"
+            profile = get_profile(SD_FS_PROFILE)
+            erase_block = erase_block_size(profile, device)
+            mkfs_commands = []
+            for part in partitions:
+                partition = partition_path(device, part['number'])
+                if part['role'] == 'fat':
+                    mkfs_commands.append((partition, fat_commands(partition, profile, "DREAMCARD", part['size_mb'] * 1024 * 1024)))
+                else:
+                    mkfs_commands.append((partition, ext4_commands(partition, profile, erase_block)))
             
-            for n in range(2, 6):
-                partition = "/dev/mmcblk1p%d" % n
-                mkfs_cmd = "mkfs.ext4 -F %s" % partition
-                result = os.system(mkfs_cmd)
-                if result != 0:
-                    return False, "Failed to format partition %d (EXT4)" % n
+            mkfs_results = self.format_partitions(mkfs_commands, mkfs_parallel, job)
+            mkfs_report = "\n".join(
+                "- %s: %s (%.1f s)" % (r['partition'], "OK" if r['success'] else r['error'], r['elapsed'])
+                for r in mkfs_results)
+            if not all(r['success'] for r in mkfs_results):
+                return False, "Failed to format partitions:\n%s" % mkfs_report
             
-            print("[BootManager] Creating all STARTUP files in /data/...")
+            self.report_progress(job, 90, "Creating all STARTUP files in /data/...")
             startup_success = self.create_all_startup_files()
             if not startup_success:
                 return False, "Failed to create STARTUP files"
             
-            print("[BootManager] Ensuring bootconfig.txt is updated...")
+            self.report_progress(job, 95, "Ensuring bootconfig.txt is updated...")
             config_success = self.ensure_bootconfig_updated()
             if not config_success:
                 return False, "Failed to update bootconfig.txt"
             
-            return True, "SD card partitioned successfully:\n- FAT32: %d MB\n- 4x EXT4: %d MB each\n- All STARTUP files created in /data/\n- Bootconfig.txt updated" % (fat32_size_mb, ext4_size_mb)
+            self.report_progress(job, 100, "Done")
+            return True, "SD card partitioned successfully:\n- FAT32: %d MB\n- %dx EXT4: %d MB each\n- All STARTUP files created in /data/\n- Bootconfig.txt updated\n\nFormatting:\n%s" % (plan['fat_mb'], plan['slot_count'], plan['slot_size_mb'], mkfs_report)
             
+        except JobCancelled:
+            raise
         except Exception as e:
             return False, "Error during SD card partitioning: %s" % str(e)
     
+    def format_partitions(self, commands, max_parallel=MKFS_MAX_PARALLEL, job=None):
+        """Lance les mkfs en parallèle (max_parallel à la fois) et collecte tous les résultats
+        
+        commands est une liste de (partition, [argv, ...]) : les commandes d'une
+        partition (mkfs puis tune2fs) s'enchaînent et s'arrêtent au premier échec.
+        Chaque résultat est un dict {'partition', 'success', 'returncode',
+        'elapsed', 'error'} ; un échec n'interrompt pas les autres formatages.
+        """
+        finished = []
+        lock = threading.Lock()
+        
+        def run_mkfs(command):
+            partition, argvs = command
+            start_time = time.time()
+            returncode, error = 0, ""
+            with span("mkfs", partition=partition):
+                for argv in argvs:
+                    result = self.commands.run(argv, MKFS_TIMEOUT)
+                    returncode = result.returncode
+                    if not result.ok:
+                        error = "%s: %s" % (argv[0], result.error_message())
+                        break
+            elapsed = time.time() - start_time
+            with lock:
+                finished.append(partition)
+                percent = 30 + 55 * len(finished) // len(commands)
+            self.report_progress(job, percent, "%s %s in %.1f s" % (partition, "formatted" if returncode == 0 else "failed", elapsed))
+            return {
+                'partition': partition,
+                'success': returncode == 0,
+                'returncode': returncode,
+                'elapsed': elapsed,
+                'error': "" if returncode == 0 else (error or "exit code %d" % returncode)
+            }
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+            return list(executor.map(run_mkfs, commands))
+    
+    @traced()
     def ensure_bootconfig_updated(self):
         """S'assure que bootconfig.txt contient la configuration U-Boot correcte"""
         try:
             if fileExists(self.bootconfig_path):
-                with open(self.bootconfig_path, 'r') as f:
-                    content = f.read()
-                
-                required_entries = [
-                    '[Dreambox Image]',
-                    '[Dreambox Image 1]', 
-                    '[Dreambox Image 2]',
-                    '[Dreambox Image 3]',
-                    '[SDcard Slot 5]',
-                    '[SDcard Slot 6]',
-                    '[SDcard Slot 7]',
-                    '[SDcard Slot 8]'
-                ]
+                config = load_bootconfig(self.bootconfig_path)
                 
-                missing_entries = [entry for entry in required_entries if entry not in content]
+                missing_slots = [slot for slot in self.get_slot_registry() if config.find(slot.section) is None]
                 
-                if missing_entries:
-                    print("[BootManager] Missing entries in bootconfig, recreating...")
-                    return self.create_default_bootconfig()
+                if missing_slots:
+                    # Sections ajoutées à la fin : default= et les entrées existantes sont conservées
+                    print("[BootManager] Adding %d missing entries to bootconfig..." % len(missing_slots))
+                    text = config.to_text().rstrip('\n') + '\n'
+                    text += "".join("\n" + slot.bootconfig_section() for slot in missing_slots)
+                    if write_if_changed(self.bootconfig_path, text):
+                        invalidate_bootconfig(self.bootconfig_path)
+                    return True
                 else:
                     print("[BootManager] ✓ Bootconfig.txt already contains required entries")
                     return True
@@ -603,19 +1426,55 @@ arg=${bootargs} root=/dev/mmcblk1p5 rootfstype=ext4 kernel=/kernel5.img logo=osd
             return self.create_default_bootconfig()
     
     def check_partition_exists(self, partition):
-        """Vérifie si la partition existe"""
-        return fileExists(partition) or os.path.exists(partition)
+        """Vérifie si la partition existe (inventaire sysfs, sinon chemin direct)"""
+        return self.get_inventory().exists(partition) or os.path.exists(partition)
     
+    @traced("probe")
     def check_slot_has_image(self, slot):
         """Vérifie si une image est installée dans le slot et retourne son nom depuis /etc/issue"""
         try:
-            if not os.path.exists(slot['mount_point']):
-                os.makedirs(slot['mount_point'], exist_ok=True)
+            # Lecture directe du système de fichiers, sans montage
+            return self.read_slot_image_info(slot['partition'])
+        except (Ext4Error, OSError) as e:
+            print("[BootManager] Direct ext4 read failed on %s (%s), falling back to mount" % (slot['partition'], str(e)))
+        
+        return self.check_slot_has_image_mounted(slot)
+    
+    @traced("read_issue")
+    def read_slot_image_info(self, partition):
+        """Identifie l'image d'une partition ext4 sans la monter"""
+        with Ext4Reader(partition) as reader:
+            items = reader.listdir('/')
+            valid_items = [item for item in items if item not in ['.', '..', 'lost+found']]
+            if not valid_items:
+                return False, "Empty"
+            
+            try:
+                content = reader.read_file('/etc/issue', 4096)
+            except Ext4Error:
+                content = None
             
-            mount_cmd = "mount %s %s 2>/dev/null" % (slot['partition'], slot['mount_point'])
-            mount_result = os.system(mount_cmd)
+            if content is not None:
+                return True, self.parse_issue_name(content.decode('utf-8', 'replace'))
             
-            if mount_result != 0:
+            # Si pas de /etc/issue, vérifier la présence de fichiers système
+            system_dirs = ['bin', 'sbin', 'usr', 'etc', 'lib']
+            has_system = any(d in valid_items for d in system_dirs)
+            return True, "Unknown System" if has_system else "Empty"
+    
+    def parse_issue_name(self, content):
+        """Extrait le nom de l'image depuis le contenu de /etc/issue"""
+        lines = content.split('\n')
+        image_name = lines[0].strip() if lines else ""
+        # Nettoyer le nom
+        image_name = image_name.replace('Welcome to', '').replace('\\n', '').replace('\\l', '').strip()
+        return image_name or "Unknown Image"
+    
+    @traced("probe_mounted")
+    def check_slot_has_image_mounted(self, slot):
+        """Identifie l'image en montant la partition (systèmes de fichiers non ext4)"""
+        try:
+            if not self.mount(slot['partition'], slot['mount_point']):
                 return False, "Empty"
             
             image_exists = False
@@ -634,13 +1493,7 @@ arg=${bootargs} root=/dev/mmcblk1p5 rootfstype=ext4 kernel=/kernel5.img logo=osd
                         try:
                             with open(issue_file, 'r') as f:
                                 content = f.read()
-                            lines = content.split('\n')
-                            if lines:
-                                image_name = lines[0].strip()
-                                # Nettoyer le nom
-                                image_name = image_name.replace('Welcome to', '').replace('\\n', '').replace('\\l', '').strip()
-                                if not image_name:
-                                    image_name = "Unknown Image"
+                            image_name = self.parse_issue_name(content)
                         except:
                             image_name = "Unknown Image"
                     else:
@@ -661,146 +1514,918 @@ arg=${bootargs} root=/dev/mmcblk1p5 rootfstype=ext4 kernel=/kernel5.img logo=osd
             return False, "Empty"
     
     def force_unmount(self, mount_point):
-        """Force le démontage d'un point de montage"""
+        """Force le démontage d'un point de montage : umount, puis -f et -l tant qu'il reste monté"""
+        if not os.path.ismount(mount_point):
+            return
+        with span("umount", mount_point=mount_point):
+            for options in ([], ["-f"], ["-l"]):
+                self.commands.run(["umount"] + options + [mount_point])
+                if not os.path.ismount(mount_point):
+                    return
+    
+    @traced("mount")
+    def mount(self, partition, mount_point, options=None):
+        """Monte partition sur mount_point (créé si besoin) avec les options -o données"""
+        if not os.path.exists(mount_point):
+            os.makedirs(mount_point, exist_ok=True)
+        argv = ["mount"] + (["-o", options] if options else []) + [partition, mount_point]
+        result = self.commands.run(argv)
+        if not result.ok:
+            print("[BootManager] Cannot mount %s: %s" % (partition, result.error_message()))
+        return result.ok
+    
+    def mounted_devices(self):
+        """Périphériques montés d'après /proc/mounts : {périphérique: point de montage}"""
+        devices = {}
         try:
-            if os.path.ismount(mount_point):
-                umount_cmd = "umount %s 2>/dev/null" % mount_point
-                os.system(umount_cmd)
-                
-                check_cmd = "mountpoint -q %s && umount -f %s 2>/dev/null" % (mount_point, mount_point)
-                os.system(check_cmd)
-                
-                lazy_cmd = "umount -l %s 2>/dev/null" % mount_point
-                os.system(lazy_cmd)
-        except:
+            with open("/proc/mounts", "r") as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 2:
+                        devices[fields[0]] = fields[1]
+        except OSError:
             pass
+        return devices
+    
+    def start_health_scan(self, slots):
+        """Lit en parallèle l'espace et la santé ext4 des slots, sans les monter
+        
+        Retourne une queue qui reçoit (index, health) dès qu'un slot a été lu.
+        Les slots déjà montés (dont le rootfs en cours) sont mesurés par statvfs.
+        """
+        mounted = self.mounted_devices()
+        running = self.get_running_root()
+        targets = []
+        for slot in slots:
+            mount_point = mounted.get(slot['partition'])
+            if mount_point is None and slot['partition'] == running:
+                mount_point = "/"
+            targets.append((slot['partition'], mount_point))
+        return collect_health(targets, self.health_cache)
+    
+    def report_progress(self, job, percent, step, checkpoint=False):
+        """Publie la progression d'une opération lancée comme Job
+        
+        checkpoint=True marque un point où l'annulation est encore sans risque.
+        """
+        print("[BootManager] [%d%%] %s" % (percent, step))
+        if job is not None:
+            job.progress(percent, step)
+            if checkpoint:
+                job.checkpoint()
     
-    def delete_slot_image(self, slot_info):
-        """Nettoie et supprime l'image installée dans un slot sans supprimer la partition"""
+    @traced()
+    def delete_slot_image(self, slot_info, mode=WIPE_FAST, discard=False, job=None):
+        """Nettoie et supprime l'image installée dans un slot sans supprimer la partition
+        
+        mode=WIPE_FAST reformate directement la partition sans la monter,
+        mode=WIPE_THOROUGH supprime d'abord les fichiers un par un.
+        """
         try:
             print("[BootManager] Deleting image from slot:", slot_info['name'])
             print("[BootManager] Partition:", slot_info['partition'])
+            self.report_progress(job, 0, "Preparing %s..." % slot_info['partition'], checkpoint=True)
+            
+            self.slot_cache.invalidate(slot_info['partition'])
+            self.slot_cache.save()
+            self.health_cache.invalidate(slot_info['partition'])
+            self.remove_slot_manifest(slot_info)
+            
+            start_time = time.time()
+            if mode == WIPE_THOROUGH:
+                success, message = self.wipe_slot_thorough(slot_info, job)
+            else:
+                success, message = self.wipe_slot_fast(slot_info, discard, job)
+            elapsed = time.time() - start_time
+            
+            self.report_progress(job, 100, "Done")
+            print("[BootManager] Wipe (%s) finished in %.1f s" % (mode, elapsed))
+            return success, "%s (%s wipe, %.1f s)" % (message, mode, elapsed)
+            
+        except JobCancelled:
+            raise
+        except Exception as e:
+            error_msg = "Error during deletion: %s" % str(e)
+            print("[BootManager]", error_msg)
+            return False, error_msg
+    
+    @traced()
+    def wipe_slot_fast(self, slot_info, discard=False, job=None):
+        """Reformate la partition sans parcourir les fichiers"""
+        # La partition ne doit pas rester montée pendant mkfs
+        self.report_progress(job, 10, "Unmounting %s..." % slot_info['mount_point'], checkpoint=True)
+        self.force_unmount(slot_info['mount_point'])
+        
+        if discard:
+            # Libère tous les blocs de la partition côté contrôleur flash
+            self.report_progress(job, 20, "Discarding blocks on %s..." % slot_info['partition'], checkpoint=True)
+            if not self.commands.run(["blkdiscard", slot_info['partition']], MKFS_TIMEOUT).ok:
+                print("[BootManager] ⚠ Block discard not supported, continuing")
+        
+        # Tables d'inodes et journal initialisés paresseusement par le noyau
+        self.report_progress(job, 40, "Reformatting partition...", checkpoint=True)
+        if not self.format_slot(slot_info, fast=True):
+            return False, "Could not reformat partition"
+        
+        print("[BootManager] ✓ Partition reformatted successfully")
+        return True, "Image supprimée avec succès, slot maintenant vide"
+    
+    @traced("mkfs")
+    def format_slot(self, slot_info, fast=False):
+        """Crée l'ext4 du slot selon le profil de son support (SD ou eMMC)"""
+        profile, erase_block = self.get_fs_profile(slot_info['partition'])
+        for argv in ext4_commands(slot_info['partition'], profile, erase_block, fast):
+            if self.run_fs_tool(argv) != 0:
+                print("[BootManager] %s failed on %s" % (argv[0], slot_info['partition']))
+                return False
+        return True
+    
+    @traced()
+    def wipe_slot_thorough(self, slot_info, job=None):
+        """Supprime les fichiers un par un puis reformate la partition"""
+        # Monter la partition
+        self.report_progress(job, 5, "Mounting %s..." % slot_info['partition'], checkpoint=True)
+        if not os.path.exists(slot_info['mount_point']):
+            os.makedirs(slot_info['mount_point'], exist_ok=True)
+        
+        if not self.mount_slot(slot_info):
+            return False, "Impossible de monter la partition"
+        
+        try:
+            # Nettoyer complètement la partition (supprimer tous les fichiers et dossiers)
+            self.report_progress(job, 10, "Deleting files...", checkpoint=True)
+            items = os.listdir(slot_info['mount_point'])
+            for count, item in enumerate(items):
+                if item != 'lost+found':
+                    self.report_progress(job, 10 + 60 * count // len(items), "Deleting /%s..." % item)
+                    item_path = os.path.join(slot_info['mount_point'], item)
+                    try:
+                        if os.path.isdir(item_path):
+                            shutil.rmtree(item_path, ignore_errors=True)
+                        else:
+                            os.remove(item_path)
+                    except Exception as e:
+                        print(f"Warning: Cannot remove {item_path}: {e}")
+            
+            # Synchroniser
+            self.report_progress(job, 75, "Syncing...")
+            os.sync()
+            
+        finally:
+            # Toujours démonter
+            self.force_unmount(slot_info['mount_point'])
+        
+        # Reformater la partition pour s'assurer qu'elle est complètement vide
+        self.report_progress(job, 80, "Reformatting partition to ensure clean state...")
+        if self.format_slot(slot_info):
+            print("[BootManager] ✓ Partition reformatted successfully")
+        else:
+            print("[BootManager] ⚠ Could not reformat partition, but files were deleted")
+        
+        return True, "Image supprimée avec succès, slot maintenant vide"
+    
+    def find_image_archives(self):
+        """Liste les archives d'images présentes dans IMAGE_SEARCH_DIRS"""
+        archives = []
+        for directory in IMAGE_SEARCH_DIRS:
+            for path in sorted(glob.glob(os.path.join(directory, "*"))):
+                if is_image_archive(path) and os.path.isfile(path) and path not in archives:
+                    archives.append(path)
+        return archives
+    
+    def get_download_cache(self):
+        """Cache de téléchargement sur DREAMCARD ou le disque dur, None si aucun n'est monté"""
+        for mount_point, subdir in DOWNLOAD_CACHE_LOCATIONS:
+            if os.path.ismount(mount_point):
+                try:
+                    return DownloadCache(os.path.join(mount_point, subdir))
+                except OSError as e:
+                    print("[BootManager] Cannot use download cache on %s: %s" % (mount_point, str(e)))
+        return None
+    
+    @traced()
+    def download_image(self, url, expected_sha256=None, job=None):
+        """Télécharge une archive d'image (avec reprise) dans le cache local
+        
+        Retourne (True, infos) avec infos = {path, sha256, size, cached, resumed, elapsed},
+        ou (False, message d'erreur).
+        """
+        try:
+            self.report_progress(job, 0, "Connecting...", checkpoint=True)
+            cache = self.get_download_cache()
+            if cache is None:
+                return False, "No DREAMCARD partition or HDD mounted for the download cache"
+            
+            last = {'percent': -1, 'mb': -1}
+            
+            def progress(done, total):
+                percent = 99 * done // total if total else 0
+                mb = done // (1024 * 1024)
+                if percent != last['percent'] or (not total and mb != last['mb']):
+                    last['percent'] = percent
+                    last['mb'] = mb
+                    # Annulation possible entre deux blocs : le .part est conservé pour reprise
+                    self.report_progress(job, percent, "Downloading... %d MB" % mb, checkpoint=True)
+            
+            info = download(url, cache, expected_sha256, progress)
+            self.report_progress(job, 100, "Done")
+            print("[BootManager] %s -> %s (%s)" % (url, info['path'], "cache hit" if info['cached'] else "downloaded"))
+            return True, info
+            
+        except JobCancelled:
+            raise
+        except (DownloadError, OSError) as e:
+            error_msg = "Error during download: %s" % str(e)
+            print("[BootManager]", error_msg)
+            return False, error_msg
+    
+    @traced()
+    def install_image_to_slot(self, archive_path, slot_info, job=None):
+        """Installe une archive rootfs dans un slot : formatage puis extraction en flux"""
+        try:
+            self.report_progress(job, 0, "Preparing %s..." % os.path.basename(archive_path), checkpoint=True)
+            if not is_image_archive(archive_path) or not os.path.isfile(archive_path):
+                return False, "Unsupported image archive: %s" % archive_path
+            
+            success, result = self.extract_to_slot(slot_info,
+                lambda target, progress: install_archive(archive_path, target, progress), job)
+            if not success:
+                return False, result
+            
+            mb = result['bytes'] / (1024.0 * 1024.0)
+            print("[BootManager] Installed %s: %d files, %.1f MB in %.1f s" % (archive_path, result['files'], mb, result['elapsed']))
+            return True, "%s\n%d files, %.1f MB in %.0f s (%.1f MB/s)\nMD5: %s\nSHA256: %s" % (
+                os.path.basename(archive_path), result['files'], mb, result['elapsed'],
+                result['throughput'] / (1024.0 * 1024.0), result['md5'], result['sha256'])
+            
+        except JobCancelled:
+            raise
+        except Exception as e:
+            error_msg = "Error during installation: %s" % str(e)
+            print("[BootManager]", error_msg)
+            return False, error_msg
+    
+    @traced()
+    def extract_to_slot(self, slot_info, extract, job=None):
+        """Reformate le slot, le monte et y extrait le rootfs avec extract(target, progress)
+        
+        progress(done, total, member) est fourni à extract. Le manifeste, le
+        STARTUP et l'entrée bootconfig du slot sont écrits ensuite. Retourne
+        (True, résultat de extract) ou (False, message d'erreur).
+        """
+        # Dernier point d'annulation : le slot est effacé ensuite
+        self.report_progress(job, 2, "Formatting %s..." % slot_info['partition'], checkpoint=True)
+        self.slot_cache.invalidate(slot_info['partition'])
+        self.slot_cache.save()
+        self.health_cache.invalidate(slot_info['partition'])
+        self.remove_slot_manifest(slot_info)
+        success, message = self.wipe_slot_fast(slot_info)
+        if not success:
+            return False, message
+        
+        if not self.mount_slot(slot_info):
+            return False, "Impossible de monter la partition"
+        
+        try:
+            last = {'percent': -1}
+            
+            def progress(done, total, member):
+                percent = 5 + 85 * done // max(total, 1)
+                if percent != last['percent']:
+                    last['percent'] = percent
+                    self.report_progress(job, percent, "Extracting /%s..." % member)
+            
+            result = extract(slot_info['mount_point'], progress)
+            
+            self.report_progress(job, 91, "Syncing...")
+            os.sync()
+            
+            # Relit les fichiers écrits : sert de référence pour "Verify Checksums"
+            self.report_progress(job, 92, "Writing slot manifest...")
+            self.write_slot_manifest(slot_info)
+        finally:
+            self.force_unmount(slot_info['mount_point'])
+        
+        self.report_progress(job, 95, "Writing STARTUP and bootconfig entries...")
+        if not self.write_slot_boot_entry(slot_info):
+            return False, "Image extracted but boot entries could not be written"
+        
+        self.report_progress(job, 97, "Syncing kernel...")
+        success, message = self.sync_slot_kernel(slot_info)
+        if not success:
+            return False, "Image extracted but the kernel could not be copied:\n%s" % message
+        
+        self.report_progress(job, 100, "Done")
+        return True, result
+    
+    def get_backup_dir(self):
+        """Dossier des sauvegardes sur DREAMCARD ou le disque dur, None si aucun n'est monté"""
+        for mount_point, subdir in BACKUP_LOCATIONS:
+            if os.path.ismount(mount_point):
+                directory = os.path.join(mount_point, subdir)
+                try:
+                    os.makedirs(directory, exist_ok=True)
+                    return directory
+                except OSError as e:
+                    print("[BootManager] Cannot use backup directory %s: %s" % (directory, str(e)))
+        return None
+    
+    def find_slot_backups(self):
+        """Liste les sauvegardes de slots, les plus récentes d'abord"""
+        backups = []
+        for mount_point, subdir in BACKUP_LOCATIONS:
+            for path in glob.glob(os.path.join(mount_point, subdir, "*")):
+                if is_image_archive(path) and os.path.isfile(path):
+                    backups.append(path)
+        return sorted(backups, key=os.path.getmtime, reverse=True)
+    
+    def mount_fstype(self, path):
+        """Type du système de fichiers qui contient path (d'après /proc/mounts)"""
+        best, fstype = "", None
+        try:
+            with open("/proc/mounts", "r") as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 3 and (path == fields[1] or path.startswith(fields[1].rstrip('/') + '/')):
+                        if len(fields[1]) > len(best):
+                            best, fstype = fields[1], fields[2]
+        except OSError:
+            pass
+        return fstype
+    
+    @traced()
+    def backup_slot(self, slot_info, fmt='gz', job=None):
+        """Sauvegarde le contenu d'un slot, monté en lecture seule, dans une archive tar compressée"""
+        try:
+            self.report_progress(job, 0, "Preparing backup of %s..." % slot_info['name'], checkpoint=True)
+            directory = self.get_backup_dir()
+            if directory is None:
+                return False, "No DREAMCARD partition or HDD mounted for the backup"
             
-            # Monter la partition
-            if not os.path.exists(slot_info['mount_point']):
-                os.makedirs(slot_info['mount_point'], exist_ok=True)
+            image_name = re.sub(r'[^A-Za-z0-9._-]+', '-', slot_info.get('image_name') or "image").strip('-')
+            filename = "%s_%s_%s%s" % (os.path.basename(slot_info['partition']), image_name,
+                                       datetime.now().strftime("%Y%m%d-%H%M"), BACKUP_FORMATS[fmt]['extension'])
+            output_path = os.path.join(directory, filename)
+            # FAT32 : un fichier ne peut pas dépasser 4 Go
+            max_size = FAT32_MAX_FILE_SIZE if self.mount_fstype(directory) in ('vfat', 'msdos', 'fat') else None
             
-            mount_cmd = f"mount {slot_info['partition']} {slot_info['mount_point']} 2>/dev/null"
-            if os.system(mount_cmd) != 0:
+            self.report_progress(job, 2, "Mounting %s read-only..." % slot_info['partition'], checkpoint=True)
+            if not self.mount_slot(slot_info, readonly=True):
                 return False, "Impossible de monter la partition"
             
             try:
-                # Nettoyer complètement la partition (supprimer tous les fichiers et dossiers)
-                for item in os.listdir(slot_info['mount_point']):
-                    if item != 'lost+found':
-                        item_path = os.path.join(slot_info['mount_point'], item)
-                        try:
-                            if os.path.isdir(item_path):
-                                shutil.rmtree(item_path, ignore_errors=True)
-                            else:
-                                os.remove(item_path)
-                        except Exception as e:
-                            print(f"Warning: Cannot remove {item_path}: {e}")
+                state = {'percent': -1, 'start': time.time()}
                 
-                # Synchroniser
-                os.system("sync")
+                def progress(done, total, files):
+                    percent = 5 + 90 * min(done, total) // max(total, 1)
+                    if percent != state['percent']:
+                        state['percent'] = percent
+                        speed = done / max(time.time() - state['start'], 0.001) / (1024.0 * 1024.0)
+                        # Annulation possible à tout moment : le fichier .part est supprimé
+                        self.report_progress(job, percent, "%d files, %d MB (%.1f MB/s)" % (files, done >> 20, speed), checkpoint=True)
                 
-                # Reformater la partition pour s'assurer qu'elle est complètement vide
-                print("[BootManager] Reformatting partition to ensure clean state...")
-                mkfs_cmd = f"mkfs.ext4 -F {slot_info['partition']} 2>/dev/null"
-                reformat_result = os.system(mkfs_cmd)
-                
-                if reformat_result == 0:
-                    print("[BootManager] ✓ Partition reformatted successfully")
-                else:
-                    print("[BootManager] ⚠ Could not reformat partition, but files were deleted")
+                result = backup_tree(slot_info['mount_point'], output_path, fmt, progress=progress, max_size=max_size)
+            finally:
+                self.force_unmount(slot_info['mount_point'])
+            
+            self.report_progress(job, 100, "Done")
+            print("[BootManager] Backup of %s: %s" % (slot_info['partition'], output_path))
+            return True, "Backup created\n\n%s\n%d files, %d MB → %d MB (%.0f%%) in %.0f s (%.1f MB/s)" % (
+                output_path, result['files'], result['bytes_in'] >> 20, result['bytes_out'] >> 20,
+                100 * result['ratio'], result['elapsed'], result['throughput'] / (1024.0 * 1024.0))
+            
+        except JobCancelled:
+            raise
+        except BackupError as e:
+            error_msg = "Backup failed: %s" % str(e)
+            if max_size is not None:
+                # Limite FAT32 : proposer une destination ou une compression plus forte
+                error_msg += "\n\nDREAMCARD is FAT32 (4 GB per file): %s" % (
+                    "choose xz (smaller) or mount an HDD." if fmt != 'xz' else "mount an HDD for this backup.")
+            print("[BootManager]", error_msg)
+            return False, error_msg
+        except Exception as e:
+            error_msg = "Error during backup: %s" % str(e)
+            print("[BootManager]", error_msg)
+            return False, error_msg
+    
+    def mount_slot(self, slot_info, readonly=False):
+        """Monte un slot sur son point de montage avec les options de son profil (noatime sur SD)"""
+        self.force_unmount(slot_info['mount_point'])
+        options = mount_options(self.get_fs_profile(slot_info['partition'])[0], readonly)
+        return self.mount(slot_info['partition'], slot_info['mount_point'], options)
+    
+    def get_chunk_store(self):
+        """Magasin des sauvegardes incrémentales sur DREAMCARD ou le disque dur, None si aucun n'est monté"""
+        for mount_point, subdir in CHUNK_STORE_LOCATIONS:
+            if os.path.ismount(mount_point):
+                try:
+                    return ChunkStore(os.path.join(mount_point, subdir))
+                except OSError as e:
+                    print("[BootManager] Cannot use backup store on %s: %s" % (mount_point, str(e)))
+        return None
+    
+    def find_incremental_backups(self):
+        """Manifestes des sauvegardes incrémentales, les plus récents d'abord"""
+        store = self.get_chunk_store()
+        return store.list_backups() if store is not None else []
+    
+    @traced()
+    def incremental_backup_slot(self, slot_info, job=None):
+        """Sauvegarde incrémentale d'un slot : seuls les morceaux nouveaux sont écrits"""
+        try:
+            self.report_progress(job, 0, "Preparing backup of %s..." % slot_info['name'], checkpoint=True)
+            store = self.get_chunk_store()
+            if store is None:
+                return False, "No DREAMCARD partition or HDD mounted for the backup store"
+            
+            self.report_progress(job, 2, "Mounting %s read-only..." % slot_info['partition'], checkpoint=True)
+            if not self.mount_slot(slot_info, readonly=True):
+                return False, "Impossible de monter la partition"
+            
+            try:
+                state = {'percent': -1, 'start': time.time()}
                 
-                return True, "Image supprimée avec succès, slot maintenant vide"
+                def progress(done, total, files):
+                    percent = 5 + 90 * min(done, total) // max(total, 1)
+                    if percent != state['percent']:
+                        state['percent'] = percent
+                        speed = done / max(time.time() - state['start'], 0.001) / (1024.0 * 1024.0)
+                        # Annulation sans risque : le manifeste n'est écrit qu'à la fin
+                        self.report_progress(job, percent, "%d files, %d MB (%.1f MB/s)" % (files, done >> 20, speed), checkpoint=True)
                 
+                manifest = store_backup_tree(store, slot_info['mount_point'], os.path.basename(slot_info['partition']),
+                    {'name': slot_info['name'], 'image_name': slot_info.get('image_name')}, progress)
             finally:
-                # Toujours démonter
                 self.force_unmount(slot_info['mount_point'])
             
+            self.report_progress(job, 100, "Done")
+            print("[BootManager] Incremental backup of %s: %s" % (slot_info['partition'], manifest['path']))
+            return True, "Incremental backup created\n\n%d files, %d MB in %d chunks\n%d new chunks, %.1f MB written in %.0f s (%.1f MB/s)" % (
+                manifest['files'], manifest['size'] >> 20, len(manifest['chunks']), manifest['new_chunks'],
+                manifest['bytes_written'] / (1024.0 * 1024.0), manifest['elapsed'], manifest['throughput'] / (1024.0 * 1024.0))
+            
+        except JobCancelled:
+            raise
         except Exception as e:
-            error_msg = "Error during deletion: %s" % str(e)
+            error_msg = "Error during backup: %s" % str(e)
             print("[BootManager]", error_msg)
             return False, error_msg
     
-    def get_boot_images(self):
-        """Extrait les images disponibles depuis bootconfig.txt"""
-        images = []
-        
-        self.ensure_bootconfig()
+    @traced()
+    def restore_incremental_backup(self, manifest_file, slot_info, job=None):
+        """Restaure une sauvegarde incrémentale : les morceaux sont relus dans l'ordre et extraits en flux"""
+        try:
+            self.report_progress(job, 0, "Reading backup manifest...", checkpoint=True)
+            store = ChunkStore(os.path.dirname(os.path.dirname(manifest_file)))
+            manifest = store.load_manifest(manifest_file)
+            # Morceaux manquants : refuser avant d'effacer le slot
+            missing = sum(1 for digest, _size in manifest['chunks'] if digest not in store.known_chunks())
+            if missing:
+                raise StoreError("%d chunk(s) missing from the backup store" % missing)
+            
+            success, result = self.extract_to_slot(slot_info,
+                lambda target, progress: restore_tree(store, manifest, target, progress), job)
+            if not success:
+                return False, result
+            
+            return True, "%s\n%d files, %.1f MB in %.0f s (%.1f MB/s)" % (
+                os.path.basename(manifest_file), result['files'], result['bytes'] / (1024.0 * 1024.0),
+                result['elapsed'], result['throughput'] / (1024.0 * 1024.0))
+            
+        except JobCancelled:
+            raise
+        except StoreError as e:
+            error_msg = "Backup %s is damaged: %s" % (os.path.basename(manifest_file), str(e))
+            print("[BootManager]", error_msg)
+            return False, error_msg
+        except Exception as e:
+            error_msg = "Error during restore: %s" % str(e)
+            print("[BootManager]", error_msg)
+            return False, error_msg
+    
+    @traced()
+    def clean_incremental_backups(self, keep=STORE_KEEP_PER_SLOT, job=None):
+        """Garde les keep sauvegardes les plus récentes de chaque slot et supprime les morceaux orphelins"""
+        try:
+            self.report_progress(job, 0, "Reading backup manifests...", checkpoint=True)
+            store = self.get_chunk_store()
+            if store is None:
+                return False, "No DREAMCARD partition or HDD mounted for the backup store"
+            
+            removed_backups = store.prune(keep)
+            self.report_progress(job, 30, "Removing unreferenced chunks...")
+            removed_chunks, freed = store.garbage_collect()
+            self.report_progress(job, 100, "Done")
+            return True, "Incremental backups cleaned up\n\n%d old backup(s) removed (keeping %d per slot)\n%d chunk(s) removed, %.1f MB freed" % (
+                removed_backups, keep, removed_chunks, freed / (1024.0 * 1024.0))
+            
+        except JobCancelled:
+            raise
+        except Exception as e:
+            error_msg = "Error during clean up: %s" % str(e)
+            print("[BootManager]", error_msg)
+            return False, error_msg
+    
+    @traced()
+    def restore_slot_backup(self, backup_path, slot_info, job=None):
+        """Restaure une sauvegarde dans un slot
         
-        if not fileExists(self.bootconfig_path):
-            print("[BootManager] Bootconfig not found:", self.bootconfig_path)
-            return images
+        Le slot est reformaté comme par delete_slot_image (mode rapide) puis
+        l'archive, dont les membres compressés en parallèle sont lus à la suite,
+        y est extraite en flux.
+        """
+        return self.install_image_to_slot(backup_path, slot_info, job)
+    
+    def is_running_partition(self, partition):
+        """Vrai si partition est le rootfs de l'image en cours d'exécution"""
+        try:
+            return os.stat(partition).st_rdev == os.stat('/').st_dev
+        except OSError:
+            return False
+    
+    def run_fs_tool(self, argv):
+        """Lance e2fsck/resize2fs/tune2fs et retourne le code de sortie (-1 si impossible)"""
+        with span(argv[0]):
+            result = self.commands.run(argv, CLONE_TOOL_TIMEOUT)
+        if result.error:
+            print("[BootManager] %s failed: %s" % (argv[0], result.error))
+        return result.returncode
+    
+    @traced()
+    def clone_slot(self, source_info, target_info, job=None):
+        """Clone l'image d'un slot dans un autre
         
+        Seuls les blocs alloués de la source sont copiés, puis le système de
+        fichiers est agrandi à la taille de la cible. Si la cible est plus petite
+        que la source, ou si la source est l'image en cours d'exécution, les
+        fichiers sont copiés un par un dans la cible reformatée.
+        """
         try:
-            with open(self.bootconfig_path, 'r') as f:
-                content = f.read()
+            source, target = source_info['partition'], target_info['partition']
+            if source == target:
+                return False, "Source and target are the same slot"
+            if self.is_running_partition(target):
+                return False, "Cannot overwrite the running image"
+            
+            self.report_progress(job, 0, "Preparing %s..." % target, checkpoint=True)
+            self.force_unmount(target_info['mount_point'])
+            
+            result = None
+            if self.is_running_partition(source):
+                # Système de fichiers monté en écriture : une copie bloc à bloc serait incohérente
+                print("[BootManager] %s is the running image, using file copy" % source)
+            else:
+                self.force_unmount(source_info['mount_point'])
+                
+                last = {'percent': -1}
+                
+                def progress(done, total):
+                    percent = 5 + 80 * done // max(total, 1)
+                    if percent != last['percent']:
+                        last['percent'] = percent
+                        self.report_progress(job, percent, "Copying used blocks... %d / %d MB" % (done >> 20, total >> 20))
+                
+                # Dernier point d'annulation : le slot cible est écrasé ensuite
+                self.report_progress(job, 5, "Reading block bitmaps of %s..." % source, checkpoint=True)
+                self.slot_cache.invalidate(target)
+                self.slot_cache.save()
+                self.health_cache.invalidate(target)
+                self.remove_slot_manifest(target_info)
+                try:
+                    result = clone_used_blocks(source, target, progress)
+                except CloneError as e:
+                    print("[BootManager] Block clone not possible (%s), using file copy" % str(e))
+            
+            if result is None:
+                success, message = self.clone_slot_files(source_info, target_info, job)
+                if not success:
+                    return False, message
+            else:
+                self.report_progress(job, 86, "Checking filesystem...")
+                # e2fsck : 0 = propre, 1 = erreurs corrigées ; au-delà le clone est inutilisable
+                returncode = self.run_fs_tool(["e2fsck", "-f", "-y", target])
+                if returncode < 0 or returncode >= 4:
+                    return False, "Filesystem check failed on %s (e2fsck exit code %d)" % (target, returncode)
+                
+                self.report_progress(job, 90, "Resizing filesystem to the partition size...")
+                if self.run_fs_tool(["resize2fs", target]) != 0:
+                    print("[BootManager] ⚠ resize2fs failed, filesystem keeps the source size")
+                
+                # Deux slots ne doivent pas partager le même UUID
+                self.report_progress(job, 94, "Assigning a new filesystem UUID...")
+                if self.run_fs_tool(["tune2fs", "-U", "random", target]) != 0:
+                    print("[BootManager] ⚠ Could not change the UUID of %s" % target)
+                
+                # Le clone garde les paramètres de la source : profil du support cible appliqué
+                profile, erase_block = self.get_fs_profile(target)
+                for argv in tune_commands(target, profile, erase_block):
+                    if self.run_fs_tool(argv) != 0:
+                        print("[BootManager] ⚠ Could not apply the filesystem profile to %s" % target)
+                
+                message = "Used blocks copied: %d MB of %d MB in %.0f s (%.1f MB/s)" % (
+                    result['bytes'] >> 20, result['fs_bytes'] >> 20, result['elapsed'],
+                    result['throughput'] / (1024.0 * 1024.0))
+            
+            # Contenu identique : le manifeste de la source vaut pour la cible
+            if os.path.isfile(manifest_path(source, self.manifest_dir)):
+                shutil.copyfile(manifest_path(source, self.manifest_dir), manifest_path(target, self.manifest_dir))
+            self.slot_cache.invalidate(target)
+            self.slot_cache.save()
+            self.health_cache.invalidate(target)
             
-            pattern = r'\[([^\]]+)\]\s*\ncmd=([^\n]+)\s*\narg=([^\n]+)'
-            matches = re.findall(pattern, content)
+            self.report_progress(job, 97, "Writing STARTUP and bootconfig entries...")
+            if not self.write_slot_boot_entry(target_info):
+                return False, "Image cloned but boot entries could not be written"
             
-            for i, (name, cmd, arg) in enumerate(matches):
-                images.append({
-                    'name': name.strip(),
-                    'cmd': cmd.strip(),
-                    'arg': arg.strip(),
-                    'index': i,
-                    'source': 'bootconfig'
-                })
+            self.report_progress(job, 98, "Syncing kernel...")
+            success, kernel_message = self.sync_slot_kernel(target_info)
+            if not success:
+                return False, "Image cloned but the kernel could not be copied:\n%s" % kernel_message
             
-            print("[BootManager] Found %d boot images in bootconfig" % len(images))
+            self.report_progress(job, 100, "Done")
+            return True, "%s → %s\n%s" % (source_info['name'], target_info['name'], message)
             
+        except JobCancelled:
+            raise
         except Exception as e:
-            print("[BootManager] Error reading bootconfig:", str(e))
+            error_msg = "Error during clone: %s" % str(e)
+            print("[BootManager]", error_msg)
+            return False, error_msg
+    
+    @traced()
+    def clone_slot_files(self, source_info, target_info, job=None):
+        """Copie fichier par fichier (cp -a) de la source, montée en lecture seule, vers la cible reformatée"""
+        self.report_progress(job, 5, "Formatting %s..." % target_info['partition'], checkpoint=True)
+        self.slot_cache.invalidate(target_info['partition'])
+        self.slot_cache.save()
+        self.health_cache.invalidate(target_info['partition'])
+        self.remove_slot_manifest(target_info)
+        success, message = self.wipe_slot_fast(target_info)
+        if not success:
+            return False, message
         
-        return images
+        for slot, readonly in ((source_info, True), (target_info, False)):
+            if not self.mount_slot(slot, readonly):
+                self.force_unmount(source_info['mount_point'])
+                return False, "Impossible de monter la partition %s" % slot['partition']
+        
+        try:
+            source_stat = os.statvfs(source_info['mount_point'])
+            target_stat = os.statvfs(target_info['mount_point'])
+            used = (source_stat.f_blocks - source_stat.f_bfree) * source_stat.f_frsize
+            available = target_stat.f_bavail * target_stat.f_frsize
+            if used > available:
+                return False, "Not enough space in %s (%d MB needed, %d MB free)" % (
+                    target_info['name'], used >> 20, available >> 20)
+            
+            start_time = time.time()
+            command = self.commands.spawn(["cp", "-a", source_info['mount_point'] + "/.", target_info['mount_point']],
+                                          CLONE_TOOL_TIMEOUT)
+            # Progression d'après l'espace occupé dans la cible ; cp est tué si le job est annulé
+            try:
+                while command.poll() is None:
+                    current = os.statvfs(target_info['mount_point'])
+                    copied = (current.f_blocks - current.f_bfree - target_stat.f_blocks + target_stat.f_bfree) * current.f_frsize
+                    self.report_progress(job, 10 + 80 * min(copied, used) // max(used, 1),
+                                         "Copying files... %d / %d MB" % (copied >> 20, used >> 20), checkpoint=True)
+                    time.sleep(1)
+            except JobCancelled:
+                command.kill()
+                command.wait()
+                raise
+            result = command.wait()
+            if not result.ok:
+                return False, "File copy failed: %s" % result.error_message()
+            
+            self.report_progress(job, 92, "Syncing...")
+            os.sync()
+        finally:
+            self.force_unmount(target_info['mount_point'])
+            self.force_unmount(source_info['mount_point'])
+        
+        elapsed = time.time() - start_time
+        return True, "Files copied: %d MB in %.0f s (%.1f MB/s)" % (used >> 20, elapsed, used / max(elapsed, 0.001) / (1024.0 * 1024.0))
     
-    def get_current_boot(self):
-        """Détermine l'image de boot actuelle via le fichier STARTUP ou bootconfig"""
+    @traced()
+    def write_slot_manifest(self, slot_info, progress=None):
+        """Enregistre le manifeste sha256 du slot (monté sur son point de montage)"""
         try:
-            startup_files = [
-                "/boot/STARTUP",
-                "/data/STARTUP", 
-                "/tmp/STARTUP"
-            ]
+            manifest = build_manifest(slot_info['mount_point'], VERIFY_MAX_WORKERS, progress)
+            write_manifest(manifest_path(slot_info['partition'], self.manifest_dir), manifest)
+            print("[BootManager] Manifest of %s: %d files" % (slot_info['partition'], len(manifest)))
+            return True
+        except (OSError, VerifyError) as e:
+            print("[BootManager] ⚠ Could not write manifest of %s: %s" % (slot_info['partition'], str(e)))
+            return False
+    
+    def remove_slot_manifest(self, slot_info):
+        """Supprime le manifeste d'un slot effacé"""
+        try:
+            os.remove(manifest_path(slot_info['partition'], self.manifest_dir))
+        except OSError:
+            pass
+    
+    @traced()
+    def verify_image_archives(self, paths=None, job=None):
+        """Vérifie en parallèle des archives d'images contre leurs fichiers .md5/.sha256
+        
+        paths=None vérifie toutes les archives trouvées qui ont un fichier d'empreintes.
+        """
+        try:
+            self.report_progress(job, 0, "Looking for checksum files...", checkpoint=True)
+            if paths is None:
+                paths = [path for path in self.find_image_archives() if find_expected_checksums(path)]
+            if not paths:
+                return False, "No image archive with a .md5 or .sha256 checksum file found"
             
-            for startup_file in startup_files:
-                if fileExists(startup_file):
-                    try:
-                        with open(startup_file, 'r') as f:
-                            content = f.read()
-                        
-                        for line in content.split('\n'):
-                            if line and not line.startswith('#'):
-                                images = self.get_boot_images()
-                                for img in images:
-                                    if img['cmd'] in line:
-                                        return img['name']
-                        break
-                    except:
-                        continue
+            last = {'percent': -1}
             
-            if fileExists(self.bootconfig_path):
-                with open(self.bootconfig_path, 'r') as f:
-                    content = f.read()
+            def progress(done, total):
+                percent = 99 * done // max(total, 1)
+                if percent != last['percent']:
+                    last['percent'] = percent
+                    self.report_progress(job, percent, "Hashing... %d / %d MB" % (done >> 20, total >> 20), checkpoint=True)
+            
+            start_time = time.time()
+            results = verify_files(paths, VERIFY_MAX_WORKERS, progress)
+            elapsed = time.time() - start_time
+            self.report_progress(job, 100, "Done")
+            
+            lines = []
+            for result in results:
+                if result['ok'] is None:
+                    lines.append("? %s (no checksum file)\nMD5: %s\nSHA256: %s" % (
+                        os.path.basename(result['path']), result['digests']['md5'], result['digests']['sha256']))
+                else:
+                    lines.append("%s %s (%s)" % ("✓" if result['ok'] else "✗ MISMATCH", os.path.basename(result['path']),
+                        ", ".join(sorted(result['expected']))))
+            mb = sum(result['size'] for result in results) / (1024.0 * 1024.0)
+            lines.append("\n%d file(s), %.1f MB in %.0f s (%.1f MB/s)" % (len(results), mb, elapsed, mb / max(elapsed, 0.001)))
+            return all(result['ok'] is not False for result in results), "\n".join(lines)
+            
+        except JobCancelled:
+            raise
+        except Exception as e:
+            error_msg = "Error during verification: %s" % str(e)
+            print("[BootManager]", error_msg)
+            return False, error_msg
+    
+    @traced()
+    def verify_slot(self, slot_info, job=None):
+        """Compare le contenu d'un slot au manifeste enregistré lors de l'installation"""
+        try:
+            self.report_progress(job, 0, "Reading manifest...", checkpoint=True)
+            path = manifest_path(slot_info['partition'], self.manifest_dir)
+            if not os.path.isfile(path):
+                return False, "No manifest for %s.\n\nManifests are created when an image is installed with Dream Boot Manager." % slot_info['name']
+            manifest = read_manifest(path)
+            
+            self.report_progress(job, 2, "Mounting %s..." % slot_info['partition'], checkpoint=True)
+            if not self.mount(slot_info['partition'], slot_info['mount_point'], "ro"):
+                return False, "Impossible de monter la partition"
+            
+            try:
+                last = {'percent': -1}
+                
+                def progress(done, total):
+                    percent = 5 + 94 * done // max(total, 1)
+                    if percent != last['percent']:
+                        last['percent'] = percent
+                        self.report_progress(job, percent, "Hashing... %d / %d MB" % (done >> 20, total >> 20), checkpoint=True)
                 
-                default_match = re.search(r'default=(\d+)', content)
-                if default_match:
-                    default_index = int(default_match.group(1))
-                    images = self.get_boot_images()
-                    if 0 <= default_index < len(images):
-                        return images[default_index]['name']
+                result = check_manifest(slot_info['mount_point'], manifest, VERIFY_MAX_WORKERS, progress)
+            finally:
+                self.force_unmount(slot_info['mount_point'])
             
-            return "Unknown"
+            self.report_progress(job, 100, "Done")
+            lines = ["%s: %d / %d files OK (%.0f s)" % (slot_info['name'], result['ok'], result['checked'] + len(result['missing']), result['elapsed'])]
+            for label, key in (("Modified", 'modified'), ("Missing", 'missing'), ("Added", 'added')):
+                names = result[key]
+                if names:
+                    lines.append("%s (%d): %s%s" % (label, len(names), ", ".join(names[:5]), " ..." if len(names) > 5 else ""))
+            return not result['modified'] and not result['missing'], "\n".join(lines)
             
+        except JobCancelled:
+            raise
+        except Exception as e:
+            error_msg = "Error during verification: %s" % str(e)
+            print("[BootManager]", error_msg)
+            return False, error_msg
+    
+    def write_slot_boot_entry(self, slot_info):
+        """S'assure que le STARTUP et l'entrée bootconfig du slot existent"""
+        if not self.create_all_startup_files():
+            return False
+        
+        config = self.load_bootconfig()
+        if config is not None and config.find_by_root(slot_info['partition']) is not None:
+            return True
+        return self.ensure_bootconfig_updated()
+    
+    @traced()
+    def sync_slot_kernel(self, slot_info):
+        """Copie /boot/kernel.img du slot vers DREAMCARD si son entrée bootconfig le charge avec fatload
+        
+        Retourne (success, message). Les slots dont le noyau est lu dans leur
+        propre rootfs (ext4load) n'ont rien à copier.
+        """
+        config = self.load_bootconfig()
+        section = config.find_by_root(slot_info['partition']) if config is not None else None
+        kernel_name = fat_kernel_name(section.cmd) if section is not None else None
+        if kernel_name is None:
+            return True, "Kernel loaded from the slot itself"
+        
+        # DREAMCARD monté temporairement s'il ne l'est pas déjà
+        mounted = os.path.ismount(DREAMCARD_MOUNT)
+        if not mounted:
+            if not self.mount(DREAMCARD_PARTITION, DREAMCARD_MOUNT):
+                return False, "Cannot mount DREAMCARD partition %s" % DREAMCARD_PARTITION
+        
+        try:
+            data = read_slot_kernel(slot_info['partition'])
+            target = os.path.join(DREAMCARD_MOUNT, kernel_name.lstrip('/'))
+            if sync_kernel(data, target):
+                message = "Kernel copied to %s (%d KB)" % (target, len(data) >> 10)
+            else:
+                message = "Kernel %s already up to date" % target
+            print("[BootManager]", message)
+            return True, message
+        except KernelSyncError as e:
+            print("[BootManager] ⚠", str(e))
+            return False, str(e)
+        finally:
+            if not mounted:
+                self.force_unmount(DREAMCARD_MOUNT)
+    
+    @traced()
+    def load_bootconfig(self):
+        """Retourne le modèle BootConfig analysé (mis en cache sur mtime/taille)"""
+        self.ensure_bootconfig()
+        
+        if not fileExists(self.bootconfig_path):
+            print("[BootManager] Bootconfig not found:", self.bootconfig_path)
+            return None
+        
+        try:
+            return load_bootconfig(self.bootconfig_path)
         except Exception as e:
-            print("[BootManager] Error detecting current boot:", str(e))
-            return "Unknown"
+            print("[BootManager] Error reading bootconfig:", str(e))
+            return None
+    
+    @traced()
+    def get_boot_images(self):
+        """Extrait les images disponibles depuis bootconfig.txt"""
+        config = self.load_bootconfig()
+        if config is None:
+            return []
+        
+        images = config.image_list()
+        print("[BootManager] Found %d boot images in bootconfig" % len(images))
+        return images
+    
+    def get_startup_paths(self):
+        """Emplacements du fichier STARTUP, par ordre de priorité"""
+        return [os.path.join(BOOT_DIR, "STARTUP"), os.path.join(DATA_DIR, "STARTUP"), "/tmp/STARTUP"]
+    
+    def get_running_root(self):
+        """Périphérique du rootfs en cours d'exécution, lu une fois par session
+        
+        root= de /proc/cmdline s'il désigne un chemin de périphérique ; sinon (/dev/root,
+        UUID=...) le slot dont la partition porte le système de fichiers monté sur /.
+        """
+        if self.running_root is None:
+            root = None
+            try:
+                with open(CMDLINE_PATH, 'r') as f:
+                    match = ROOT_RE.search(f.read())
+                if match and '=' not in match.group(1) and match.group(1) != '/dev/root':
+                    root = match.group(1)
+            except OSError as e:
+                print("[BootManager] Cannot read %s: %s" % (CMDLINE_PATH, str(e)))
+            if root is None:
+                for slot in self.get_slot_registry():
+                    if self.is_running_partition(slot.partition):
+                        root = slot.partition
+                        break
+            self.running_root = root or ""
+        return self.running_root or None
+    
+    def get_current_boot_section(self):
+        """Entrée bootconfig de l'image en cours d'exécution (index par root=), None si inconnue"""
+        root = self.get_running_root()
+        if root is None:
+            return None
+        config = self.load_bootconfig()
+        return config.find_by_root(root) if config is not None else None
+    
+    @traced()
+    def get_current_boot(self):
+        """Nom de l'image en cours d'exécution, "Unknown" si son root= n'est dans aucune entrée"""
+        section = self.get_current_boot_section()
+        return section.name if section is not None else "Unknown"
     
+    @traced()
     def set_boot_image(self, image_info):
         """Définit l'image de boot par défaut en modifiant bootconfig.txt et STARTUP"""
         try:
@@ -821,16 +2446,12 @@ arg=${bootargs} root=/dev/mmcblk1p5 rootfstype=ext4 kernel=/kernel5.img logo=osd
         """Définit l'image de boot via bootconfig.txt"""
         try:
             if fileExists(self.bootconfig_path):
-                with open(self.bootconfig_path, 'r') as f:
-                    content = f.read()
+                # Copie du modèle en cache, modifiée puis réécrite à l'identique hors default=
+                config = BootConfig(load_bootconfig(self.bootconfig_path).to_text())
+                config.set_header('default', image_info['index'])
                 
-                new_content = re.sub(r'default=\d+', 'default=%d' % image_info['index'], content)
-                
-                if 'default=' not in new_content:
-                    new_content = 'default=%d\n%s' % (image_info['index'], new_content)
-                
-                with open(self.bootconfig_path, 'w') as f:
-                    f.write(new_content)
+                if write_if_changed(self.bootconfig_path, config.to_text()):
+                    invalidate_bootconfig(self.bootconfig_path)
                 
                 print("[BootManager] ✓ Bootconfig updated with default=%d" % image_info['index'])
                 return True
@@ -839,21 +2460,15 @@ arg=${bootargs} root=/dev/mmcblk1p5 rootfstype=ext4 kernel=/kernel5.img logo=osd
         
         return False
     
+    @traced("write_startup")
     def set_boot_via_startup(self, image_info):
         """Définit l'image de boot via le fichier STARTUP"""
         try:
             uboot_cmd = "%s %s" % (image_info['cmd'], image_info['arg'])
             
-            startup_files = [
-                "/boot/STARTUP",
-                "/data/STARTUP",
-                "/tmp/STARTUP"
-            ]
-            
-            for startup_file in startup_files:
+            for startup_file in self.get_startup_paths():
                 try:
-                    with open(startup_file, 'w') as f:
-                        f.write(uboot_cmd)
+                    write_if_changed(startup_file, uboot_cmd)
                     print("[BootManager] ✓ %s updated" % startup_file)
                     return True
                 except:
@@ -864,6 +2479,17 @@ arg=${bootargs} root=/dev/mmcblk1p5 rootfstype=ext4 kernel=/kernel5.img logo=osd
         return False
 
 
+_boot_manager = None
+
+
+def get_boot_manager():
+    """Retourne l'instance BootManager partagée pour toute la session"""
+    global _boot_manager
+    if _boot_manager is None:
+        _boot_manager = BootManager()
+    return _boot_manager
+
+
 def main(session, **kwargs):
     session.open(DreamBootManagerScreen)
 
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Plan de partitionnement de la carte SD selon sa capacité
+
+Fonctions pures : à partir du nombre de secteurs de la carte et du nombre
+ou de la taille de slots souhaités, calcule un plan validé (partition 1
+FAT32 DREAMCARD puis les slots rootfs ext4), aligné sur le MiB, sans rien
+écrire. Le plan est affiché pour confirmation puis passé tel quel à
+partition_sd_card.
+"""
+from .gpt import GPTError, GPT_TYPE_BASIC_DATA, GPT_TYPE_LINUX_FS, SECTOR_SIZE, validate_layout
+from .slots import SD_DEFAULT_SLOTS, SD_FIRST_SLOT_PARTITION, sd_slot_number
+
+MIB_SECTORS = 1024 * 1024 // SECTOR_SIZE
+
+SD_SLOT_SIZE_MB = 1740
+SD_MIN_SLOT_SIZE_MB = 1024
+SD_MIN_FAT_SIZE_MB = 32
+SD_MAX_SLOTS = 16
+# 1 MiB réservé en tête (GPT primaire) et en fin de disque (GPT de secours)
+SD_RESERVED_MB = 1
+
+# Propositions de l'écran de partitionnement
+SD_SLOT_COUNT_CHOICES = (2, 4, 6, 8, 12, 16)
+SD_LARGE_SLOT_SIZE_MB = 4096
+
+
+class LayoutError(Exception):
+    """Plan impossible pour cette carte (trop petite, paramètres invalides)"""
+    pass
+
+
+def plan_sd_layout(total_sectors, slot_count=None, slot_size_mb=None,
+                   fat_min_mb=SD_MIN_FAT_SIZE_MB, align_mb=1):
+    """Calcule le plan de partitionnement d'une carte de total_sectors secteurs
+
+    slot_count seul : slots de SD_SLOT_SIZE_MB, réduits si la carte est trop
+    petite. slot_size_mb seul : autant de slots que possible (au plus
+    SD_MAX_SLOTS). Aucun des deux : SD_DEFAULT_SLOTS slots de SD_SLOT_SIZE_MB.
+    L'espace restant va à la partition FAT32. Retourne un dict
+    {total_sectors, card_mb, fat_mb, slot_count, slot_size_mb, align_mb,
+    partitions} où partitions est la liste attendue par gpt.write_gpt
+    (complétée de number, size_mb et role). Lève LayoutError.
+    """
+    if align_mb < 1:
+        raise LayoutError("Invalid alignment: %d MB" % align_mb)
+    card_mb = total_sectors // MIB_SECTORS
+    # Premier MiB aligné après la zone réservée, dernier MiB aligné avant la GPT de secours
+    first_mb = -(-SD_RESERVED_MB // align_mb) * align_mb
+    last_mb = (card_mb - SD_RESERVED_MB) // align_mb * align_mb
+    usable_mb = last_mb - first_mb
+
+    def align_down(size_mb):
+        return size_mb // align_mb * align_mb
+
+    if slot_count is None and slot_size_mb is None:
+        slot_count = SD_DEFAULT_SLOTS
+    if slot_count is None:
+        slot_size_mb = align_down(slot_size_mb)
+        slot_count = min(SD_MAX_SLOTS, (usable_mb - fat_min_mb) // max(slot_size_mb, 1))
+        if slot_count < 1:
+            raise LayoutError("SD card too small (%d MB) for one slot of %d MB" % (card_mb, slot_size_mb))
+    elif slot_size_mb is None:
+        slot_size_mb = align_down(min(SD_SLOT_SIZE_MB, (usable_mb - fat_min_mb) // max(slot_count, 1)))
+    else:
+        slot_size_mb = align_down(slot_size_mb)
+
+    if not 1 <= slot_count <= SD_MAX_SLOTS:
+        raise LayoutError("Slot count must be between 1 and %d" % SD_MAX_SLOTS)
+    if slot_size_mb < SD_MIN_SLOT_SIZE_MB:
+        raise LayoutError("SD card too small (%d MB) for %d slots: at least %d MB needed" % (
+            card_mb, slot_count, 2 * SD_RESERVED_MB + fat_min_mb + slot_count * SD_MIN_SLOT_SIZE_MB))
+
+    fat_mb = usable_mb - slot_count * slot_size_mb
+    if fat_mb < fat_min_mb:
+        raise LayoutError("SD card too small (%d MB) for %d slots of %d MB: at least %d MB needed" % (
+            card_mb, slot_count, slot_size_mb, 2 * SD_RESERVED_MB + fat_min_mb + slot_count * slot_size_mb))
+
+    partitions = [{'number': 1, 'start': first_mb * MIB_SECTORS, 'end': (first_mb + fat_mb) * MIB_SECTORS - 1,
+                   'size_mb': fat_mb, 'type': GPT_TYPE_BASIC_DATA, 'name': 'DREAMCARD', 'role': 'fat'}]
+    start_mb = first_mb + fat_mb
+    for number in range(SD_FIRST_SLOT_PARTITION, SD_FIRST_SLOT_PARTITION + slot_count):
+        partitions.append({'number': number, 'start': start_mb * MIB_SECTORS,
+                           'end': (start_mb + slot_size_mb) * MIB_SECTORS - 1, 'size_mb': slot_size_mb,
+                           'type': GPT_TYPE_LINUX_FS, 'name': 'dreambox-rootfs', 'role': 'rootfs'})
+        start_mb += slot_size_mb
+
+    # Chaque partition doit commencer et finir sur un bloc d'effacement
+    align_sectors = align_mb * MIB_SECTORS
+    for part in partitions:
+        if part['start'] % align_sectors or (part['end'] + 1) % align_sectors:
+            raise LayoutError("Partition %d is not aligned on %d MB" % (part['number'], align_mb))
+
+    try:
+        validate_layout(partitions, total_sectors)
+    except GPTError as e:
+        raise LayoutError("Invalid layout: %s" % str(e))
+
+    return {
+        'total_sectors': total_sectors,
+        'card_mb': card_mb,
+        'fat_mb': fat_mb,
+        'slot_count': slot_count,
+        'slot_size_mb': slot_size_mb,
+        'align_mb': align_mb,
+        'partitions': partitions,
+    }
+
+
+def layout_choices(total_sectors, align_mb=1):
+    """Plans proposés pour cette carte : [(libellé, plan)], le schéma par défaut en premier"""
+    candidates = [(count, None) for count in SD_SLOT_COUNT_CHOICES]
+    candidates += [(count, SD_LARGE_SLOT_SIZE_MB) for count in (4, 8)]
+    choices = []
+    seen = set()
+    for slot_count, slot_size_mb in candidates:
+        try:
+            plan = plan_sd_layout(total_sectors, slot_count, slot_size_mb, align_mb=align_mb)
+        except LayoutError:
+            continue
+        key = (plan['slot_count'], plan['slot_size_mb'])
+        if key in seen:
+            continue
+        seen.add(key)
+        label = "%d slots x %d MB, DREAMCARD %d MB" % (plan['slot_count'], plan['slot_size_mb'], plan['fat_mb'])
+        if slot_count == SD_DEFAULT_SLOTS and slot_size_mb is None:
+            choices.insert(0, (label + " (default)", plan))
+        else:
+            choices.append((label, plan))
+    return choices
+
+
+def describe_plan(plan):
+    """Texte de prévisualisation du plan"""
+    lines = ["SD card: %d MB" % plan['card_mb']]
+    for part in plan['partitions']:
+        if part['role'] == 'fat':
+            lines.append("• Partition %d: %d MB FAT32 (DREAMCARD)" % (part['number'], part['size_mb']))
+        else:
+            lines.append("• Partition %d: %d MB EXT4 (Slot %d)" % (
+                part['number'], part['size_mb'], sd_slot_number(part['number'])))
+    return "\n".join(lines)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Cache persistant des métadonnées de slots
+
+Chaque entrée (image_exists, image_name) est associée à une signature
+obtenue à bas coût depuis le superblock ext4 : UUID, date de dernière
+écriture, compteur d'écritures, date de montage, plus la taille du
+périphérique. Tant que la signature ne change pas, le slot n'est pas
+re-sondé.
+"""
+import os
+import re
+import json
+import threading
+
+from .ext4 import read_superblock, Ext4Error
+from .fileutils import write_if_changed
+
+# Fichier du cache dans DATA_DIR (/data sur le récepteur)
+SLOT_CACHE_NAME = "dreambootmanager_slots.json"
+SLOT_CACHE_VERSION = 1
+
+
+def device_size(device):
+    """Taille en octets d'un périphérique bloc ou d'une image fichier"""
+    with open(device, 'rb') as f:
+        return f.seek(0, os.SEEK_END)
+
+
+def slot_signature(partition):
+    """Signature de changement d'une partition, None si elle n'est pas ext4"""
+    try:
+        sb = read_superblock(partition)
+        return [sb['uuid'], sb['wtime'], sb['mtime'], sb['kbytes_written'], device_size(partition)]
+    except (Ext4Error, OSError):
+        return None
+
+
+class SlotCache:
+    """Cache JSON des résultats de sondage, indexé par partition"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        # Une seule écriture à la fois : l'instantané le plus récent arrive en dernier
+        self.save_lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == SLOT_CACHE_VERSION:
+                self.entries = data.get('slots', {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """Écrit le cache sur disque s'il a été modifié"""
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty:
+                    return True
+                data = json.dumps({'version': SLOT_CACHE_VERSION, 'slots': self.entries}, indent=1, sort_keys=True)
+                self.dirty = False
+            try:
+                write_if_changed(self.path, data)
+                return True
+            except Exception as e:
+                print("[BootManager] Error saving slot cache:", str(e))
+                # Nouvelle tentative au prochain save
+                with self.lock:
+                    self.dirty = True
+                return False
+
+    def get(self, partition, signature):
+        """Retourne (image_exists, image_name) si la signature est inchangée"""
+        if signature is None:
+            return None
+        with self.lock:
+            entry = self.entries.get(partition)
+        if entry and entry.get('signature') == signature:
+            return entry['image_exists'], entry['image_name']
+        return None
+
+    def put(self, partition, signature, image_exists, image_name):
+        if signature is None:
+            return
+        with self.lock:
+            self.entries[partition] = {
+                'signature': signature,
+                'image_exists': image_exists,
+                'image_name': image_name,
+            }
+            self.dirty = True
+
+    def invalidate(self, partition):
+        """Supprime l'entrée d'une partition"""
+        with self.lock:
+            if self.entries.pop(partition, None) is not None:
+                self.dirty = True
+
+    def invalidate_device(self, device):
+        """Supprime les entrées de toutes les partitions d'un disque"""
+        with self.lock:
+            pattern = re.compile(re.escape(device) + r'p?\d+$')
+            for partition in [p for p in self.entries if pattern.match(p)]:
+                del self.entries[partition]
+                self.dirty = True
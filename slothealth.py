@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Tableau de bord des slots : espace occupé, inodes et santé ext4
+
+Les champs viennent directement du superblock, sans montage : blocs et
+inodes libres, compteurs de montages et d'erreurs, dates du dernier
+montage et de la dernière erreur, état propre/erreurs. Sur une partition
+montée (rootfs en cours, slot monté par une autre opération) les compteurs
+libres du superblock ne sont pas tenus à jour : statvfs du point de
+montage les remplace. Chaque slot est lu par un worker, les résultats
+arrivent dans une queue au fil de l'eau et le dernier état connu reste en
+cache pour un affichage immédiat à la réouverture.
+"""
+import os
+import re
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .ext4 import Ext4Error, read_superblock
+from .tracing import span
+
+# s_state : démonté proprement / erreurs détectées
+EXT4_STATE_VALID = 0x0001
+EXT4_STATE_ERROR = 0x0002
+
+HEALTH_MAX_WORKERS = 4
+USAGE_WARNING_PERCENT = 90
+
+
+def read_slot_health(partition, mount_point=None):
+    """Espace, inodes et compteurs ext4 d'une partition ; mount_point si elle est montée"""
+    health = {
+        'partition': partition,
+        'mount_point': mount_point,
+        'fstype': None,
+        'size': None,
+        'used': None,
+        'available': None,
+        'inodes_total': None,
+        'inodes_used': None,
+        'mount_count': None,
+        'max_mount_count': None,
+        'last_mount': None,
+        'last_write': None,
+        'last_check': None,
+        'error_count': None,
+        'last_error': None,
+        'clean': None,
+        'has_errors': False,
+        'source': None,
+        'read_at': time.time(),
+        'error': None,
+    }
+    try:
+        sb = read_superblock(partition)
+    except Ext4Error:
+        sb = None
+    except OSError as e:
+        health['error'] = str(e)
+        return health
+
+    if sb is not None:
+        block_size = sb['block_size']
+        health.update({
+            'fstype': 'ext4',
+            'size': sb['blocks_count'] * block_size,
+            'used': (sb['blocks_count'] - sb['free_blocks_count']) * block_size,
+            # Blocs réservés à root exclus, comme la colonne "Available" de df
+            'available': max(0, sb['free_blocks_count'] - sb['reserved_blocks_count']) * block_size,
+            'inodes_total': sb['inodes_count'],
+            'inodes_used': sb['inodes_count'] - sb['free_inodes_count'],
+            'mount_count': sb['mnt_count'],
+            'max_mount_count': sb['max_mnt_count'],
+            'last_mount': sb['mtime'] or None,
+            'last_write': sb['wtime'] or None,
+            'last_check': sb['lastcheck'] or None,
+            'error_count': sb['error_count'],
+            'last_error': sb['last_error_time'] or None,
+            # Le drapeau "propre" est retiré tant que le système de fichiers est monté
+            'clean': None if mount_point else bool(sb['state'] & EXT4_STATE_VALID),
+            'has_errors': bool(sb['state'] & EXT4_STATE_ERROR) or sb['error_count'] > 0,
+            'source': 'superblock',
+        })
+
+    if mount_point:
+        try:
+            st = os.statvfs(mount_point)
+            health.update({
+                'size': st.f_blocks * st.f_frsize,
+                'used': (st.f_blocks - st.f_bfree) * st.f_frsize,
+                'available': st.f_bavail * st.f_frsize,
+                'inodes_total': st.f_files,
+                'inodes_used': st.f_files - st.f_ffree,
+                'source': 'statvfs',
+            })
+        except OSError as e:
+            health['error'] = str(e)
+    return health
+
+
+def collect_health(targets, cache=None, max_workers=HEALTH_MAX_WORKERS):
+    """Lit en parallèle chaque (partition, point de montage ou None) de targets
+
+    Retourne une queue qui reçoit (index, health) dès qu'une partition est lue ;
+    le cache éventuel est mis à jour au passage.
+    """
+    results = queue.Queue()
+
+    def read(index, partition, mount_point):
+        with span("read_health", partition=partition):
+            try:
+                health = read_slot_health(partition, mount_point)
+            except Exception as e:
+                health = {'partition': partition, 'error': str(e), 'read_at': time.time()}
+        if cache is not None:
+            cache.put(health)
+        results.put((index, health))
+
+    if targets:
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets))))
+        for index, (partition, mount_point) in enumerate(targets):
+            executor.submit(read, index, partition, mount_point)
+        executor.shutdown(wait=False)
+    return results
+
+
+class HealthCache:
+    """Dernier état lu de chaque partition (mémoire, durée de la session)"""
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, partition):
+        with self.lock:
+            return self.entries.get(partition)
+
+    def put(self, health):
+        with self.lock:
+            self.entries[health['partition']] = health
+
+    def invalidate(self, partition):
+        with self.lock:
+            self.entries.pop(partition, None)
+
+    def invalidate_device(self, device):
+        """Oublie toutes les partitions d'un disque (après repartitionnement)"""
+        with self.lock:
+            pattern = re.compile(re.escape(device) + r'p?\d+$')
+            for partition in [p for p in self.entries if pattern.match(p)]:
+                del self.entries[partition]
+
+
+def format_size(size):
+    if size >= 1024 ** 3:
+        return "%.1f GB" % (size / float(1024 ** 3))
+    return "%d MB" % (size >> 20)
+
+
+def format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp)) if timestamp else "never"
+
+
+def usage_percent(used, total):
+    return 100 * used // total if total else 0
+
+
+def health_warnings(health):
+    """Points d'attention : erreurs ext4, vérification due, slot presque plein"""
+    warnings = []
+    if health.get('has_errors'):
+        warnings.append("filesystem errors")
+    max_mounts = health.get('max_mount_count')
+    if max_mounts and max_mounts > 0 and health.get('mount_count', 0) >= max_mounts:
+        warnings.append("check due")
+    if health.get('size') and usage_percent(health['used'], health['size']) >= USAGE_WARNING_PERCENT:
+        warnings.append("almost full")
+    return warnings
+
+
+def describe_health(health):
+    """Deux lignes de résumé pour le tableau de bord"""
+    if health.get('error'):
+        return ["✗ %s" % health['error'], ""]
+    if health.get('size') is None:
+        return ["Not an ext4 filesystem", ""]
+
+    usage = "Used %s / %s (%d%%)   │   Free %s" % (
+        format_size(health['used']), format_size(health['size']),
+        usage_percent(health['used'], health['size']), format_size(health['available']))
+    if health.get('inodes_total'):
+        usage += "   │   Inodes %d%%" % usage_percent(health['inodes_used'], health['inodes_total'])
+
+    if health.get('fstype') != 'ext4':
+        return [usage, "Mounted on %s" % health['mount_point']]
+    status = [("✗ " + ", ".join(health_warnings(health))) if health_warnings(health) else "✓ OK"]
+    status.append("Mounts %d" % health['mount_count'])
+    status.append("Errors %d" % health['error_count'])
+    status.append("Last mount %s" % format_time(health['last_mount']))
+    if health['mount_point']:
+        status.append("mounted on %s" % health['mount_point'])
+    return [usage, "   │   ".join(status)]
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Registre des slots multiboot
+
+Une seule table décrit chaque slot (numéro, partition, point de montage,
+fichier STARTUP, section et commande bootconfig). Elle est construite à
+partir de l'inventaire sysfs : les slots eMMC sont fixes, les slots SD
+suivent les partitions rootfs réellement présentes sur la carte (au moins
+les quatre du schéma par défaut). bootconfig.txt, les fichiers STARTUP et
+les listes des écrans sont tous générés depuis ce registre.
+"""
+import os
+
+from .gpt import partition_path
+
+EMMC_DEVICE = "/dev/mmcblk0"
+SD_DEVICE = "/dev/mmcblk1"
+# Points de montage des slots : /media/<partition>
+MEDIA_DIR = "/media"
+
+# Partitions rootfs de l'eMMC (schéma d'usine)
+EMMC_SLOT_PARTITIONS = (5, 6, 7, 8)
+# Partition 1 de la SD : FAT32 DREAMCARD, les rootfs commencent en 2
+SD_FIRST_SLOT_PARTITION = 2
+SD_DEFAULT_SLOTS = 4
+
+# Numéros de périphériques mmc vus par U-Boot (ordre inverse de Linux)
+UBOOT_EMMC = 1
+UBOOT_SD = 0
+UBOOT_LOAD_ADDRESS = "1080000"
+
+BOOT_ARGS = ("logo=osd0,loaded,0x7f800000 vout=1080p50hz,enable hdmimode=1080p50hz "
+             "fb_width=1280 fb_height=720 panel_type=lcd_4")
+
+BOOTCONFIG_HEADER = """default=0
+details=0
+timeout=10
+fb_pos=100,400
+fb_size=1080,300
+"""
+
+
+class Slot:
+    """Slot multiboot : rootfs ext4 et son entrée de démarrage"""
+
+    def __init__(self, number, partition, storage, partition_number, media_dir=MEDIA_DIR):
+        self.number = number
+        self.partition = partition
+        self.storage = storage
+        self.partition_number = partition_number
+        self.mount_point = os.path.join(media_dir, os.path.basename(partition))
+        self.startup_file = "STARTUP_%d" % number
+
+    @property
+    def name(self):
+        """Nom affiché dans les écrans"""
+        if self.storage == 'emmc':
+            return "Slot %d (Multiboot %d)" % (self.number, self.number)
+        return "SDcard Slot %d" % self.number
+
+    @property
+    def section(self):
+        """Nom de la section bootconfig.txt"""
+        if self.storage == 'emmc':
+            return "Dreambox Image" if self.number == 1 else "Dreambox Image %d" % (self.number - 1)
+        return "SDcard Slot %d" % self.number
+
+    @property
+    def kernel(self):
+        """Noyau chargé par U-Boot : dans le rootfs (eMMC) ou sur DREAMCARD (SD)"""
+        if self.storage == 'emmc':
+            return "/boot/kernel.img"
+        return "/kernel%d.img" % self.partition_number
+
+    @property
+    def cmd(self):
+        if self.storage == 'emmc':
+            return "ext4load mmc %d:%d %s %s;bootm;" % (UBOOT_EMMC, self.partition_number, UBOOT_LOAD_ADDRESS, self.kernel)
+        return "fatload mmc %d:1 %s %s;bootm;" % (UBOOT_SD, UBOOT_LOAD_ADDRESS, self.kernel)
+
+    @property
+    def startup(self):
+        """Contenu du fichier STARTUP"""
+        return "root=%s rootfstype=ext4 kernel=%s\n" % (self.partition, self.kernel)
+
+    @property
+    def arg(self):
+        return "${bootargs} %s %s" % (self.startup.strip(), BOOT_ARGS)
+
+    def bootconfig_section(self):
+        return "[%s]\ncmd=%s\narg=%s\n" % (self.section, self.cmd, self.arg)
+
+    def as_dict(self):
+        """Format dict utilisé par les écrans et les opérations sur les slots"""
+        return {
+            'number': self.number,
+            'name': self.name,
+            'partition': self.partition,
+            'mount_point': self.mount_point,
+            'startup_file': self.startup_file,
+        }
+
+    def __repr__(self):
+        return "<Slot %d %s>" % (self.number, self.partition)
+
+
+class SlotRegistry:
+    """Slots indexés par numéro, partition et point de montage"""
+
+    def __init__(self, slots, inventory=None):
+        self.slots = list(slots)
+        self.inventory = inventory
+        self.by_number = dict((slot.number, slot) for slot in self.slots)
+        self.by_partition = dict((slot.partition, slot) for slot in self.slots)
+        self.by_mount_point = dict((slot.mount_point, slot) for slot in self.slots)
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def slot(self, number):
+        return self.by_number.get(number)
+
+    def find_by_partition(self, partition):
+        return self.by_partition.get(partition)
+
+    def find_by_mount_point(self, mount_point):
+        return self.by_mount_point.get(mount_point)
+
+    def sections(self):
+        """Noms des sections bootconfig attendues"""
+        return [slot.section for slot in self.slots]
+
+    def bootconfig_text(self, header=BOOTCONFIG_HEADER):
+        """bootconfig.txt complet, une section par slot"""
+        return header + "".join("\n" + slot.bootconfig_section() for slot in self.slots)
+
+    def startup_contents(self):
+        """Contenu de chaque fichier STARTUP : {STARTUP_N: texte}"""
+        return dict((slot.startup_file, slot.startup) for slot in self.slots)
+
+
+def sd_slot_number(partition_number):
+    """Numéro de slot d'une partition rootfs de la SD : stable, il ne dépend que de la partition"""
+    return len(EMMC_SLOT_PARTITIONS) + partition_number - SD_FIRST_SLOT_PARTITION + 1
+
+
+def sd_slot_partitions(inventory, sd_device=SD_DEVICE, default_slots=SD_DEFAULT_SLOTS):
+    """Numéros des partitions rootfs de la SD : le schéma par défaut, étendu aux partitions présentes"""
+    numbers = set(range(SD_FIRST_SLOT_PARTITION, SD_FIRST_SLOT_PARTITION + default_slots))
+    disk = inventory.disk(sd_device) if inventory is not None else None
+    if disk is not None:
+        for part in disk.partitions:
+            if part.number >= SD_FIRST_SLOT_PARTITION and part.fstype in (None, 'ext2', 'ext3', 'ext4'):
+                numbers.add(part.number)
+    return sorted(numbers)
+
+
+def build_slot_registry(inventory=None, emmc_device=EMMC_DEVICE, sd_device=SD_DEVICE,
+                        sd_default_slots=SD_DEFAULT_SLOTS, media_dir=MEDIA_DIR):
+    """Construit le registre depuis l'inventaire des partitions"""
+    slots = []
+    for index, number in enumerate(EMMC_SLOT_PARTITIONS):
+        slots.append(Slot(index + 1, partition_path(emmc_device, number), 'emmc', number, media_dir))
+    for number in sd_slot_partitions(inventory, sd_device, sd_default_slots):
+        slots.append(Slot(sd_slot_number(number), partition_path(sd_device, number), 'sd', number, media_dir))
+    return SlotRegistry(slots, inventory)
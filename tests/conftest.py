@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""Tests hors récepteur : le paquet est importé par le banc d'essai (stubs Enigma2)"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Téléchargement avec reprise contre un http.server local"""
+import os
+import re
+import hashlib
+import threading
+import http.server
+
+import pytest
+
+from harness import import_modules
+
+download_module, = import_modules("download")
+
+PAYLOAD = os.urandom(512 * 1024)
+PAYLOAD_SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+ETAG = '"%s"' % PAYLOAD_SHA256[:16]
+
+
+class ImageHandler(http.server.BaseHTTPRequestHandler):
+    """Sert PAYLOAD avec Range ; la première réponse complète est coupée au milieu"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.headers.get('Range'))
+        start = 0
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range') or '')
+        if match and self.headers.get('If-Range') in (None, ETAG):
+            start = int(match.group(1))
+        if start >= len(PAYLOAD):
+            self.send_response(416)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, len(PAYLOAD) - 1, len(PAYLOAD)))
+        self.send_header('Content-Length', str(len(PAYLOAD) - start))
+        self.send_header('ETag', ETAG)
+        self.end_headers()
+
+        if server.disconnects > 0:
+            # Coupure forcée : la moitié du corps puis fermeture de la connexion
+            server.disconnects -= 1
+            self.wfile.write(PAYLOAD[start:len(PAYLOAD) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(PAYLOAD[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    httpd.requests = []
+    httpd.disconnects = 1
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_module, "DOWNLOAD_RETRY_DELAY", 0)
+    return download_module.DownloadCache(str(tmp_path / "cache"))
+
+
+def image_url(server):
+    return "http://127.0.0.1:%d/images/openatv.tar.xz" % server.server_address[1]
+
+
+def test_resume_after_disconnect(server, cache):
+    url = image_url(server)
+    result = download_module.download(url, cache, expected_sha256=PAYLOAD_SHA256)
+
+    assert not result['cached']
+    assert result['resumed'] > 0
+    assert result['sha256'] == PAYLOAD_SHA256
+    assert result['size'] == len(PAYLOAD)
+    assert result['path'].endswith(".tar.xz")
+    with open(result['path'], 'rb') as f:
+        assert hashlib.sha256(f.read()).hexdigest() == PAYLOAD_SHA256
+    # Deuxième requête : reprise à partir des octets déjà reçus
+    assert server.requests[0] is None
+    assert server.requests[1] == 'bytes=%d-' % result['resumed']
+
+    # Plus de .part ni de métadonnées après la mise en cache
+    assert os.listdir(cache.partial_dir) == []
+
+    again = download_module.download(url, cache)
+    assert again['cached']
+    assert again['path'] == result['path']
+    assert again['sha256'] == PAYLOAD_SHA256
+    assert len(server.requests) == 2
+
+
+def test_cache_hit_by_checksum_for_other_url(server, cache):
+    download_module.download(image_url(server), cache)
+    other = "http://127.0.0.1:%d/mirror/openatv.tar.xz" % server.server_address[1]
+    result = download_module.download(other, cache, expected_sha256=PAYLOAD_SHA256.upper())
+    assert result['cached']
+    assert len(server.requests) == 2
+
+
+def test_checksum_mismatch(server, cache):
+    server.disconnects = 0
+    with pytest.raises(download_module.DownloadError):
+        download_module.download(image_url(server), cache, expected_sha256="0" * 64)
+    assert cache.lookup(url=image_url(server)) is None
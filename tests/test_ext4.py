@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Lecteur ext4 en lecture seule, sur des images créées par mke2fs -d"""
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from harness import import_modules
+
+ext4, = import_modules("ext4")
+
+pytestmark = pytest.mark.skipif(shutil.which("mke2fs") is None, reason="mke2fs not available")
+
+ISSUE = b"Welcome to Test Image \\n \\l\n"
+LARGE_SIZE = 300 * 1024
+
+
+def build_tree(path):
+    for directory in ("bin", "etc", "usr/lib/modules"):
+        os.makedirs(os.path.join(path, directory))
+    with open(os.path.join(path, "etc", "issue"), 'wb') as f:
+        f.write(ISSUE)
+    # Assez de blocs pour les blocs indirects (sans extents) et plusieurs extents
+    with open(os.path.join(path, "usr", "lib", "large.bin"), 'wb') as f:
+        f.write(bytes(range(256)) * (LARGE_SIZE // 256))
+    for i in range(40):
+        with open(os.path.join(path, "usr", "lib", "modules", "mod%02d.ko" % i), 'wb') as f:
+            f.write(b"module %d\n" % i)
+    os.symlink("../etc/issue", os.path.join(path, "bin", "issue"))
+    os.symlink("/usr/lib", os.path.join(path, "lib"))
+    return path
+
+
+@pytest.fixture(params=[[], ["-O", "^extent,^64bit"], ["-O", "inline_data"]],
+                ids=["extents", "blockmap", "inline_data"])
+def image(request, tmp_path):
+    tree = build_tree(str(tmp_path / "tree"))
+    path = str(tmp_path / "rootfs.img")
+    with open(path, 'wb') as f:
+        f.truncate(32 * 1024 * 1024)
+    subprocess.run(["mke2fs", "-q", "-F", "-t", "ext4"] + request.param + ["-d", tree, path],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return path
+
+
+def test_superblock(image):
+    sb = ext4.read_superblock(image)
+    assert sb['blocks_count'] * sb['block_size'] == 32 * 1024 * 1024
+    assert sb['free_blocks_count'] < sb['blocks_count']
+
+
+def test_not_ext4(tmp_path):
+    path = str(tmp_path / "zero.img")
+    with open(path, 'wb') as f:
+        f.truncate(1024 * 1024)
+    with pytest.raises(ext4.Ext4Error):
+        ext4.read_superblock(path)
+
+
+def test_lookup(image):
+    with ext4.Ext4Reader(image) as reader:
+        assert reader.lookup("/").is_dir()
+        assert reader.lookup("/etc/issue").is_reg()
+        assert reader.lookup("/bin/issue", follow=False).is_symlink()
+        assert reader.lookup("/bin/issue").is_reg()
+        # Lien absolu dans le chemin : résolu dans l'image
+        assert reader.lookup("/lib/large.bin").is_reg()
+        assert reader.exists("/usr/lib/../../etc/issue")
+        assert not reader.exists("/etc/missing")
+        with pytest.raises(ext4.Ext4Error):
+            reader.lookup("/etc/issue/child")
+
+
+def test_listdir(image):
+    with ext4.Ext4Reader(image) as reader:
+        assert sorted(reader.listdir("/")) == ["bin", "etc", "lib", "lost+found", "usr"]
+        assert reader.listdir("/etc") == ["issue"]
+        assert sorted(reader.listdir("/usr/lib/modules")) == ["mod%02d.ko" % i for i in range(40)]
+
+
+def test_read_file(image):
+    with ext4.Ext4Reader(image) as reader:
+        assert reader.read_file("/etc/issue") == ISSUE
+        assert reader.read_file("/bin/issue") == ISSUE
+        assert reader.read_file("/usr/lib/modules/mod07.ko") == b"module 7\n"
+        assert reader.read_file("/usr/lib/large.bin") == bytes(range(256)) * (LARGE_SIZE // 256)
+        assert reader.read_file("/usr/lib/large.bin", max_size=10) == bytes(range(10))
+        with pytest.raises(ext4.Ext4Error):
+            reader.read_file("/etc")
+
+
+def test_allocated_block_runs(image):
+    with ext4.Ext4Reader(image) as reader:
+        runs = reader.allocated_block_runs()
+        sb = reader.sb
+        # Triés, fusionnés, dans les limites du système de fichiers
+        for (start, count), (next_start, _count) in zip(runs, runs[1:]):
+            assert start + count < next_start
+        assert runs[-1][0] + runs[-1][1] <= sb['blocks_count']
+        assert sum(count for _start, count in runs) == sb['blocks_count'] - sb['free_blocks_count']
+
+        # Les blocs de données des fichiers font partie des runs alloués
+        def allocated(block):
+            return any(start <= block < start + count for start, count in runs)
+
+        inode = reader.lookup("/usr/lib/large.bin")
+        for _logical, physical, length, _initialized in reader.data_runs(inode):
+            assert allocated(physical) and allocated(physical + length - 1)
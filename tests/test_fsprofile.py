@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Commandes de formatage des profils eMMC et SD"""
+import pytest
+
+from harness import import_modules
+
+fsprofile, sdlayout = import_modules("fsprofile", "sdlayout")
+
+MIB = 1024 * 1024
+SD = fsprofile.get_profile("sd")
+DEFAULT = fsprofile.get_profile("default")
+
+
+def cluster_option(argv):
+    return int(argv[argv.index("-s") + 1]) if "-s" in argv else None
+
+
+def test_large_dreamcard_uses_profile_cluster():
+    argv, = fsprofile.fat_commands("/dev/mmcblk1p1", SD, "DREAMCARD", 8 * 1024 * MIB)
+    assert argv[:5] == ["mkfs.fat", "-F", "32", "-n", "DREAMCARD"]
+    assert cluster_option(argv) == SD['fat_cluster_kb'] * 1024 // 512
+    assert argv[-1] == "/dev/mmcblk1p1"
+
+
+def test_minimum_dreamcard_leaves_cluster_to_mkfs():
+    argv, = fsprofile.fat_commands("/dev/mmcblk1p1", SD, "DREAMCARD", sdlayout.SD_MIN_FAT_SIZE_MB * MIB)
+    assert "-s" not in argv
+
+
+@pytest.mark.parametrize("size_mb", [40, 100, 500, 1024, 1500, 2048, 3000, 4096, 32768])
+def test_cluster_count_stays_fat32(size_mb):
+    argv, = fsprofile.fat_commands("/dev/mmcblk1p1", SD, "DREAMCARD", size_mb * MIB)
+    sectors = cluster_option(argv)
+    assert sectors is not None
+    assert sectors & (sectors - 1) == 0
+    assert sectors <= SD['fat_cluster_kb'] * 1024 // 512
+    assert fsprofile.fat32_clusters(size_mb * MIB, sectors * 512) >= fsprofile.FAT32_MIN_CLUSTERS
+    # Le plus grand cluster possible : le double n'aurait pas assez de clusters
+    if sectors < SD['fat_cluster_kb'] * 1024 // 512:
+        assert fsprofile.fat32_clusters(size_mb * MIB, sectors * 1024) < fsprofile.FAT32_MIN_CLUSTERS
+
+
+def test_default_profile_has_no_cluster_override():
+    argv, = fsprofile.fat_commands("/dev/mmcblk1p1", DEFAULT, "DREAMCARD", 8 * 1024 * MIB)
+    assert "-s" not in argv
+
+
+def test_sd_ext4_aligned_on_erase_block():
+    commands = fsprofile.ext4_commands("/dev/mmcblk1p2", SD, 8 * MIB)
+    assert "stride=2048,stripe_width=2048" in commands[0]
+    assert commands[1][:2] == ["tune2fs", "-E"]
+
+
+def test_default_ext4_unchanged():
+    assert fsprofile.ext4_commands("/dev/mmcblk0p5", DEFAULT, 4 * MIB) == [["mkfs.ext4", "-F", "/dev/mmcblk0p5"]]
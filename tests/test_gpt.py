@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Écriture de la table GPT sur une image fichier"""
+import os
+import shutil
+import struct
+import subprocess
+import uuid
+import zlib
+
+import pytest
+
+from harness import import_modules
+
+gpt, sdlayout = import_modules("gpt", "sdlayout")
+
+CARD_SIZE = 8 * 1000 ** 3
+
+
+@pytest.fixture
+def card(tmp_path):
+    """Carte SD de 8 Go (image creuse) et plan par défaut écrit dessus"""
+    path = str(tmp_path / "sdcard.img")
+    with open(path, 'wb') as f:
+        f.truncate(CARD_SIZE)
+    plan = sdlayout.plan_sd_layout(gpt.disk_sectors(path), align_mb=8)
+    gpt.write_gpt(path, plan['partitions'])
+    return path, plan
+
+
+def read_sectors(path, lba, count=1):
+    with open(path, 'rb') as f:
+        f.seek(lba * gpt.SECTOR_SIZE)
+        return f.read(count * gpt.SECTOR_SIZE)
+
+
+def parse_header(data):
+    fields = struct.unpack_from('<8sIIIIQQQQ16sQIII', data, 0)
+    header = dict(zip(('signature', 'revision', 'size', 'crc', 'reserved', 'current_lba', 'backup_lba',
+                       'first_usable', 'last_usable', 'disk_guid', 'entries_lba', 'entry_count',
+                       'entry_size', 'entries_crc'), fields))
+    unsigned = bytearray(data[:header['size']])
+    unsigned[16:20] = b'\x00' * 4
+    header['computed_crc'] = zlib.crc32(bytes(unsigned)) & 0xFFFFFFFF
+    return header
+
+
+def parse_entries(data):
+    entries = []
+    for i in range(gpt.GPT_ENTRY_COUNT):
+        type_guid, guid, start, end, _flags, name = struct.unpack_from('<16s16sQQQ72s', data, i * gpt.GPT_ENTRY_SIZE)
+        if type_guid != b'\x00' * 16:
+            entries.append({'type': uuid.UUID(bytes_le=type_guid), 'start': start, 'end': end,
+                            'name': name.decode('utf-16-le').rstrip('\x00')})
+    return entries
+
+
+def test_protective_mbr(card):
+    path, _plan = card
+    mbr = read_sectors(path, 0)
+    assert mbr[510:512] == b'\x55\xaa'
+    assert mbr[446 + 4] == 0xEE
+
+
+def test_headers_and_entries(card):
+    path, plan = card
+    total = gpt.disk_sectors(path)
+    primary = parse_header(read_sectors(path, 1))
+    backup = parse_header(read_sectors(path, total - 1))
+
+    for header, current, other in ((primary, 1, total - 1), (backup, total - 1, 1)):
+        assert header['signature'] == b'EFI PART'
+        assert header['crc'] == header['computed_crc']
+        assert (header['current_lba'], header['backup_lba']) == (current, other)
+        assert header['first_usable'] == gpt.GPT_FIRST_USABLE_LBA
+        assert header['last_usable'] == total - gpt.GPT_ENTRIES_SECTORS - 2
+    assert primary['disk_guid'] == backup['disk_guid']
+
+    for header in (primary, backup):
+        table = read_sectors(path, header['entries_lba'], gpt.GPT_ENTRIES_SECTORS)
+        assert zlib.crc32(table) & 0xFFFFFFFF == header['entries_crc']
+        entries = parse_entries(table)
+        assert [(e['start'], e['end'], e['type'], e['name']) for e in entries] == [
+            (p['start'], p['end'], p['type'], p['name']) for p in plan['partitions']]
+
+
+def test_file_backed_device_needs_no_reread(card):
+    path, plan = card
+    assert gpt.reread_partition_table(path)
+    assert gpt.wait_for_partitions(path, plan['partitions'], timeout=0)
+
+
+def fake_sysfs(tmp_path, partitions):
+    """Nœuds /dev et fichiers sysfs start/size d'une carte mmcblk1 factice"""
+    device = str(tmp_path / "dev" / "mmcblk1")
+    sys_block = tmp_path / "sys" / "block"
+    (tmp_path / "dev").mkdir()
+    for part in partitions:
+        node = gpt.partition_path(device, part['number'])
+        open(node, 'w').close()
+        base = sys_block / "mmcblk1" / os.path.basename(node)
+        base.mkdir(parents=True)
+        (base / "start").write_text("%d\n" % part['start'])
+        (base / "size").write_text("%d\n" % (part['end'] - part['start'] + 1))
+    return device, str(sys_block)
+
+
+def test_partitions_ready_checks_geometry(tmp_path):
+    plan = sdlayout.plan_sd_layout(CARD_SIZE // gpt.SECTOR_SIZE, align_mb=8)
+    device, sys_block = fake_sysfs(tmp_path, plan['partitions'])
+    assert gpt.partitions_ready(device, plan['partitions'], sys_block)
+
+    # Table relue refusée (EBUSY) : nœuds présents mais limites de l'ancienne table
+    stale = sdlayout.plan_sd_layout(CARD_SIZE // gpt.SECTOR_SIZE, slot_count=2, align_mb=8)
+    assert not gpt.partitions_ready(device, stale['partitions'], sys_block)
+
+
+def test_partitions_ready_missing_node(tmp_path):
+    plan = sdlayout.plan_sd_layout(CARD_SIZE // gpt.SECTOR_SIZE, align_mb=8)
+    device, sys_block = fake_sysfs(tmp_path, plan['partitions'][:-1])
+    assert not gpt.partitions_ready(device, plan['partitions'], sys_block)
+
+
+@pytest.mark.skipif(shutil.which("sgdisk") is None, reason="sgdisk not available")
+def test_sgdisk_verify(card):
+    path, _plan = card
+    result = subprocess.run(["sgdisk", "-v", path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    assert result.returncode == 0
+    assert b"No problems found" in result.stdout
+
+
+def test_overlapping_layout_rejected():
+    partitions = [
+        {'start': 2048, 'end': 4095, 'type': gpt.GPT_TYPE_LINUX_FS, 'name': 'a'},
+        {'start': 4000, 'end': 8191, 'type': gpt.GPT_TYPE_LINUX_FS, 'name': 'b'},
+    ]
+    with pytest.raises(gpt.GPTError):
+        gpt.validate_layout(partitions, 1 << 20)
+
+
+def test_layout_beyond_disk_rejected():
+    partitions = [{'start': 2048, 'end': 1 << 20, 'type': gpt.GPT_TYPE_LINUX_FS, 'name': 'a'}]
+    with pytest.raises(gpt.GPTError):
+        gpt.validate_layout(partitions, 1 << 20)
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""Les manifestes des slots suivent DATA_DIR (jamais le /data de la machine de test)"""
+import os
+
+from harness import BenchRoot, import_modules, make_rootfs_tree
+
+plugin, = import_modules("plugin")
+
+
+def test_manifest_written_and_removed_under_data_dir():
+    with BenchRoot(plugin) as root:
+        root.redirect(1)
+        boot_manager = root.boot_manager()
+        tree = os.path.join(root.path, "rootfs")
+        make_rootfs_tree(tree, files=3, file_kb=1)
+        slot_info = {'partition': root.emmc_device + "p5", 'mount_point': tree, 'name': "Slot 1"}
+
+        assert boot_manager.write_slot_manifest(slot_info)
+        path = os.path.join(root.data_dir, "dreambootmanager_manifests", "mmcblk0p5.sha256")
+        assert os.path.isfile(path)
+
+        boot_manager.remove_slot_manifest(slot_info)
+        assert not os.path.exists(path)
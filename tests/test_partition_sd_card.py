@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""partition_sd_card s'arrête avant mkfs si le noyau n'a pas pris la nouvelle table"""
+import pytest
+
+from harness import BenchRoot, import_modules
+
+plugin, commands, sdlayout = import_modules("plugin", "commands", "sdlayout")
+
+CARD_MB = 4096
+
+
+@pytest.fixture
+def sd_card():
+    with BenchRoot(plugin) as root:
+        root.redirect(2)
+        boot_manager = root.boot_manager()
+        backend = commands.FakeBackend()
+        boot_manager.commands = commands.CommandRunner(backend)
+        root.create_disk(root.sd_device, CARD_MB)
+        plan = sdlayout.plan_sd_layout(boot_manager.get_sd_card_sectors(root.sd_device), 2, 1024, align_mb=4)
+        yield boot_manager, backend, root.sd_device, plan
+
+
+def mkfs_calls(backend):
+    return [argv for argv in backend.calls if argv[0].startswith("mkfs")]
+
+
+def test_failed_reread_stops_before_mkfs(sd_card, monkeypatch):
+    boot_manager, backend, device, plan = sd_card
+    monkeypatch.setattr(plugin, "reread_partition_table", lambda device: False)
+    backend.respond("partprobe", 1, stderr=b"Error: Partition(s) 2 on %s have been written, but we have been "
+                                           b"unable to inform the kernel of the change\n" % device.encode())
+
+    success, message = boot_manager.partition_sd_card(device, plan)
+
+    assert not success
+    assert "re-read the partition table" in message
+    assert ["partprobe", device] in backend.calls
+    assert mkfs_calls(backend) == []
+
+
+def test_stale_geometry_stops_before_mkfs(sd_card, monkeypatch):
+    boot_manager, backend, device, plan = sd_card
+    waited = []
+
+    def wait_for_partitions(device, partitions, timeout=10.0):
+        waited.append(partitions)
+        return False
+
+    monkeypatch.setattr(plugin, "wait_for_partitions", wait_for_partitions)
+
+    success, message = boot_manager.partition_sd_card(device, plan)
+
+    assert not success
+    assert waited == [plan['partitions']]
+    assert mkfs_calls(backend) == []
+
+
+def test_partprobe_fallback_continues(sd_card, monkeypatch):
+    boot_manager, backend, device, plan = sd_card
+    monkeypatch.setattr(plugin, "reread_partition_table", lambda device: False)
+
+    boot_manager.partition_sd_card(device, plan)
+
+    assert ["partprobe", device] in backend.calls
+    assert len(mkfs_calls(backend)) == len(plan['partitions'])
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Plan de partitionnement de la carte SD (fonction pure, sans carte)"""
+import pytest
+
+from harness import import_modules
+
+sdlayout, slots = import_modules("sdlayout", "slots")
+
+GB = 1000 ** 3
+
+
+def card_sectors(size_bytes):
+    return size_bytes // 512
+
+
+def slot_partitions(plan):
+    return [part for part in plan['partitions'] if part['role'] == 'rootfs']
+
+
+def test_card_too_small():
+    with pytest.raises(sdlayout.LayoutError):
+        sdlayout.plan_sd_layout(card_sectors(1 * GB))
+
+
+@pytest.mark.parametrize("size_gb", [8, 32, 64])
+def test_default_plan(size_gb):
+    plan = sdlayout.plan_sd_layout(card_sectors(size_gb * GB))
+    assert plan['slot_count'] == slots.SD_DEFAULT_SLOTS
+    assert plan['slot_size_mb'] == sdlayout.SD_SLOT_SIZE_MB
+    assert plan['fat_mb'] >= sdlayout.SD_MIN_FAT_SIZE_MB
+    assert [part['number'] for part in plan['partitions']] == list(range(1, slots.SD_DEFAULT_SLOTS + 2))
+    assert plan['partitions'][0]['role'] == 'fat'
+    # FAT puis slots, contigus, dans les limites de la carte
+    for previous, part in zip(plan['partitions'], plan['partitions'][1:]):
+        assert part['start'] == previous['end'] + 1
+    assert plan['partitions'][-1]['end'] < plan['total_sectors']
+
+
+def test_slot_count_only_shrinks_slots_on_small_card():
+    plan = sdlayout.plan_sd_layout(card_sectors(8 * GB), slot_count=6)
+    assert plan['slot_count'] == 6
+    assert sdlayout.SD_MIN_SLOT_SIZE_MB <= plan['slot_size_mb'] < sdlayout.SD_SLOT_SIZE_MB
+    assert len(slot_partitions(plan)) == 6
+
+
+def test_slot_count_only_keeps_default_size_on_large_card():
+    plan = sdlayout.plan_sd_layout(card_sectors(64 * GB), slot_count=8)
+    assert plan['slot_size_mb'] == sdlayout.SD_SLOT_SIZE_MB
+    assert len(slot_partitions(plan)) == 8
+
+
+def test_slot_count_too_many_for_card():
+    with pytest.raises(sdlayout.LayoutError):
+        sdlayout.plan_sd_layout(card_sectors(8 * GB), slot_count=16)
+
+
+def test_slot_size_only_fills_card():
+    plan = sdlayout.plan_sd_layout(card_sectors(32 * GB), slot_size_mb=4096)
+    assert plan['slot_size_mb'] == 4096
+    assert plan['slot_count'] == (plan['card_mb'] - 2 - sdlayout.SD_MIN_FAT_SIZE_MB) // 4096
+    assert plan['fat_mb'] < 4096 + sdlayout.SD_MIN_FAT_SIZE_MB
+
+
+def test_slot_size_only_capped_at_max_slots():
+    plan = sdlayout.plan_sd_layout(card_sectors(64 * GB), slot_size_mb=sdlayout.SD_MIN_SLOT_SIZE_MB)
+    assert plan['slot_count'] == sdlayout.SD_MAX_SLOTS
+
+
+@pytest.mark.parametrize("size_gb", [8, 32, 64])
+@pytest.mark.parametrize("align_mb", [1, 4, 8, 16])
+@pytest.mark.parametrize("slot_count, slot_size_mb", [(None, None), (6, None), (None, 2000)])
+def test_partitions_aligned(size_gb, align_mb, slot_count, slot_size_mb):
+    plan = sdlayout.plan_sd_layout(card_sectors(size_gb * GB), slot_count, slot_size_mb, align_mb=align_mb)
+    align_sectors = align_mb * sdlayout.MIB_SECTORS
+    for part in plan['partitions']:
+        assert part['start'] % align_sectors == 0
+        assert (part['end'] + 1) % align_sectors == 0
+
+
+def test_invalid_alignment():
+    with pytest.raises(sdlayout.LayoutError):
+        sdlayout.plan_sd_layout(card_sectors(8 * GB), align_mb=0)
+
+
+def test_layout_choices_default_first():
+    choices = sdlayout.layout_choices(card_sectors(32 * GB))
+    assert choices[0][0].endswith("(default)")
+    assert choices[0][1]['slot_count'] == slots.SD_DEFAULT_SLOTS
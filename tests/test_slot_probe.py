@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""get_multiboot_slots n'attend pas indéfiniment un slot dont le sondage bloque"""
+import threading
+
+from harness import BenchRoot, import_modules
+
+plugin, = import_modules("plugin")
+
+
+def test_stuck_probe_reported_unknown(monkeypatch):
+    with BenchRoot(plugin) as root:
+        root.redirect(1)
+        boot_manager = root.boot_manager()
+        stuck = root.create_partition(root.emmc_device + "p5", 8)
+        release = threading.Event()
+        check_slot_has_image = boot_manager.check_slot_has_image
+
+        def blocking_check(slot_info):
+            if slot_info['partition'] == stuck:
+                release.wait(10)
+            return check_slot_has_image(slot_info)
+
+        monkeypatch.setattr(boot_manager, "check_slot_has_image", blocking_check)
+        monkeypatch.setattr(plugin, "SLOT_PROBE_TIMEOUT", 0.2)
+        try:
+            slots = boot_manager.get_multiboot_slots()
+        finally:
+            release.set()
+
+        slot = next(slot for slot in slots if slot['partition'] == stuck)
+        assert slot['image_exists'] is False
+        assert slot['image_name'] == "Unknown"
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Mesure des durées des opérations de BootManager (spans)
+
+Chaque opération (get_multiboot_slots, delete_slot_image...) et ses étapes
+(mount, sondage, lecture de /etc/issue, umount, mkfs, analyse de
+bootconfig.txt, écriture des STARTUP) est enregistrée comme un span : nom,
+durée, span parent dans le même thread, exception éventuelle. Les spans
+restent dans un tampon circulaire en mémoire, rien n'est écrit pendant
+l'opération ; export_jsonl les écrit dans /tmp (une ligne JSON par span)
+et summary donne p50/p95 par nom pour l'écran de rapport.
+"""
+import os
+import json
+import math
+import time
+import functools
+import itertools
+import threading
+import contextlib
+import collections
+
+TRACE_BUFFER_SIZE = 2000
+TRACE_EXPORT_DIR = "/tmp"
+
+
+class Span:
+    """Durée d'une opération ou d'une étape"""
+
+    __slots__ = ('id', 'name', 'parent', 'thread', 'start', 'elapsed', 'error', 'attrs')
+
+    def __init__(self, span_id, name, parent, attrs):
+        self.id = span_id
+        self.name = name
+        self.parent = parent
+        self.thread = threading.current_thread().name
+        self.start = time.time()
+        self.elapsed = 0.0
+        self.error = None
+        self.attrs = attrs
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'parent': self.parent,
+            'thread': self.thread,
+            'start': self.start,
+            'elapsed': self.elapsed,
+            'error': self.error,
+            'attrs': self.attrs,
+        }
+
+
+def percentile(values, fraction):
+    """Percentile par rang le plus proche d'une liste triée"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(math.ceil(fraction * len(values))) - 1))
+    return values[index]
+
+
+def format_duration(seconds):
+    if seconds >= 1:
+        return "%.2f s" % seconds
+    return "%.1f ms" % (seconds * 1000)
+
+
+class Tracer:
+    """Enregistre les spans de tous les threads dans un tampon circulaire"""
+
+    def __init__(self, size=TRACE_BUFFER_SIZE):
+        self.spans = collections.deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.ids = itertools.count(1)
+
+    def _stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """with tracer.span("mount", partition=...): ... ; l'exception éventuelle est notée puis propagée"""
+        stack = self._stack()
+        current = Span(next(self.ids), name, stack[-1].id if stack else None, attrs)
+        stack.append(current)
+        start = time.monotonic()
+        try:
+            yield current
+        except BaseException as e:
+            current.error = type(e).__name__
+            raise
+        finally:
+            current.elapsed = time.monotonic() - start
+            stack.pop()
+            with self.lock:
+                self.spans.append(current)
+
+    def traced(self, name=None):
+        """Décorateur : chaque appel de la fonction devient un span (nom de la fonction par défaut)"""
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def recent(self, count=None):
+        """Derniers spans terminés, le plus ancien en premier"""
+        with self.lock:
+            spans = list(self.spans)
+        return spans[-count:] if count else spans
+
+    def clear(self):
+        with self.lock:
+            self.spans.clear()
+
+    def summary(self):
+        """Statistiques par nom : [(nom, {count, p50, p95, max, total, errors})], les plus coûteux en premier"""
+        durations = {}
+        errors = {}
+        for span in self.recent():
+            durations.setdefault(span.name, []).append(span.elapsed)
+            if span.error:
+                errors[span.name] = errors.get(span.name, 0) + 1
+        rows = []
+        for name, values in durations.items():
+            values.sort()
+            rows.append((name, {
+                'count': len(values),
+                'p50': percentile(values, 0.50),
+                'p95': percentile(values, 0.95),
+                'max': values[-1],
+                'total': sum(values),
+                'errors': errors.get(name, 0),
+            }))
+        rows.sort(key=lambda row: row[1]['total'], reverse=True)
+        return rows
+
+    def export_jsonl(self, path=None):
+        """Écrit les spans du tampon en JSON lines ; retourne (chemin, nombre de spans)"""
+        if path is None:
+            path = os.path.join(TRACE_EXPORT_DIR, "dreambootmanager_trace_%s.jsonl" % time.strftime("%Y%m%d-%H%M%S"))
+        spans = self.recent()
+        with open(path, 'w') as f:
+            for span in spans:
+                f.write(json.dumps(span.as_dict(), sort_keys=True) + "\n")
+        return path, len(spans)
+
+
+# Instance partagée par tout le plugin
+TRACER = Tracer()
+span = TRACER.span
+traced = TRACER.traced
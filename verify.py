@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""Vérification des empreintes d'archives d'images et des slots installés
+
+Chaque fichier est lu une seule fois par blocs de grande taille dans un
+tampon réutilisé, et toutes les empreintes demandées (md5, sha256...) sont
+calculées pendant cette même passe. Plusieurs fichiers sont vérifiés en
+parallèle sur un pool de threads : hashlib libère le GIL pendant le calcul.
+
+Un manifeste par slot (format sha256sum, chemins relatifs à la racine du
+slot) permet de détecter un rootfs corrompu sans le réinstaller.
+"""
+import os
+import re
+import stat
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .fileutils import write_if_changed
+
+VERIFY_CHUNK_SIZE = 1024 * 1024
+VERIFY_MAX_WORKERS = 4
+DEFAULT_ALGORITHMS = ('md5', 'sha256')
+
+# Fichiers d'empreintes accompagnant une archive (image.zip.md5, image.sha256...)
+CHECKSUM_EXTENSIONS = [
+    ('.sha256', 'sha256'),
+    ('.sha256sum', 'sha256'),
+    ('.md5', 'md5'),
+    ('.md5sum', 'md5'),
+]
+# Listes d'empreintes communes à un dossier
+CHECKSUM_LISTS = [
+    ('SHA256SUMS', 'sha256'),
+    ('sha256sums.txt', 'sha256'),
+    ('MD5SUMS', 'md5'),
+    ('md5sums.txt', 'md5'),
+]
+HEX_LENGTHS = {'md5': 32, 'sha1': 40, 'sha256': 64}
+
+# Dossier des manifestes dans DATA_DIR (/data sur le récepteur)
+MANIFEST_DIR_NAME = "dreambootmanager_manifests"
+# Dossiers du rootfs non couverts par le manifeste (points de montage, données volatiles)
+MANIFEST_EXCLUDE = ('proc', 'sys', 'dev', 'tmp', 'run', 'media', 'mnt', 'var/volatile', 'lost+found')
+
+CHECKSUM_LINE_RE = re.compile(r'^([0-9a-fA-F]+)(?:\s+\*?(.*))?$')
+BSD_CHECKSUM_LINE_RE = re.compile(r'^(\w+)\s*\((.*)\)\s*=\s*([0-9a-fA-F]+)$')
+
+
+class VerifyError(Exception):
+    """Fichier d'empreintes ou manifeste illisible"""
+    pass
+
+
+class _Stopped(Exception):
+    """Arrêt d'un thread suite à l'erreur d'un autre"""
+    pass
+
+
+def hash_file(path, algorithms=DEFAULT_ALGORITHMS, progress=None, chunk_size=VERIFY_CHUNK_SIZE):
+    """Calcule toutes les empreintes de path en une passe
+
+    progress(n) est appelé après chaque bloc lu avec le nombre d'octets lus.
+    Retourne un dict {algorithme: hexdigest}.
+    """
+    hashers = [hashlib.new(name) for name in algorithms]
+    with open(path, 'rb', buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        # Petit fichier : pas besoin d'allouer un tampon complet
+        buf = bytearray(max(1, min(chunk_size, size + 1)))
+        view = memoryview(buf)
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            data = view[:n]
+            for hasher in hashers:
+                hasher.update(data)
+            if progress is not None:
+                progress(n)
+    return dict((name, hasher.hexdigest()) for name, hasher in zip(algorithms, hashers))
+
+
+def parse_checksum_file(path, filename=None):
+    """Empreinte de filename dans un fichier au format md5sum/sha256sum ou BSD
+
+    Un fichier contenant une seule empreinte sans nom de fichier la retourne
+    quel que soit filename. Retourne None si aucune entrée ne correspond.
+    """
+    try:
+        with open(path, 'r', errors='replace') as f:
+            lines = [line.strip() for line in f]
+    except OSError as e:
+        raise VerifyError("Cannot read %s: %s" % (path, str(e)))
+
+    entries = []
+    for line in lines:
+        if not line or line.startswith('#'):
+            continue
+        match = BSD_CHECKSUM_LINE_RE.match(line)
+        if match:
+            entries.append((match.group(3).lower(), match.group(2)))
+            continue
+        match = CHECKSUM_LINE_RE.match(line)
+        if match:
+            entries.append((match.group(1).lower(), match.group(2)))
+
+    for digest, name in entries:
+        if filename is None or name is None or os.path.basename(name.strip()) == filename:
+            return digest
+    return None
+
+
+def find_expected_checksums(archive_path):
+    """Empreintes attendues pour archive_path d'après les fichiers voisins
+
+    Retourne un dict {algorithme: hexdigest} (vide si aucun fichier trouvé).
+    """
+    directory = os.path.dirname(archive_path)
+    filename = os.path.basename(archive_path)
+    stem = re.sub(r'(\.tar)?\.[^.]+$', '', archive_path)
+    expected = {}
+
+    for extension, algorithm in CHECKSUM_EXTENSIONS:
+        for candidate in (archive_path + extension, stem + extension):
+            if algorithm not in expected and os.path.isfile(candidate):
+                digest = parse_checksum_file(candidate, filename)
+                if digest is not None and len(digest) == HEX_LENGTHS[algorithm]:
+                    expected[algorithm] = digest
+
+    for list_name, algorithm in CHECKSUM_LISTS:
+        candidate = os.path.join(directory, list_name)
+        if algorithm not in expected and os.path.isfile(candidate):
+            with open(candidate, 'r', errors='replace') as f:
+                named = [line for line in f if line.strip() and not line.startswith('#')]
+            # Dans une liste, on exige le nom du fichier
+            if any(filename in line for line in named):
+                digest = parse_checksum_file(candidate, filename)
+                if digest is not None and len(digest) == HEX_LENGTHS[algorithm]:
+                    expected[algorithm] = digest
+    return expected
+
+
+def verify_file(path, expected=None, progress=None):
+    """Vérifie path contre ses empreintes attendues
+
+    expected=None cherche les fichiers d'empreintes voisins. Retourne un dict
+    {path, size, digests, expected, ok, elapsed} ; ok vaut None quand aucune
+    empreinte n'est connue.
+    """
+    if expected is None:
+        expected = find_expected_checksums(path)
+    algorithms = tuple(DEFAULT_ALGORITHMS) + tuple(sorted(set(expected) - set(DEFAULT_ALGORITHMS)))
+
+    start_time = time.time()
+    digests = hash_file(path, algorithms, progress)
+    ok = None
+    if expected:
+        ok = all(digests[name] == digest for name, digest in expected.items())
+    return {
+        'path': path,
+        'size': os.path.getsize(path),
+        'digests': digests,
+        'expected': expected,
+        'ok': ok,
+        'elapsed': time.time() - start_time,
+    }
+
+
+def run_parallel(func, items, total, max_workers=VERIFY_MAX_WORKERS, progress=None):
+    """Applique func(item, on_chunk) sur un pool de threads, résultats dans l'ordre
+
+    progress(done, total) reçoit les octets traités par l'ensemble des threads.
+    Une exception levée par progress (annulation) arrête tous les threads au
+    bloc suivant puis est propagée.
+    """
+    lock = threading.Lock()
+    state = {'done': 0}
+    stop = threading.Event()
+
+    def on_chunk(n):
+        if stop.is_set():
+            raise _Stopped()
+        with lock:
+            state['done'] += n
+            done = state['done']
+        if progress is not None:
+            try:
+                progress(done, total)
+            except BaseException:
+                stop.set()
+                raise
+
+    def run(item):
+        try:
+            return func(item, on_chunk)
+        except BaseException:
+            stop.set()
+            raise
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [executor.submit(run, item) for item in items]
+    # Le pool est terminé : on propage la première erreur d'origine
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    original = [e for e in errors if not isinstance(e, _Stopped)]
+    if errors:
+        raise (original or errors)[0]
+    return [future.result() for future in futures]
+
+
+def verify_files(paths, max_workers=VERIFY_MAX_WORKERS, progress=None):
+    """Vérifie plusieurs fichiers en parallèle, résultats dans l'ordre de paths"""
+    total = sum(os.path.getsize(path) for path in paths)
+    return run_parallel(lambda path, on_chunk: verify_file(path, None, on_chunk),
+                        paths, total, max_workers, progress)
+
+
+def manifest_path(partition, manifest_dir):
+    """Emplacement du manifeste d'un slot : /dev/mmcblk0p3 -> .../mmcblk0p3.sha256"""
+    return os.path.join(manifest_dir, os.path.basename(partition) + ".sha256")
+
+
+def scan_tree(root):
+    """Fichiers réguliers de root : dict {chemin relatif: taille}, hors MANIFEST_EXCLUDE"""
+    files = {}
+    for directory, dirnames, filenames in os.walk(root):
+        relative_dir = os.path.relpath(directory, root)
+        if relative_dir == '.':
+            relative_dir = ''
+        dirnames[:] = [name for name in dirnames
+                       if os.path.join(relative_dir, name) not in MANIFEST_EXCLUDE]
+        for name in filenames:
+            relative = os.path.join(relative_dir, name)
+            if '\n' in relative:
+                continue
+            try:
+                st = os.lstat(os.path.join(directory, name))
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                files[relative] = st.st_size
+    return files
+
+
+def build_manifest(root, max_workers=VERIFY_MAX_WORKERS, progress=None):
+    """Empreintes sha256 de tous les fichiers du slot monté en root
+
+    Retourne un dict {chemin relatif: sha256}.
+    """
+    files = scan_tree(root)
+    names = sorted(files)
+    digests = run_parallel(
+        lambda name, on_chunk: hash_file(os.path.join(root, name), ('sha256',), on_chunk)['sha256'],
+        names, sum(files.values()), max_workers, progress)
+    return dict(zip(names, digests))
+
+
+def write_manifest(path, manifest):
+    """Écrit le manifeste au format sha256sum (vérifiable avec sha256sum -c depuis la racine du slot)"""
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    lines = ["%s  ./%s\n" % (manifest[name], name) for name in sorted(manifest)]
+    return write_if_changed(path, "".join(lines))
+
+
+def read_manifest(path):
+    """Relit un manifeste écrit par write_manifest"""
+    manifest = {}
+    try:
+        with open(path, 'r', errors='surrogateescape') as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if not line:
+                    continue
+                digest, _, name = line.partition('  ')
+                if len(digest) != HEX_LENGTHS['sha256'] or not name:
+                    raise VerifyError("Invalid manifest line in %s: %r" % (path, line))
+                manifest[name[2:] if name.startswith('./') else name] = digest
+    except OSError as e:
+        raise VerifyError("Cannot read manifest %s: %s" % (path, str(e)))
+    return manifest
+
+
+def check_manifest(root, manifest, max_workers=VERIFY_MAX_WORKERS, progress=None):
+    """Compare le slot monté en root à son manifeste
+
+    Retourne un dict {checked, ok, modified, missing, added, elapsed} où
+    modified, missing et added sont des listes de chemins relatifs.
+    """
+    start_time = time.time()
+    files = scan_tree(root)
+    present = sorted(name for name in manifest if name in files)
+    digests = run_parallel(
+        lambda name, on_chunk: hash_file(os.path.join(root, name), ('sha256',), on_chunk)['sha256'],
+        present, sum(files[name] for name in present), max_workers, progress)
+
+    modified = [name for name, digest in zip(present, digests) if digest != manifest[name]]
+    return {
+        'checked': len(present),
+        'ok': len(present) - len(modified),
+        'modified': modified,
+        'missing': sorted(name for name in manifest if name not in files),
+        'added': sorted(name for name in files if name not in manifest),
+        'elapsed': time.time() - start_time,
+    }